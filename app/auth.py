@@ -1,5 +1,6 @@
 import streamlit as st
 from app.utils.supabase_client import get_supabase_client
+from app.config.proyecciones import columnas
 from argon2 import PasswordHasher
 ph = PasswordHasher()
 
@@ -27,7 +28,7 @@ def autenticar_usuario():
         
         try:
             response = supabase.table('usuarios')\
-                .select('*')\
+                .select(columnas('auth.login'))\
                 .eq('email', email)\
                 .execute()
             
@@ -36,6 +37,8 @@ def autenticar_usuario():
                 usuario = response.data[0]
                 password_encriptado = response.data[0]['password_hash']
                 if ph.verify(password_encriptado, password):
+                    # El hash no se guarda en la sesión
+                    usuario.pop('password_hash', None)
                     st.session_state.usuario = usuario
                     st.success("✅ Acceso concedido")
                     st.rerun()  
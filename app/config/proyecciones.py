@@ -0,0 +1,146 @@
+# Registro central de proyecciones de columnas por vista.
+#
+# Cada consulta de los módulos pide solo las columnas que la vista usa, en
+# sintaxis `select` de PostgREST (incluyendo embebidos). Si una vista empieza a
+# usar una columna nueva hay que agregarla aquí; `python -m
+# app.utils.verificar_proyecciones` falla si una vista referencia una columna
+# que no está proyectada.
+
+PROYECCIONES = {
+    # Datos de referencia (app/utils/datos_referencia.py)
+    'referencia.areas': 'area',
+    'referencia.usuarios': 'id, nombre_completo, email, area, rol, activo',
+    'referencia.epp_catalogo': 'id, nombre, descripcion, categoria, vida_util_meses, certificacion, '
+                               'requiere_mantenimiento, foto_url, foto_miniatura_url, activo',
+
+    # Autenticación
+    'auth.login': 'id, email, nombre_completo, rol, area, password_hash',
+
+    # Riesgos
+    'riesgos.listado': 'id, created_at, codigo, area, puesto_trabajo, peligro, nivel_riesgo, estado, '
+                       'usuarios(nombre_completo)',
+    'riesgos.exportar': 'codigo, area, puesto_trabajo, actividad, peligro, tipo_peligro, probabilidad, '
+                        'severidad, nivel_riesgo, controles_actuales, estado, created_at, '
+                        'usuarios(nombre_completo)',
+    'riesgos.dashboard': 'area, nivel_riesgo',
+
+    # Dashboard
+    'dashboard.riesgos': 'id, codigo, area, peligro, tipo_peligro, nivel_riesgo, estado',
+    'dashboard.incidentes': 'id, codigo, tipo, fecha_hora, area, descripcion, estado, nivel_riesgo',
+    'dashboard.inspecciones': 'id, estado, fecha_realizada',
+    'dashboard.hallazgos': 'id, inspeccion_id, categoria, estado, fecha_cierre',
+    'dashboard.epp': 'id, estado, fecha_vencimiento',
+    'dashboard.capacitaciones': 'id, estado',
+
+    # Reportes
+    'reportes.incidentes': 'id, codigo, tipo, fecha_hora, area, descripcion, consecuencias, estado, '
+                           'fecha_cierre, usuarios(nombre_completo)',
+    'reportes.riesgos': 'id, codigo, area, puesto_trabajo, peligro, tipo_peligro, probabilidad, severidad, '
+                        'nivel_riesgo, estado, usuarios(nombre_completo)',
+    'reportes.epp': 'id, fecha_entrega, fecha_vencimiento, estado, usuarios(nombre_completo), '
+                    'epp_catalogo(nombre)',
+    'reportes.capacitaciones': 'id, codigo, tema, area_destino, fecha_programada, estado, duracion_horas',
+    'reportes.inspecciones': 'id, area, estado, fecha_programada',
+    'reportes.hallazgos': 'id, descripcion, categoria, estado, fecha_limite, fecha_cierre, '
+                          'usuarios(nombre_completo)',
+    'reportes.documentos': 'id, estado',
+
+    # Instantáneas locales (app/utils/snapshots.py): unión de las vistas que se
+    # sirven desde la copia local de cada tabla, más la marca de agua updated_at
+    'snapshot.riesgos': 'id, codigo, area, puesto_trabajo, peligro, tipo_peligro, probabilidad, severidad, '
+                        'nivel_riesgo, estado, usuarios(nombre_completo), updated_at',
+    'snapshot.incidentes': 'id, codigo, tipo, fecha_hora, area, descripcion, consecuencias, estado, '
+                           'nivel_riesgo, fecha_cierre, usuarios(nombre_completo), updated_at',
+    'snapshot.inspecciones': 'id, area, estado, fecha_programada, fecha_realizada, updated_at',
+    'snapshot.hallazgos': 'id, inspeccion_id, descripcion, categoria, estado, fecha_limite, fecha_cierre, '
+                          'usuarios(nombre_completo), updated_at',
+    'snapshot.epp_asignaciones': 'id, fecha_entrega, fecha_vencimiento, estado, usuarios(nombre_completo), '
+                                 'epp_catalogo(nombre), updated_at',
+    'snapshot.capacitaciones': 'id, codigo, tema, area_destino, fecha_programada, estado, duracion_horas, '
+                               'updated_at',
+    'snapshot.documentos': 'id, estado, updated_at',
+
+    # EPP
+    'epp.por_renovar': 'id, fecha_vencimiento, condicion, epp_catalogo(nombre), '
+                       'usuarios(id, nombre_completo, area)',
+    'epp.conteo': 'id',
+    'epp.inventario': 'id, fecha_entrega, fecha_vencimiento, estado, epp_catalogo(nombre, categoria), '
+                      'usuarios(nombre_completo, area)',
+
+    # Incidentes
+    'incidentes.investigacion': 'id, codigo, tipo, fecha_hora, area, trabajador_nombre, descripcion, '
+                                'estado, nivel_riesgo, evidencia, '
+                                'usuarios!incidentes_reportado_por_fkey(nombre_completo)',
+    'incidentes.acciones': 'id, created_at, descripcion, estado, fecha_limite, porcentaje_avance, '
+                           'comentarios, incidentes(codigo, area), usuarios(nombre_completo)',
+    'incidentes.conteo_acciones': 'id',
+    'incidentes.dashboard': 'id, codigo, tipo, fecha_hora, area, estado, nivel_riesgo, consecuencias, '
+                            'usuarios!incidentes_reportado_por_fkey(nombre_completo)',
+
+    # Inspecciones
+    'inspecciones.checklists': 'id, nombre',
+    'inspecciones.pendientes': 'id, area, fecha_programada, estado, checklists(nombre, items)',
+    'inspecciones.hallazgos': 'id, created_at, descripcion, categoria, estado, fecha_limite, comentarios, '
+                              'inspecciones(area, fecha_programada), usuarios(nombre_completo)',
+
+    # Capacitaciones
+    'capacitaciones.programadas': 'id, codigo, tema, fecha_programada, instructor, metodo, area_destino, '
+                                  'asistentes_capacitacion(id, trabajador_id, asistio, calificacion, '
+                                  'feedback, fecha_asistencia, usuarios(nombre_completo))',
+    'capacitaciones.selector': 'id, codigo, tema',
+    'capacitaciones.material': 'id, tipo, descripcion, archivo_url, created_at',
+    'capacitaciones.realizadas': 'id, codigo, tema, asistentes_capacitacion(trabajador_id)',
+    'capacitaciones.encuestas': 'id, satisfaccion, utilidad, comentarios',
+    'capacitaciones.encuesta_respondida': 'id',
+    'capacitaciones.efectividad': 'id, codigo, tema, fecha_programada, asistentes_capacitacion(asistio), '
+                                  'encuestas_capacitacion(satisfaccion)',
+
+    # Documental
+    'documental.repositorio': 'id, created_at, codigo, titulo, tipo, version, area, estado, keywords, '
+                              'fecha_vigencia, archivo_url, usuarios(nombre_completo)',
+    'documental.edicion': 'id, codigo, titulo, tipo, version, fecha_vigencia, area, keywords, archivo_url, '
+                          'observaciones, estado',
+    'documental.revision': 'id, codigo, titulo, version, tipo, area, fecha_vigencia, estado, archivo_url, '
+                           'observaciones, responsable_id, usuarios(nombre_completo)',
+    'documental.conteo': 'id',
+    'documental.criticos': 'id, codigo, titulo, tipo, area, fecha_vigencia, estado',
+    'documental.lista_maestra': 'codigo, titulo, tipo, version, area, estado, aprobado, fecha_vigencia, '
+                                'usuarios(nombre_completo)',
+    'documental.vencimientos': 'codigo, titulo, tipo, area, fecha_vigencia, usuarios(nombre_completo)',
+    'documental.versiones': 'version, fecha_reemplazo, documentos(codigo, titulo)',
+    'documental.sin_aprobar': 'codigo, titulo, tipo, area, estado, usuarios(nombre_completo)',
+    'documental.cumplimiento': 'area, aprobado, fecha_vigencia',
+}
+
+# Vistas que se sirven desde la instantánea local de cada tabla; su proyección
+# debe estar contenida en 'snapshot.<tabla>' (lo comprueba el verificador)
+VISTAS_SNAPSHOT = {
+    'riesgos': ['dashboard.riesgos', 'reportes.riesgos'],
+    'incidentes': ['dashboard.incidentes', 'reportes.incidentes'],
+    'inspecciones': ['dashboard.inspecciones', 'reportes.inspecciones'],
+    'hallazgos': ['dashboard.hallazgos', 'reportes.hallazgos'],
+    'epp_asignaciones': ['dashboard.epp', 'reportes.epp'],
+    'capacitaciones': ['dashboard.capacitaciones', 'reportes.capacitaciones'],
+    'documentos': ['reportes.documentos'],
+}
+
+def columnas(vista):
+    """Columnas a proyectar (argumento de `.select()`) para una vista registrada"""
+    return PROYECCIONES[vista]
+
+def dividir_select(texto):
+    """Divide una lista `select` de PostgREST en elementos de primer nivel"""
+    partes, nivel, actual = [], 0, ''
+    for c in texto:
+        if c == '(':
+            nivel += 1
+        elif c == ')':
+            nivel -= 1
+        if c == ',' and nivel == 0:
+            partes.append(actual.strip())
+            actual = ''
+        else:
+            actual += c
+    if actual.strip():
+        partes.append(actual.strip())
+    return partes
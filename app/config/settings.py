@@ -0,0 +1,100 @@
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+# Supabase
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+
+# Pool HTTP compartido (HTTP/2 + keep-alive) para PostgREST y Storage
+SUPABASE_POOL_MAX_CONEXIONES = int(os.getenv("SUPABASE_POOL_MAX_CONEXIONES", "20"))
+SUPABASE_POOL_MAX_KEEPALIVE = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "10"))
+SUPABASE_POOL_KEEPALIVE_SEG = float(os.getenv("SUPABASE_POOL_KEEPALIVE_SEG", "60"))
+SUPABASE_TIMEOUT_SEG = float(os.getenv("SUPABASE_TIMEOUT_SEG", "30"))
+SUPABASE_TIMEOUT_CONEXION_SEG = float(os.getenv("SUPABASE_TIMEOUT_CONEXION_SEG", "5"))
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "true").lower() == "true"
+
+# Carga concurrente de tablas (dashboard y reportes)
+CARGA_PARALELA_MAX_HILOS = int(os.getenv("CARGA_PARALELA_MAX_HILOS", "8"))
+
+# Subidas concurrentes a Storage (hilos compartidos por todas las sesiones)
+SUBIDA_PARALELA_MAX_HILOS = int(os.getenv("SUBIDA_PARALELA_MAX_HILOS", "4"))
+
+# Subidas reanudables (TUS) para archivos grandes; Supabase exige bloques de 6 MB
+SUBIDA_TUS_UMBRAL_MB = float(os.getenv("SUBIDA_TUS_UMBRAL_MB", "6"))
+SUBIDA_TUS_BLOQUE_MB = int(os.getenv("SUBIDA_TUS_BLOQUE_MB", "6"))
+SUBIDA_TUS_REINTENTOS = int(os.getenv("SUBIDA_TUS_REINTENTOS", "3"))
+
+# Imágenes: reducción y recompresión antes de subir, más miniatura WebP
+IMAGEN_COMPRIMIR = os.getenv("IMAGEN_COMPRIMIR", "true").lower() == "true"
+IMAGEN_MAX_PX = int(os.getenv("IMAGEN_MAX_PX", "1920"))
+IMAGEN_CALIDAD = int(os.getenv("IMAGEN_CALIDAD", "80"))
+IMAGEN_MINIATURA_PX = int(os.getenv("IMAGEN_MINIATURA_PX", "320"))
+IMAGEN_MINIATURA_CALIDAD = int(os.getenv("IMAGEN_MINIATURA_CALIDAD", "70"))
+
+# Almacenamiento deduplicado por contenido (app/utils/indice_contenido.py)
+ALMACENAMIENTO_DEDUP = os.getenv("ALMACENAMIENTO_DEDUP", "true").lower() == "true"
+ALMACENAMIENTO_INDICE_DB = os.getenv("ALMACENAMIENTO_INDICE_DB", "data/indice_contenido.db")
+ALMACENAMIENTO_GRACIA_SEG = float(os.getenv("ALMACENAMIENTO_GRACIA_SEG", "86400"))
+ALMACENAMIENTO_LIMPIEZA_SEG = float(os.getenv("ALMACENAMIENTO_LIMPIEZA_SEG", "3600"))
+
+# Cola de subidas en segundo plano (app/utils/cola_subidas.py)
+SUBIDA_COLA_DB = os.getenv("SUBIDA_COLA_DB", "data/cola_subidas.db")
+SUBIDA_SPOOL_DIR = os.getenv("SUBIDA_SPOOL_DIR", "data/spool")
+SUBIDA_COLA_HILOS = int(os.getenv("SUBIDA_COLA_HILOS", "2"))
+SUBIDA_COLA_MAX_INTENTOS = int(os.getenv("SUBIDA_COLA_MAX_INTENTOS", "10"))
+SUBIDA_COLA_BACKOFF_MAX_SEG = float(os.getenv("SUBIDA_COLA_BACKOFF_MAX_SEG", "600"))
+SUBIDA_COLA_INTERVALO_SEG = float(os.getenv("SUBIDA_COLA_INTERVALO_SEG", "5"))
+
+# Paginación keyset de listados
+PAGINACION_TAMANO = int(os.getenv("PAGINACION_TAMANO", "50"))
+
+# Instantáneas locales Parquet de dashboard y reportes (app/utils/snapshots.py)
+SNAPSHOTS_ACTIVOS = os.getenv("SNAPSHOTS_ACTIVOS", "true").lower() == "true"
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "data/snapshots")
+SNAPSHOT_SYNC_SEG = float(os.getenv("SNAPSHOT_SYNC_SEG", "30"))
+SNAPSHOT_SOLAPE_SEG = float(os.getenv("SNAPSHOT_SOLAPE_SEG", "60"))
+SNAPSHOT_LOTE = int(os.getenv("SNAPSHOT_LOTE", "1000"))
+SNAPSHOT_MAX_DELTAS = int(os.getenv("SNAPSHOT_MAX_DELTAS", "20"))
+SNAPSHOT_RECONCILIAR_SEG = float(os.getenv("SNAPSHOT_RECONCILIAR_SEG", "600"))
+SNAPSHOT_RECARGA_SEG = float(os.getenv("SNAPSHOT_RECARGA_SEG", "86400"))
+
+# Suscripción realtime a cambios de Postgres (app/utils/cambios_realtime.py)
+REALTIME_ACTIVO = os.getenv("REALTIME_ACTIVO", "true").lower() == "true"
+REALTIME_TABLAS = [t.strip() for t in os.getenv(
+    "REALTIME_TABLAS",
+    "riesgos,incidentes,inspecciones,hallazgos,epp_asignaciones,capacitaciones,documentos"
+).split(",") if t.strip()]
+REALTIME_REFRESCO_SEG = float(os.getenv("REALTIME_REFRESCO_SEG", "5"))
+REALTIME_VERIFICAR_SEG = float(os.getenv("REALTIME_VERIFICAR_SEG", "15"))
+REALTIME_BACKOFF_MAX_SEG = float(os.getenv("REALTIME_BACKOFF_MAX_SEG", "300"))
+
+# Caché de cargadores (invalidada por escritura, ver app/utils/cache_tablas.py)
+CACHE_TTL_SEG = int(os.getenv("CACHE_TTL_SEG", "3600"))
+
+# Datos de referencia (áreas, usuarios, catálogo EPP)
+REFERENCIA_TTL_SEG = int(os.getenv("REFERENCIA_TTL_SEG", "600"))
+
+# n8n: outbox durable y entrega en segundo plano (app/utils/n8n_client.py)
+N8N_WEBHOOK_URL = os.getenv("N8N_WEBHOOK_URL")
+N8N_OUTBOX_DB = os.getenv("N8N_OUTBOX_DB", "data/n8n_outbox.db")
+N8N_TIMEOUT_SEG = float(os.getenv("N8N_TIMEOUT_SEG", "5"))
+N8N_REINTENTOS = int(os.getenv("N8N_REINTENTOS", "3"))
+N8N_BACKOFF_BASE_SEG = float(os.getenv("N8N_BACKOFF_BASE_SEG", "1"))
+N8N_BACKOFF_MAX_SEG = float(os.getenv("N8N_BACKOFF_MAX_SEG", "10"))
+N8N_REPROGRAMAR_MAX_SEG = float(os.getenv("N8N_REPROGRAMAR_MAX_SEG", "3600"))
+N8N_MAX_INTENTOS = int(os.getenv("N8N_MAX_INTENTOS", "20"))
+N8N_INTERVALO_SEG = float(os.getenv("N8N_INTERVALO_SEG", "5"))
+N8N_LOTE_MAX = int(os.getenv("N8N_LOTE_MAX", "50"))
+N8N_LOTE_LATENCIA_SEG = float(os.getenv("N8N_LOTE_LATENCIA_SEG", "2"))
+# Rutas cuyos flujos n8n aceptan el sobre de lote (las de operaciones masivas:
+# inspecciones recurrentes, asistencia en grilla, renovación de EPP en lote);
+# el resto recibe un POST por evento
+N8N_RUTAS_LOTE = [r.strip() for r in os.getenv(
+    "N8N_RUTAS_LOTE",
+    "inspeccion-programada,asistencia-registrada,epp-renovado"
+).split(",") if r.strip()]
+N8N_RETENCION_ENVIADOS_SEG = float(os.getenv("N8N_RETENCION_ENVIADOS_SEG", "604800"))
+
+# Inscripción masiva de asistentes (filas por upsert)
+INSCRIPCION_LOTE_TAMANO = int(os.getenv("INSCRIPCION_LOTE_TAMANO", "500"))
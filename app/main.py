@@ -1,16 +1,9 @@
 import streamlit as st
 import sys
+import importlib
 sys.path.append(".")
 
 from app.auth import autenticar_usuario
-from app.modules import (
-    riesgos, inspecciones, capacitaciones, 
-    incidentes, epp, documental, reportes, dashboard
-)
-
-with open("app/static/css/dashboard.css") as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-
 
 # Configuración de página
 st.set_page_config(
@@ -19,49 +12,65 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Opción del menú -> módulo en app/modules. Los módulos se importan solo al
+# navegar a ellos: la pantalla de login no carga plotly, reportlab ni pandas.
+MODULOS = {
+    "🏠 Dashboard": "dashboard",
+    "⚠️ Gestión de Riesgos": "riesgos",
+    "📋 Inspecciones": "inspecciones",
+    "🎓 Capacitaciones": "capacitaciones",
+    "🚨 Incidentes": "incidentes",
+    "🛡️ Gestión de EPP": "epp",
+    "📚 Documentos": "documental",
+    "📊 Reportes": "reportes"
+}
+
+@st.cache_resource
+def leer_css():
+    """Hoja de estilos leída una sola vez por proceso"""
+    with open("app/static/css/dashboard.css") as f:
+        return f.read()
+
+def cargar_modulo(nombre):
+    """Importar (una vez, luego queda en sys.modules) el módulo de la ruta"""
+    return importlib.import_module(f"app.modules.{nombre}")
+
 def main():
+    st.markdown(f"<style>{leer_css()}</style>", unsafe_allow_html=True)
+
     # Autenticación
     usuario = autenticar_usuario()
-    
+
     if not usuario:
         st.stop()
-    
+
     # Sidebar - Navegación
     st.sidebar.title(f"👤 {usuario['nombre_completo']}")
     st.sidebar.markdown(f"**Rol:** {usuario['rol'].upper()}")
-    
+
+    # Subidas de evidencia en segundo plano (se importa tras el login). Los
+    # hilos arrancan aquí para retomar lo que quedó en la cola tras un reinicio
+    from app.utils.cola_subidas import iniciar_workers, mostrar_estado_subidas
+    iniciar_workers()
+    with st.sidebar:
+        mostrar_estado_subidas()
+
+    # Outbox n8n: entregar eventos pendientes de ejecuciones anteriores
+    from app.utils.n8n_client import iniciar_worker
+    iniciar_worker()
+
+    # Cambios de las tablas por realtime: mantienen las cachés al día
+    from app.utils.cambios_realtime import iniciar_suscripcion
+    iniciar_suscripcion()
+
     modulo = st.sidebar.selectbox(
         "Módulos",
-        [
-            "🏠 Dashboard",
-            "⚠️ Gestión de Riesgos",
-            "📋 Inspecciones",
-            "🎓 Capacitaciones",
-            "🚨 Incidentes",
-            "🛡️ Gestión de EPP",
-            "📚 Documentos",
-            "📊 Reportes"
-        ]
+        list(MODULOS)
     )
-    
+
     # Router de módulos
-    if modulo == "🏠 Dashboard":
-        dashboard.mostrar(usuario)
-    elif "Riesgos" in modulo:
-        riesgos.mostrar(usuario)
-    elif "Inspecciones" in modulo:
-        inspecciones.mostrar(usuario)
-    elif "Capacitaciones" in modulo:
-        capacitaciones.mostrar(usuario)
-    elif "Incidentes" in modulo:
-        incidentes.mostrar(usuario)
-    elif "EPP" in modulo:
-        epp.mostrar(usuario)
-    elif "Documentos" in modulo:
-        documental.mostrar(usuario)
-    elif "Reportes" in modulo:
-        reportes.mostrar(usuario)
-    
+    cargar_modulo(MODULOS[modulo]).mostrar(usuario)
+
 
 if __name__ == "__main__":
     main()
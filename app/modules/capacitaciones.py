@@ -2,10 +2,15 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 from app.utils.supabase_client import get_supabase_client
-from app.utils.storage_helper import subir_archivo_storage
+from app.config import settings
+from app.utils.cache_tablas import invalidar_tablas
+from app.config.proyecciones import columnas
+from app.utils.datos_referencia import obtener_trabajadores
+from app.utils.storage_helper import subir_archivo_storage, descartar_subida
+from app.utils.pestanas import mostrar_pestanas
+from app.utils.n8n_client import encolar_evento, lote_eventos
 from app.auth import requerir_rol
 import json
-import requests
 
 def mostrar(usuario):
     """Módulo de Capacitaciones y Concientización (Ley 29783 Art. 31)"""
@@ -13,29 +18,14 @@ def mostrar(usuario):
     
     st.title("🎓 Gestión de Capacitaciones SST")
     
-    # Tabs principales
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "📅 Programar Capacitación",
-        "👥 Gestionar Asistentes",
-        "📤 Material de Capacitación",
-        "📋 Encuestas Post-Capacitación",
-        "📊 Reporte de Efectividad"
-    ])
-    
-    with tab1:
-        programar_capacitacion(usuario)
-    
-    with tab2:
-        gestionar_asistentes(usuario)
-    
-    with tab3:
-        gestionar_material(usuario)
-    
-    with tab4:
-        encuestas_post_capacitacion(usuario)
-    
-    with tab5:
-        reporte_efectividad(usuario)
+    # Pestañas: solo se ejecuta la activa
+    mostrar_pestanas({
+        "📅 Programar Capacitación": programar_capacitacion,
+        "👥 Gestionar Asistentes": gestionar_asistentes,
+        "📤 Material de Capacitación": gestionar_material,
+        "📋 Encuestas Post-Capacitación": encuestas_post_capacitacion,
+        "📊 Reporte de Efectividad": reporte_efectividad,
+    }, clave="capacitaciones", args=(usuario,))
 
 def programar_capacitacion(usuario):
     """Programar nueva capacitación con recordatorios automáticos"""
@@ -164,21 +154,21 @@ def programar_capacitacion(usuario):
                 
                 # Disparar webhook de n8n para recordatorios
                 try:
-                    requests.post(
-                        st.secrets["N8N_WEBHOOK_URL"] + "/capacitacion-programada",
-                        json={
-                            "capacitacion_id": result['id'],
-                            "codigo": codigo,
-                            "tema": tema,
-                            "fecha": fecha_hora.isoformat(),
-                            "recordatorios": {
-                                "24h": recordatorio_24h,
-                                "1h": recordatorio_1h
-                            }
+                    encolar_evento("capacitacion-programada", {
+                        "capacitacion_id": result['id'],
+                        "codigo": codigo,
+                        "tema": tema,
+                        "fecha": fecha_hora.isoformat(),
+                        "recordatorios": {
+                            "24h": recordatorio_24h,
+                            "1h": recordatorio_1h
                         }
-                    )
-                except:
-                    st.warning("⚠️ No se pudo conectar con n8n para recordatorios")
+                    })
+                except Exception as e:
+                    st.warning(f"⚠️ No se pudo registrar el envío de recordatorios a n8n: {e}")
+            else:
+                # La capacitación no se guardó: liberar el material ya subido
+                descartar_subida(capacitacion_data.get('material_preliminar_url'), 'sst-documentos')
 
 def guardar_capacitacion(data):
     """Guardar capacitación en Supabase"""
@@ -186,6 +176,7 @@ def guardar_capacitacion(data):
     
     try:
         response = supabase.table('capacitaciones').insert(data).execute()
+        invalidar_tablas('capacitaciones')
         return response.data[0] if response.data else None
     except Exception as e:
         st.error(f"Error guardando capacitación: {e}")
@@ -200,7 +191,7 @@ def gestionar_asistentes(usuario):
     
     # Cargar capacitaciones programadas
     capacitaciones = supabase.table('capacitaciones').select(
-        '*, asistentes_capacitacion(*, usuarios(*))'
+        columnas('capacitaciones.programadas')
     ).eq('estado', 'programada').execute().data
     
     if not capacitaciones:
@@ -228,9 +219,7 @@ def gestionar_asistentes(usuario):
         })
     
     # Cargar trabajadores disponibles
-    trabajadores = supabase.table('usuarios').select(
-        'id', 'nombre_completo', 'area', 'rol'
-    ).eq('activo', True).neq('rol', 'admin').execute().data
+    trabajadores = obtener_trabajadores()
     
     if not trabajadores:
         st.warning("⚠️ No hay trabajadores activos")
@@ -285,91 +274,220 @@ def gestionar_asistentes(usuario):
     
     if nuevos_asistentes:
         if st.button("📅 Agregar Asistentes Seleccionados", type="primary"):
-            agregar_asistentes(cap_seleccionada['id'], nuevos_asistentes)
-            st.success(f"✅ {len(nuevos_asistentes)} asistentes agregados")
+            st.session_state['reporte_inscripcion'] = agregar_asistentes(
+                cap_seleccionada['id'], nuevos_asistentes
+            )
             st.rerun()
     
+    # Resultado de la última inscripción (se muestra tras el rerun)
+    reporte = st.session_state.pop('reporte_inscripcion', None)
+    if reporte:
+        mostrar_reporte_inscripcion(reporte, df_trabajadores)
+    
     # Registrar asistencia el día de la capacitación
     st.markdown("### ✅ Registrar Asistencia")
     
     if datetime.now().date() == pd.to_datetime(cap_seleccionada['fecha_programada']).date():
         st.success("🎯 Hoy es el día de la capacitación. Puedes registrar asistencia.")
         
-        for asistente in asistentes_actuales:
-            with st.expander(f"📝 {asistente['usuarios']['nombre_completo']}"):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    asistio = st.checkbox(
-                        "Asistió",
-                        value=asistente['asistio'],
-                        key=f"asist_{asistente['id']}"
-                    )
-                
-                with col2:
-                    calificacion = st.number_input(
-                        "Calificación (1-5)",
-                        min_value=1,
-                        max_value=5,
-                        value=asistente.get('calificacion', 3),
-                        key=f"calif_{asistente['id']}"
-                    )
-                
-                feedback = st.text_area(
-                    "Feedback del Asistente",
-                    value=asistente.get('feedback', ''),
-                    key=f"feed_{asistente['id']}",
-                    help="Comentarios sobre la capacitación"
-                )
+        if not asistentes_actuales:
+            st.info("ℹ️ No hay asistentes asignados aún")
+            return
+        
+        # Planilla: se marca a todos y se guarda con una sola petición
+        df_planilla = pd.DataFrame([
+            {
+                'id': a['id'],
+                'Nombre': a['usuarios']['nombre_completo'],
+                'Asistió': a['asistio'],
+                'Calificación': a.get('calificacion'),
+                'Feedback': a.get('feedback') or ''
+            } for a in asistentes_actuales
+        ]).set_index('id')
+        
+        with st.form(f"planilla_asistencia_{cap_seleccionada['id']}"):
+            marcar_todos = st.checkbox("Marcar todos como presentes")
+            
+            planilla = st.data_editor(
+                df_planilla,
+                column_config={
+                    'Nombre': st.column_config.TextColumn(disabled=True),
+                    'Asistió': st.column_config.CheckboxColumn(),
+                    'Calificación': st.column_config.NumberColumn(
+                        min_value=1, max_value=5, step=1, help="Calificación (1-5)"
+                    ),
+                    'Feedback': st.column_config.TextColumn(help="Comentarios sobre la capacitación")
+                },
+                hide_index=True,
+                use_container_width=True,
+                num_rows="fixed",
+                key=f"editor_asistencia_{cap_seleccionada['id']}"
+            )
+            
+            guardar = st.form_submit_button("💾 Guardar Asistencia", type="primary")
+        
+        if guardar:
+            if marcar_todos:
+                planilla['Asistió'] = True
+            
+            originales = {a['id']: a for a in asistentes_actuales}
+            cambios = []
+            for asistente_id, editada in planilla.iterrows():
+                original = originales[asistente_id]
+                calificacion = None if pd.isna(editada['Calificación']) else int(editada['Calificación'])
+                asistio = bool(editada['Asistió'])
+                feedback = editada['Feedback'] or ''
                 
-                if st.button("💾 Guardar Asistencia", key=f"save_{asistente['id']}"):
-                    actualizar_asistencia(
-                        asistente['id'],
-                        asistio,
-                        calificacion,
-                        feedback
-                    )
-                    st.success("✅ Asistencia registrada")
+                if (asistio, calificacion, feedback) != (
+                    original['asistio'], original.get('calificacion'), original.get('feedback') or ''
+                ):
+                    cambios.append({
+                        **original,
+                        'asistio': asistio,
+                        'calificacion': calificacion,
+                        'feedback': feedback or None
+                    })
+            
+            if not cambios:
+                st.info("ℹ️ No hay cambios que guardar")
+            elif registrar_asistencia_masiva(cap_seleccionada['id'], cambios, originales):
+                st.session_state['asistencia_guardada'] = len(cambios)
+                st.rerun()
+        
+        guardados = st.session_state.pop('asistencia_guardada', None)
+        if guardados:
+            st.success(f"✅ Asistencia registrada ({guardados} asistentes)")
     else:
         st.info(f"ℹ️ La capacitación es el {cap_seleccionada['fecha_programada']}. No puedes registrar asistencia aún.")
 
-def agregar_asistentes(capacitacion_id, trabajador_ids):
-    """Agregar múltiples asistentes a capacitación"""
+def agregar_asistentes(capacitacion_id, trabajador_ids, tamano_lote=None):
+    """
+    Inscribir trabajadores en una capacitación con upserts en bloque
+
+    Cada lote es una sola petición con conflicto en (capacitacion_id,
+    trabajador_id): los ya inscritos se ignoran, sin tocar su asistencia ni
+    calificación. Si un lote falla, el resto continúa.
+
+    Args:
+        capacitacion_id: ID de la capacitación
+        trabajador_ids: IDs de los trabajadores a inscribir
+        tamano_lote: Filas por petición (por defecto INSCRIPCION_LOTE_TAMANO)
+
+    Returns:
+        Lista por trabajador: {'trabajador_id', 'resultado', 'detalle'} con
+        resultado 'inscrito', 'ya_inscrito' o 'error'
+    """
     supabase = get_supabase_client()
+    tamano_lote = tamano_lote or settings.INSCRIPCION_LOTE_TAMANO
+    trabajador_ids = list(dict.fromkeys(trabajador_ids))
+    reporte = []
+    
+    for inicio in range(0, len(trabajador_ids), tamano_lote):
+        lote = trabajador_ids[inicio:inicio + tamano_lote]
+        
+        try:
+            response = supabase.table('asistentes_capacitacion').upsert(
+                [{
+                    'capacitacion_id': capacitacion_id,
+                    'trabajador_id': trabajador_id,
+                    'asistio': False
+                } for trabajador_id in lote],
+                on_conflict='capacitacion_id,trabajador_id',
+                ignore_duplicates=True
+            ).execute()
+        except Exception as e:
+            reporte.extend(
+                {'trabajador_id': t, 'resultado': 'error', 'detalle': str(e)} for t in lote
+            )
+            continue
+        
+        # Con ignore_duplicates solo vuelven las filas insertadas
+        insertados = {fila['trabajador_id'] for fila in response.data or []}
+        reporte.extend(
+            {
+                'trabajador_id': t,
+                'resultado': 'inscrito' if t in insertados else 'ya_inscrito',
+                'detalle': None
+            } for t in lote
+        )
     
-    try:
-        for trabajador_id in trabajador_ids:
-            supabase.table('asistentes_capacitacion').insert({
-                'capacitacion_id': capacitacion_id,
-                'trabajador_id': trabajador_id,
-                'asistio': False
-            }).execute()
-    except Exception as e:
-        st.error(f"Error agregando asistentes: {e}")
+    if any(r['resultado'] == 'inscrito' for r in reporte):
+        invalidar_tablas('asistentes_capacitacion')
+    
+    return reporte
+
+def mostrar_reporte_inscripcion(reporte, df_trabajadores):
+    """Resumen y detalle por trabajador de una inscripción en bloque"""
+    df_reporte = pd.DataFrame(reporte).merge(
+        df_trabajadores[['id', 'nombre_completo', 'area']],
+        left_on='trabajador_id', right_on='id', how='left'
+    )
+    conteo = df_reporte['resultado'].value_counts()
+    
+    if conteo.get('inscrito', 0):
+        st.success(f"✅ {conteo['inscrito']} asistentes agregados")
+    if conteo.get('ya_inscrito', 0):
+        st.info(f"ℹ️ {conteo['ya_inscrito']} ya estaban inscritos")
+    if conteo.get('error', 0):
+        st.error(f"❌ {conteo['error']} no se pudieron inscribir")
+    
+    with st.expander("Detalle de la inscripción", expanded=bool(conteo.get('error', 0))):
+        st.dataframe(
+            df_reporte[['nombre_completo', 'area', 'resultado', 'detalle']],
+            use_container_width=True,
+            hide_index=True
+        )
+
+def registrar_asistencia_masiva(capacitacion_id, cambios, originales):
+    """
+    Guardar la planilla de asistencia en un solo upsert por id
+
+    Args:
+        capacitacion_id: ID de la capacitación
+        cambios: Filas de asistentes_capacitacion modificadas (con id y trabajador_id)
+        originales: dict {id: fila} antes de editar, para detectar nuevas asistencias
 
-def actualizar_asistencia(asistente_id, asistio, calificacion, feedback):
-    """Actualizar registro de asistencia y calificación"""
+    Returns:
+        True si se guardó
+    """
     supabase = get_supabase_client()
+    ahora = datetime.now().isoformat()
+    
+    filas = []
+    for cambio in cambios:
+        original = originales[cambio['id']]
+        if not cambio['asistio']:
+            fecha_asistencia = None
+        elif original['asistio'] and original.get('fecha_asistencia'):
+            fecha_asistencia = original['fecha_asistencia']
+        else:
+            fecha_asistencia = ahora
+        
+        filas.append({
+            'id': cambio['id'],
+            'capacitacion_id': capacitacion_id,
+            'trabajador_id': cambio['trabajador_id'],
+            'asistio': cambio['asistio'],
+            'calificacion': cambio['calificacion'],
+            'feedback': cambio['feedback'],
+            'fecha_asistencia': fecha_asistencia
+        })
     
     try:
-        supabase.table('asistentes_capacitacion').update({
-            'asistio': asistio,
-            'calificacion': calificacion,
-            'feedback': feedback,
-            'fecha_asistencia': datetime.now().isoformat() if asistio else None
-        }).eq('id', asistente_id).execute()
-        
-        # Disparar webhook para encuesta post-capacitación
-        if asistio:
-            try:
-                requests.post(
-                    st.secrets["N8N_WEBHOOK_URL"] + "/asistencia-registrada",
-                    json={"asistente_id": asistente_id}
-                )
-            except:
-                pass
+        supabase.table('asistentes_capacitacion').upsert(filas, on_conflict='id').execute()
+        invalidar_tablas('asistentes_capacitacion')
     except Exception as e:
         st.error(f"Error actualizando asistencia: {e}")
+        return False
+    
+    # Encuesta post-capacitación: solo a quienes recién se marcan como presentes,
+    # en una sola transacción del outbox (agrupada si la ruta está en N8N_RUTAS_LOTE)
+    with lote_eventos():
+        for fila in filas:
+            if fila['asistio'] and not originales[fila['id']]['asistio']:
+                encolar_evento("asistencia-registrada", {"asistente_id": fila['id']})
+    
+    return True
 
 def gestionar_material(usuario):
     """Subir y gestionar material de capacitación"""
@@ -379,7 +497,7 @@ def gestionar_material(usuario):
     supabase = get_supabase_client()
     
     # Cargar capacitaciones
-    capacitaciones = supabase.table('capacitaciones').select('id', 'codigo', 'tema').execute().data
+    capacitaciones = supabase.table('capacitaciones').select(columnas('capacitaciones.selector')).execute().data
     
     if not capacitaciones:
         st.warning("⚠️ No hay capacitaciones para gestionar material")
@@ -443,9 +561,11 @@ def gestionar_material(usuario):
                             'archivo_url': url_material,
                             'subido_por': usuario['id']
                         }).execute()
+                        invalidar_tablas('material_capacitacion')
                         
                         st.success("✅ Material subido exitosamente")
                     except Exception as e:
+                        descartar_subida(url_material, 'sst-documentos')
                         st.error(f"Error registrando material: {e}")
             else:
                 st.warning("⚠️ Selecciona un archivo primero")
@@ -467,6 +587,7 @@ def gestionar_material(usuario):
                     'archivo_url': video_url,
                     'subido_por': usuario['id']
                 }).execute()
+                invalidar_tablas('material_capacitacion')
                 st.success("✅ Video agregado")
             except Exception as e:
                 st.error(f"Error agregando video: {e}")
@@ -475,7 +596,7 @@ def gestionar_material(usuario):
     st.markdown("### 📚 Material Actual")
     
     material_existente = supabase.table('material_capacitacion').select(
-        '*'
+        columnas('capacitaciones.material')
     ).eq('capacitacion_id', cap_seleccionada['id']).execute().data
     
     if material_existente:
@@ -508,6 +629,7 @@ def eliminar_material(material_id, archivo_url):
         
         # Eliminar registro
         supabase.table('material_capacitacion').delete().eq('id', material_id).execute()
+        invalidar_tablas('material_capacitacion')
         
         st.success("✅ Material eliminado")
     except Exception as e:
@@ -522,7 +644,7 @@ def encuestas_post_capacitacion(usuario):
     
     # Cargar capacitaciones realizadas
     capacitaciones = supabase.table('capacitaciones').select(
-        '*, asistentes_capacitacion(*, usuarios(*))'
+        columnas('capacitaciones.realizadas')
     ).eq('estado', 'realizada').execute().data
     
     if not capacitaciones:
@@ -543,7 +665,7 @@ def encuestas_post_capacitacion(usuario):
     st.markdown("### 📊 Resultados de Encuestas")
     
     encuestas = supabase.table('encuestas_capacitacion').select(
-        '*'
+        columnas('capacitaciones.encuestas')
     ).eq('capacitacion_id', cap_seleccionada['id']).execute().data
     
     if encuestas:
@@ -584,7 +706,7 @@ def encuestas_post_capacitacion(usuario):
     
     # Verificar si ya respondió
     ya_respondio = supabase.table('encuestas_capacitacion').select(
-        '*'
+        columnas('capacitaciones.encuesta_respondida')
     ).eq('capacitacion_id', cap_seleccionada['id']).eq('trabajador_id', usuario['id']).execute().data
     
     if ya_respondio:
@@ -662,6 +784,7 @@ def guardar_encuesta(data):
     
     try:
         supabase.table('encuestas_capacitacion').insert(data).execute()
+        invalidar_tablas('encuestas_capacitacion')
     except Exception as e:
         st.error(f"Error guardando encuesta: {e}")
 
@@ -695,7 +818,7 @@ def reporte_efectividad(usuario):
     
     # Cargar capacitaciones en rango
     query = supabase.table('capacitaciones').select(
-        '*, asistentes_capacitacion(*, usuarios(*)), encuestas_capacitacion(*)'
+        columnas('capacitaciones.efectividad')
     ).gte('fecha_programada', fecha_inicio).lte('fecha_programada', fecha_fin)
     
     if area_filtro:
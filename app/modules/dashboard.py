@@ -3,7 +3,13 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from app.utils.supabase_client import get_supabase_client
+from app.utils.datos_referencia import obtener_areas
+from app.utils.carga_paralela import cargar_en_paralelo, mostrar_tiempos_carga
+from app.utils.snapshots import consulta_tabla
+from app.utils.kpis import obtener_kpis, calcular_tasa_frecuencia, calcular_tasa_severidad
+from app.utils.cache_tablas import cache_por_tablas
+from app.utils.cambios_realtime import vigilar_cambios
+from app.utils.pestanas import mostrar_pestanas
 from app.auth import requerir_rol
 import io
 
@@ -24,32 +30,24 @@ def mostrar(usuario):
         st.warning("No hay datos para mostrar con los filtros seleccionados")
         return
     
-    # KPI Cards
-    mostrar_kpi_cards(data)
-    
-    # Tabs de visualización
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "📈 Tendencias",
-        "⚠️ Riesgos",
-        "🚨 Incidentes",
-        "📋 Inspecciones",
-        "📊 Reportes Legales"
-    ])
-    
-    with tab1:
-        mostrar_tendencias(data, filtros)
+    if usuario['rol'] == 'admin':
+        with st.sidebar.expander("⏱️ Tiempos de Carga"):
+            mostrar_tiempos_carga('dashboard', st)
     
-    with tab2:
-        mostrar_analisis_riesgos(data)
+    # Se vuelve a dibujar sola cuando llegan cambios de sus tablas
+    vigilar_cambios(*cargar_datos_dashboard.tablas)
     
-    with tab3:
-        mostrar_analisis_incidentes(data)
-    
-    with tab4:
-        mostrar_analisis_inspecciones(data)
-    
-    with tab5:
-        mostrar_reportes_legales(data, filtros)
+    # KPI Cards
+    mostrar_kpi_cards(filtros)
+    
+    # Pestañas de visualización: solo se ejecuta la activa
+    mostrar_pestanas({
+        "📈 Tendencias": lambda: mostrar_tendencias(data, filtros),
+        "⚠️ Riesgos": lambda: mostrar_analisis_riesgos(data),
+        "🚨 Incidentes": lambda: mostrar_analisis_incidentes(data),
+        "📋 Inspecciones": lambda: mostrar_analisis_inspecciones(data),
+        "📊 Reportes Legales": lambda: mostrar_reportes_legales(data, filtros),
+    }, clave="dashboard")
 
 def crear_filtros_dashboard():
     """Crear filtros interactivos para el dashboard"""
@@ -65,9 +63,7 @@ def crear_filtros_dashboard():
     )
     
     # Áreas
-    supabase = get_supabase_client()
-    areas = supabase.table('riesgos').select('area').execute().data
-    areas_unicas = sorted(list(set([a['area'] for a in areas]))) if areas else []
+    areas_unicas = obtener_areas()
     
     areas_seleccionadas = st.multiselect(
         "Áreas",
@@ -96,70 +92,59 @@ def crear_filtros_dashboard():
         'nivel_riesgo_min': nivel_riesgo
     }
 
-@st.cache_data(ttl=300)
+@cache_por_tablas('riesgos', 'incidentes', 'inspecciones', 'hallazgos', 'epp_asignaciones', 'capacitaciones')
 def cargar_datos_dashboard(filtros):
-    """Cargar y procesar datos para el dashboard con caching de 5 min"""
-    
-    supabase = get_supabase_client()
+    """Cargar y procesar datos para el dashboard (caché invalidada al escribir en sus tablas)"""
     
     try:
-        # Cargar riesgos
-        query_riesgos = supabase.table('riesgos').select('*')
-        
-        if filtros['areas']:
-            query_riesgos = query_riesgos.in_('area', filtros['areas'])
-        
-        riesgos = query_riesgos.execute().data
-        
-        # Cargar incidentes con filtro de fecha
-        query_incidentes = supabase.table('incidentes').select('*').gte(
-            'fecha_hora', filtros['fecha_inicio']
-        ).lte('fecha_hora', filtros['fecha_fin'])
+        por_area = [('area', 'in', filtros['areas'])] if filtros['areas'] else []
         
+        # Incidentes con filtro de fecha
+        filtros_incidentes = [
+            ('fecha_hora', 'gte', filtros['fecha_inicio']),
+            ('fecha_hora', 'lte', filtros['fecha_fin'])
+        ] + por_area
         if filtros['tipos_incidente']:
-            query_incidentes = query_incidentes.in_('tipo', filtros['tipos_incidente'])
-        if filtros['areas']:
-            query_incidentes = query_incidentes.in_('area', filtros['areas'])
-        
-        incidentes = query_incidentes.execute().data
+            filtros_incidentes.append(('tipo', 'in', filtros['tipos_incidente']))
         
-        # Cargar inspecciones
-        inspecciones = supabase.table('inspecciones').select('*').gte(
-            'fecha_programada', filtros['fecha_inicio']
-        ).execute().data
-        
-        # Cargar hallazgos
-        hallazgos = supabase.table('hallazgos').select('*').execute().data
-        
-        # Cargar EPP
-        epp = supabase.table('epp_asignaciones').select('*').execute().data
-        
-        # Cargar capacitaciones
-        capacitaciones = supabase.table('capacitaciones').select('*').execute().data
-        
-        return {
-            'riesgos': pd.DataFrame(riesgos) if riesgos else pd.DataFrame(),
-            'incidentes': pd.DataFrame(incidentes) if incidentes else pd.DataFrame(),
-            'inspecciones': pd.DataFrame(inspecciones) if inspecciones else pd.DataFrame(),
-            'hallazgos': pd.DataFrame(hallazgos) if hallazgos else pd.DataFrame(),
-            'epp': pd.DataFrame(epp) if epp else pd.DataFrame(),
-            'capacitaciones': pd.DataFrame(capacitaciones) if capacitaciones else pd.DataFrame()
-        }
+        # Las seis lecturas son independientes: se ejecutan en paralelo, cada
+        # una desde la instantánea local de su tabla (solo baja lo que cambió)
+        return cargar_en_paralelo({
+            'riesgos': consulta_tabla('riesgos', 'dashboard.riesgos', por_area),
+            'incidentes': consulta_tabla('incidentes', 'dashboard.incidentes', filtros_incidentes),
+            'inspecciones': consulta_tabla('inspecciones', 'dashboard.inspecciones', [
+                ('fecha_programada', 'gte', filtros['fecha_inicio'])
+            ]),
+            'hallazgos': consulta_tabla('hallazgos', 'dashboard.hallazgos'),
+            'epp': consulta_tabla('epp_asignaciones', 'dashboard.epp'),
+            'capacitaciones': consulta_tabla('capacitaciones', 'dashboard.capacitaciones')
+        }, nombre_carga='dashboard')
         
     except Exception as e:
         st.error(f"Error cargando datos: {e}")
         return None
 
-def mostrar_kpi_cards(data):
-    """Mostrar tarjetas de métricas clave en tiempo real"""
+def mostrar_kpi_cards(filtros):
+    """Mostrar tarjetas de métricas clave (agregadas en el servidor vía RPC kpis_sst)"""
     
     st.markdown("### 📊 Indicadores Clave de Desempeño")
     
+    try:
+        kpis = obtener_kpis(
+            filtros['fecha_inicio'],
+            filtros['fecha_fin'],
+            areas=filtros['areas'],
+            tipos_incidente=filtros['tipos_incidente']
+        )
+    except Exception as e:
+        st.error(f"Error cargando indicadores: {e}")
+        return
+    
     col1, col2, col3, col4, col5 = st.columns(5)
     
     # KPI 1: Riesgos Pendientes
     with col1:
-        riesgos_pendientes = len(data['riesgos'][data['riesgos']['estado'] == 'pendiente'])
+        riesgos_pendientes = kpis['riesgos_pendientes']
         st.metric(
             label="⚠️ Riesgos Pendientes",
             value=riesgos_pendientes,
@@ -169,7 +154,7 @@ def mostrar_kpi_cards(data):
     
     # KPI 2: Incidentes Mes
     with col2:
-        incidentes_mes = len(data['incidentes'])
+        incidentes_mes = kpis['incidentes_total']
         tasa_frecuencia = calcular_tasa_frecuencia(incidentes_mes, 50000)  # 50k horas hombre
         st.metric(
             label="🚨 Tasa Frecuencia",
@@ -180,7 +165,7 @@ def mostrar_kpi_cards(data):
     
     # KPI 3: EPP por Vencer
     with col3:
-        epp_vencer = len(data['epp'][pd.to_datetime(data['epp']['fecha_vencimiento']).dt.date <= (datetime.now().date() + timedelta(days=30))])
+        epp_vencer = kpis['epp_por_vencer']
         st.metric(
             label="🛡️ EPP por Vencer",
             value=epp_vencer,
@@ -190,7 +175,7 @@ def mostrar_kpi_cards(data):
     
     # KPI 4: Hallazgos Abiertos
     with col4:
-        hallazgos_abiertos = len(data['hallazgos'][data['hallazgos']['estado'] == 'abierto'])
+        hallazgos_abiertos = kpis['hallazgos_abiertos']
         st.metric(
             label="📋 Hallazgos Abiertos",
             value=hallazgos_abiertos,
@@ -200,26 +185,15 @@ def mostrar_kpi_cards(data):
     
     # KPI 5: Cumplimiento Capacitación
     with col5:
-        if not data['capacitaciones'].empty:
-            capac_completadas = len(data['capacitaciones'][data['capacitaciones']['estado'] == 'realizada'])
-            capac_total = len(data['capacitaciones'])
-            cumplimiento = (capac_completadas / capac_total * 100) if capac_total > 0 else 0
+        if kpis['capacitaciones_total'] > 0:
             st.metric(
                 label="🎓 % Capacitación",
-                value=f"{cumplimiento:.1f}%",
-                delta=f"{capac_completadas}/{capac_total} completadas"
+                value=f"{kpis['cumplimiento_capacitacion']:.1f}%",
+                delta=f"{kpis['capacitaciones_realizadas']}/{kpis['capacitaciones_total']} completadas"
             )
         else:
             st.metric(label="🎓 % Capacitación", value="N/A")
 
-def calcular_tasa_frecuencia(incidentes, horas_hombre):
-    """Tasa de Frecuencia = (N° Accidentes × 1,000,000) / Horas Hombre Trabajadas"""
-    return (incidentes * 1_000_000) / horas_hombre if horas_hombre > 0 else 0
-
-def calcular_tasa_severidad(dias_perdidos, horas_hombre):
-    """Tasa de Severidad = (Días Perdidos × 1,000,000) / Horas Hombre Trabajadas"""
-    return (dias_perdidos * 1_000_000) / horas_hombre if horas_hombre > 0 else 0
-
 def mostrar_tendencias(data, filtros):
     """Análisis de tendencias históricas"""
     
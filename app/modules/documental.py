@@ -2,9 +2,14 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 from app.utils.supabase_client import get_supabase_client
-from app.utils.storage_helper import subir_archivo_storage
+from app.utils.cache_tablas import invalidar_tablas
+from app.config.proyecciones import columnas
+from app.utils.datos_referencia import obtener_areas
+from app.utils.storage_helper import subir_archivo_storage, descartar_subida
+from app.utils.paginacion import paginar_consulta, citar_valor
+from app.utils.pestanas import mostrar_pestanas
+from app.utils.n8n_client import encolar_evento
 from app.auth import requerir_rol
-import requests
 
 def mostrar(usuario):
     """Módulo de Gestión Documental (Ley 29783 Art. 24)"""
@@ -12,29 +17,14 @@ def mostrar(usuario):
     
     st.title("📚 Gestión Documental SST")
     
-    # Tabs principales
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "📂 Repositorio Documental",
-        "➕ Subir/Editar Documento",
-        "✅ Revisión y Aprobación",
-        "🔔 Alertas y Vencimientos",
-        "📊 Reportes de Auditoría"
-    ])
-    
-    with tab1:
-        repositorio_documental(usuario)
-    
-    with tab2:
-        subir_editar_documento(usuario)
-    
-    with tab3:
-        revision_aprobacion(usuario)
-    
-    with tab4:
-        alertas_vencimientos(usuario)
-    
-    with tab5:
-        reportes_auditoria(usuario)
+    # Pestañas: solo se ejecuta la activa
+    mostrar_pestanas({
+        "📂 Repositorio Documental": repositorio_documental,
+        "➕ Subir/Editar Documento": subir_editar_documento,
+        "✅ Revisión y Aprobación": revision_aprobacion,
+        "🔔 Alertas y Vencimientos": alertas_vencimientos,
+        "📊 Reportes de Auditoría": reportes_auditoria,
+    }, clave="documental", args=(usuario,))
 
 def repositorio_documental(usuario):
     """Repositorio centralizado de documentos"""
@@ -75,8 +65,7 @@ def repositorio_documental(usuario):
     col_filtro4, col_filtro5 = st.columns(2)
     
     with col_filtro4:
-        areas = supabase.table('areas').select('area').execute().data
-        areas_unicas = sorted(list(set([a['area'] for a in areas if a['area']])))
+        areas_unicas = obtener_areas()
         area_filtro = st.multiselect(
             "Área Aplicación",
             options=areas_unicas,
@@ -92,23 +81,42 @@ def repositorio_documental(usuario):
         )
     
     # Consultar documentos
-    query = supabase.table('documentos').select(
-        '*, historial_versiones(*), usuarios(nombre_completo)'
-    )
-    
-    if tipo_filtro != "todos":
-        query = query.eq('tipo', tipo_filtro)
-    
-    if estado_filtro != "todos":
-        query = query.eq('estado', estado_filtro)
-    
-    if area_filtro:
-        query = query.in_('area', area_filtro)
-    
-    if buscar:
-        query = query.ilike('titulo', f'%{buscar}%').or_().ilike('keywords', f'%{buscar}%')
+    def construir_consulta():
+        query = supabase.table('documentos').select(
+            columnas('documental.repositorio')
+        )
+        
+        if tipo_filtro != "todos":
+            query = query.eq('tipo', tipo_filtro)
+        
+        if estado_filtro != "todos":
+            query = query.eq('estado', estado_filtro)
+        
+        if area_filtro:
+            query = query.in_('area', area_filtro)
+        
+        if buscar:
+            patron = citar_valor(f'%{buscar}%')
+            query = query.or_(f'titulo.ilike.{patron},keywords.ilike.{patron}')
+        
+        # Filtro de vigencia en el servidor para que la paginación sea exacta
+        if vigencia_filtro != "todos":
+            hoy = datetime.now().date()
+            if vigencia_filtro == "vigente":
+                query = query.gt('fecha_vigencia', hoy)
+            elif vigencia_filtro == "por_vencer":
+                query = query.lte('fecha_vigencia', hoy + timedelta(days=30)).gt('fecha_vigencia', hoy)
+            elif vigencia_filtro == "vencido":
+                query = query.lte('fecha_vigencia', hoy)
+        
+        return query
     
-    documentos = query.execute().data
+    # Paginación keyset en el servidor
+    documentos = paginar_consulta(
+        construir_consulta,
+        clave="documentos",
+        firma_filtros=(buscar, tipo_filtro, estado_filtro, tuple(area_filtro), vigencia_filtro)
+    )
     
     if not documentos:
         st.info("ℹ️ No se encontraron documentos con los filtros seleccionados")
@@ -118,19 +126,8 @@ def repositorio_documental(usuario):
     df_docs = pd.DataFrame(documentos)
     df_docs['fecha_vigencia'] = pd.to_datetime(df_docs['fecha_vigencia']).dt.date
     
-    # Aplicar filtro de vigencia
-    if vigencia_filtro != "todos":
-        hoy = datetime.now().date()
-        if vigencia_filtro == "vigente":
-            df_docs = df_docs[df_docs['fecha_vigencia'] > hoy]
-        elif vigencia_filtro == "por_vencer":
-            fecha_limite = hoy + timedelta(days=30)
-            df_docs = df_docs[(df_docs['fecha_vigencia'] <= fecha_limite) & (df_docs['fecha_vigencia'] > hoy)]
-        elif vigencia_filtro == "vencido":
-            df_docs = df_docs[df_docs['fecha_vigencia'] <= hoy]
-    
     # Mostrar documentos en formato de cards
-    st.markdown(f"### 📄 Documentos Encontrados: {len(df_docs)}")
+    st.markdown(f"### 📄 Documentos en esta página: {len(df_docs)}")
     
     for _, doc in df_docs.iterrows():
         with st.container():
@@ -191,7 +188,7 @@ def subir_editar_documento(usuario):
     # Verificar si hay documento en edición
     if 'editar_documento_id' in st.session_state:
         doc_id = st.session_state['editar_documento_id']
-        documento_editar = supabase.table('documentos').select('*').eq('id', doc_id).execute().data
+        documento_editar = supabase.table('documentos').select(columnas('documental.edicion')).eq('id', doc_id).execute().data
         
         if documento_editar:
             documento_editar = documento_editar[0]
@@ -247,8 +244,7 @@ def subir_editar_documento(usuario):
             )
             
             # Obtener áreas disponibles
-            areas = supabase.table('areas').select('area').execute().data
-            areas_unicas = sorted(list(set([a['area'] for a in areas if a['area']])))
+            areas_unicas = obtener_areas()
             area = st.selectbox(
                 "Área de Aplicación",
                 options=areas_unicas,
@@ -333,19 +329,25 @@ def subir_editar_documento(usuario):
                 'aprobado': False
             }
             
-            # Guardar o actualizar
+            # Guardar o actualizar (si falla, se libera el archivo recién subido)
+            try:
+                if documento_editar:
+                    supabase.table('documentos').update(data).eq('id', doc_id).execute()
+                else:
+                    supabase.table('documentos').insert(data).execute()
+            except Exception:
+                if archivo:
+                    descartar_subida(archivo_url, 'sst-documentos')
+                raise
+            invalidar_tablas('documentos')
+            
             if documento_editar:
-                # Actualizar documento existente
-                supabase.table('documentos').update(data).eq('id', doc_id).execute()
-                
                 # Guardar en historial de versiones
                 guardar_version_historial(doc_id, documento_editar)
                 
                 del st.session_state['editar_documento_id']
                 st.success(f"✅ Documento actualizado: {titulo}")
             else:
-                # Insertar nuevo documento
-                supabase.table('documentos').insert(data).execute()
                 st.success(f"✅ Documento registrado: {titulo}")
                 
                 # Notificar vía n8n
@@ -364,19 +366,16 @@ def guardar_version_historial(documento_id, version_anterior):
             'archivo_url': version_anterior['archivo_url'],
             'fecha_reemplazo': datetime.now().isoformat()
         }).execute()
+        invalidar_tablas('historial_versiones')
     except Exception as e:
         st.warning(f"⚠️ No se pudo guardar historial: {e}")
 
 def notificar_documento_nuevo(data):
     """Notificar a n8n sobre nuevo documento"""
     try:
-        requests.post(
-            st.secrets["N8N_WEBHOOK_URL"] + "/documento-nuevo",
-            json=data,
-            timeout=5
-        )
-    except:
-        pass
+        encolar_evento("documento-nuevo", data)
+    except Exception as e:
+        st.warning(f"⚠️ No se pudo registrar la notificación: {e}")
 
 def revision_aprobacion(usuario):
     """Workflow de revisión y aprobación de documentos"""
@@ -387,7 +386,7 @@ def revision_aprobacion(usuario):
     
     # Cargar documentos en revisión o pendientes de aprobación
     documentos = supabase.table('documentos').select(
-        '*, usuarios(nombre_completo)'
+        columnas('documental.revision')
     ).in_('estado', ['revision', 'borrador']).execute().data
     
     if not documentos:
@@ -484,7 +483,12 @@ def revision_aprobacion(usuario):
                 )
                 data_update['revision_evidencia_url'] = url_evidencia
             
-            supabase.table('documentos').update(data_update).eq('id', doc_seleccionado['id']).execute()
+            try:
+                supabase.table('documentos').update(data_update).eq('id', doc_seleccionado['id']).execute()
+            except Exception:
+                descartar_subida(data_update.get('revision_evidencia_url'), 'sst-documentos')
+                raise
+            invalidar_tablas('documentos')
             
             # Guardar comentarios en tabla de auditoría
             supabase.table('revisiones_documentos').insert({
@@ -494,6 +498,7 @@ def revision_aprobacion(usuario):
                 'comentarios': comentarios_revision,
                 'fecha_revision': datetime.now().isoformat()
             }).execute()
+            invalidar_tablas('revisiones_documentos')
             
             # Notificar
             if notificar_responsable:
@@ -512,12 +517,9 @@ def revision_aprobacion(usuario):
 def notificar_revision_documento(data):
     """Notificar a n8n sobre revisión de documento"""
     try:
-        requests.post(
-            st.secrets["N8N_WEBHOOK_URL"] + "/documento-revisado",
-            json=data
-        )
-    except:
-        pass
+        encolar_evento("documento-revisado", data)
+    except Exception as e:
+        st.warning(f"⚠️ No se pudo registrar la notificación: {e}")
 
 # Función auxiliar (defínela fuera o usa una lambda compleja, pero esto es más limpio)
 def obtener_etiqueta_documento(df, id_doc):
@@ -542,26 +544,26 @@ def alertas_vencimientos(usuario):
     col_kpi1, col_kpi2, col_kpi3, col_kpi4 = st.columns(4)
     
     with col_kpi1:
-        total_docs = supabase.table('documentos').select('*', count='exact').execute()
+        total_docs = supabase.table('documentos').select(columnas('documental.conteo'), count='exact', head=True).execute()
         st.metric("📄 Total Documentos", total_docs.count)
     
     with col_kpi2:
-        vigentes = supabase.table('documentos').select('*', count='exact').gt('fecha_vigencia', datetime.now().date()).execute()
+        vigentes = supabase.table('documentos').select(columnas('documental.conteo'), count='exact', head=True).gt('fecha_vigencia', datetime.now().date()).execute()
         st.metric("✅ Vigentes", vigentes.count)
     
     with col_kpi3:
-        por_vencer = supabase.table('documentos').select('*', count='exact').lte('fecha_vigencia', datetime.now().date() + timedelta(days=30)).gt('fecha_vigencia', datetime.now().date()).execute()
+        por_vencer = supabase.table('documentos').select(columnas('documental.conteo'), count='exact', head=True).lte('fecha_vigencia', datetime.now().date() + timedelta(days=30)).gt('fecha_vigencia', datetime.now().date()).execute()
         st.metric("⚠️ Por Vencer", por_vencer.count)
     
     with col_kpi4:
-        vencidos = supabase.table('documentos').select('*', count='exact').lte('fecha_vigencia', datetime.now().date()).execute()
+        vencidos = supabase.table('documentos').select(columnas('documental.conteo'), count='exact', head=True).lte('fecha_vigencia', datetime.now().date()).execute()
         st.metric("🔴 Vencidos", vencidos.count)
     
     # Tabla de documentos críticos
     st.markdown("### 🚨 Documentos Críticos (Vencidos o Próximos)")
     
     documentos_criticos = supabase.table('documentos').select(
-        '*, usuarios(nombre_completo)'
+        columnas('documental.criticos')
     ).lte('fecha_vigencia', datetime.now().date() + timedelta(days=30)).execute().data
     
     if documentos_criticos:
@@ -612,16 +614,14 @@ def alertas_vencimientos(usuario):
                     'tipo': 'revision',
                     'creado_por': usuario['id']
                 }).execute()
+                invalidar_tablas('recordatorios_documentos')
                 st.success("✅ Revisión programada")
                 
                 # Notificar a n8n
-                requests.post(
-                    st.secrets["N8N_WEBHOOK_URL"] + "/revision-programada",
-                    json={
-                        'documento_id': doc_a_revisar,
-                        'fecha_revision': fecha_revision.isoformat()
-                    }
-                )
+                encolar_evento("revision-programada", {
+                    'documento_id': doc_a_revisar,
+                    'fecha_revision': fecha_revision.isoformat()
+                })
             except Exception as e:
                 st.error(f"Error programando revisión: {e}")
 
@@ -660,7 +660,7 @@ def generar_lista_maestra(supabase):
     """Generar lista maestra de documentos (formato auditoría)"""
     
     documentos = supabase.table('documentos').select(
-        '*, usuarios(nombre_completo)'
+        columnas('documental.lista_maestra')
     ).order('tipo').execute().data
     
     if not documentos:
@@ -701,7 +701,7 @@ def generar_reporte_vencimiento(supabase):
     fecha_limite = datetime.now().date() + timedelta(days=30)
     
     documentos = supabase.table('documentos').select(
-        '*, usuarios(nombre_completo)'
+        columnas('documental.vencimientos')
     ).lte('fecha_vigencia', fecha_limite).gt('fecha_vigencia', datetime.now().date()).execute().data
     
     if not documentos:
@@ -728,7 +728,7 @@ def generar_reporte_versiones(supabase):
     """Reporte de historial de versiones"""
     
     versiones = supabase.table('historial_versiones').select(
-        '*, documentos(codigo, titulo)'
+        columnas('documental.versiones')
     ).order('documento_id').execute().data
     
     if not versiones:
@@ -754,7 +754,7 @@ def generar_reporte_sin_aprobar(supabase):
     """Reporte de documentos sin aprobar"""
     
     documentos = supabase.table('documentos').select(
-        '*, usuarios(nombre_completo)'
+        columnas('documental.sin_aprobar')
     ).eq('aprobado', False).execute().data
     
     if not documentos:
@@ -778,7 +778,7 @@ def generar_reporte_cumplimiento_area(supabase):
     """Reporte de cumplimiento documental por área"""
     
     # Documentos vigentes por área
-    documentos = supabase.table('documentos').select('area', 'aprobado', 'fecha_vigencia').execute().data
+    documentos = supabase.table('documentos').select(columnas('documental.cumplimiento')).execute().data
     
     if not documentos:
         return
@@ -2,10 +2,15 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 from app.utils.supabase_client import get_supabase_client
-from app.utils.storage_helper import subir_archivo_storage
+from app.utils.cache_tablas import cache_por_tablas, invalidar_tablas
+from app.utils.cambios_realtime import vigilar_cambios
+from app.config.proyecciones import columnas
+from app.utils.datos_referencia import obtener_areas, obtener_trabajadores, obtener_epp_catalogo
+from app.utils.cola_subidas import preparar_subida, descartar_subidas, encolar_subidas, es_pendiente
+from app.utils.pestanas import mostrar_pestanas
+from app.utils.n8n_client import encolar_evento, lote_eventos
 from app.auth import requerir_rol
 import json
-import requests
 
 def mostrar(usuario):
     """Módulo de Gestión de EPP (Ley 29783 Art. 29)"""
@@ -13,37 +18,20 @@ def mostrar(usuario):
     
     st.title("🛡️ Gestión de Equipos de Protección Personal (EPP)")
     
-    # Tabs principales
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "📦 Catálogo de EPP",
-        "👤 Asignar EPP",
-        "🔄 Renovar/Reasignar",
-        "📊 Inventario y Vencimientos",
-        "🔔 Configurar Alertas"
-    ])
-    
-    with tab1:
-        gestionar_catalogo(usuario)
-    
-    with tab2:
-        asignar_epp(usuario)
-    
-    with tab3:
-        renovar_epp(usuario)
-    
-    with tab4:
-        dashboard_epp(usuario)
-    
-    with tab5:
-        configurar_alertas_epp(usuario)
+    # Pestañas: solo se ejecuta la activa
+    mostrar_pestanas({
+        "📦 Catálogo de EPP": gestionar_catalogo,
+        "👤 Asignar EPP": asignar_epp,
+        "🔄 Renovar/Reasignar": renovar_epp,
+        "📊 Inventario y Vencimientos": dashboard_epp,
+        "🔔 Configurar Alertas": configurar_alertas_epp,
+    }, clave="epp", args=(usuario,))
 
 def gestionar_catalogo(usuario):
     """Gestionar catálogo maestro de EPP"""
     
     st.subheader("📦 Catálogo de Equipos de Protección")
     
-    supabase = get_supabase_client()
-    
     # Formulario para nuevo equipo
     with st.expander("➕ Registrar Nuevo EPP", expanded=True):
         with st.form("form_epp_catalogo", clear_on_submit=True):
@@ -102,14 +90,9 @@ def gestionar_catalogo(usuario):
                     st.error("❌ Nombre y categoría son obligatorios")
                     return
                 
-                # Subir foto si existe
-                foto_url = None
-                if foto_referencia:
-                    foto_url = subir_archivo_storage(
-                        foto_referencia,
-                        bucket='sst-documentos',
-                        carpeta='epp_catalogo/'
-                    )
+                # La foto se sube en segundo plano (comprimida, con miniatura
+                # para el listado); el registro guarda un marcador mientras tanto
+                subida = preparar_subida(foto_referencia, 'sst-documentos')
                 
                 # Guardar en BD
                 data = {
@@ -119,18 +102,24 @@ def gestionar_catalogo(usuario):
                     'vida_util_meses': vida_util_meses,
                     'certificacion': certificacion,
                     'requiere_mantenimiento': requiere_mantenimiento,
-                    'foto_url': foto_url,
+                    'foto_url': subida['marcador'] if subida else None,
                     'activo': True
                 }
                 
-                guardar_epp_catalogo(data)
+                epp_id = guardar_epp_catalogo(data)
+                if epp_id:
+                    encolar_subidas([subida], 'epp_catalogo/', 'epp_catalogo', epp_id,
+                                    'foto_url', columna_miniatura='foto_miniatura_url')
+                else:
+                    descartar_subidas([subida])
+                    return
                 st.success(f"✅ EPP registrado: {nombre}")
                 st.rerun()
     
     # Listar catálogo
     st.markdown("### 📋 Catálogo Actual")
     
-    epp_catalogo = supabase.table('epp_catalogo').select('*').eq('activo', True).execute().data
+    epp_catalogo = obtener_epp_catalogo()
     
     if not epp_catalogo:
         st.info("ℹ️ No hay EPP registrados en el catálogo")
@@ -162,8 +151,12 @@ def gestionar_catalogo(usuario):
             col1, col2, col3, col4 = st.columns([2, 3, 1, 1])
             
             with col1:
-                if epp.get('foto_url'):
-                    st.image(epp['foto_url'], width=80)
+                # Miniatura WebP; las fotos anteriores a las miniaturas usan el original
+                foto = epp.get('foto_miniatura_url') or epp.get('foto_url')
+                if es_pendiente(foto):
+                    st.caption("⏳ Foto en proceso de subida")
+                elif foto:
+                    st.image(foto, width=80)
                 else:
                     st.caption("Sin foto")
             
@@ -188,26 +181,27 @@ def guardar_epp_catalogo(data):
     supabase = get_supabase_client()
     
     try:
-        supabase.table('epp_catalogo').insert(data).execute()
+        response = supabase.table('epp_catalogo').insert(data).execute()
+        invalidar_tablas('epp_catalogo')
+        return response.data[0]['id'] if response.data else None
     except Exception as e:
         st.error(f"Error guardando EPP: {e}")
+        return None
 
 def asignar_epp(usuario):
     """Asignar EPP a trabajador con fecha de entrega y vencimiento"""
     
     st.subheader("👤 Asignar EPP a Trabajador")
     
-    supabase = get_supabase_client()
-    
     # Cargar catálogo
-    epp_catalogo = supabase.table('epp_catalogo').select('*').eq('activo', True).execute().data
+    epp_catalogo = obtener_epp_catalogo()
     
     if not epp_catalogo:
         st.warning("⚠️ Primero registra EPP en el catálogo")
         return
     
     # Cargar trabajadores
-    trabajadores = supabase.table('usuarios').select('id', 'nombre_completo', 'area').eq('activo', True).neq('rol', 'admin').execute().data
+    trabajadores = obtener_trabajadores()
     
     if not trabajadores:
         st.warning("⚠️ No hay trabajadores activos")
@@ -295,14 +289,8 @@ def asignar_epp(usuario):
         submitted = st.form_submit_button("🎁 Asignar EPP", type="primary")
         
         if submitted:
-            # Subir foto si existe
-            foto_url = None
-            if foto_entrega:
-                foto_url = subir_archivo_storage(
-                    foto_entrega,
-                    bucket='sst-evidencias',
-                    carpeta=f'epp_entregas/{trabajador_id}/'
-                )
+            # La foto se sube en segundo plano; el registro guarda un marcador
+            subida = preparar_subida(foto_entrega, 'sst-evidencias')
             
             # Guardar asignación
             data = {
@@ -315,11 +303,16 @@ def asignar_epp(usuario):
                 'numero_serie': numero_serie,
                 'proveedor': proveedor,
                 'orden_compra': orden_compra,
-                'foto_entrega_url': foto_url,
+                'foto_entrega_url': subida['marcador'] if subida else None,
                 'asignado_por': usuario['id']
             }
             
-            guardar_asignacion_epp(data)
+            asignacion_id = guardar_asignacion_epp(data)
+            if not asignacion_id:
+                descartar_subidas([subida])
+                return
+            encolar_subidas([subida], f'epp_entregas/{trabajador_id}/', 'epp_asignaciones',
+                            asignacion_id, 'foto_entrega_url')
             
             # Notificar a n8n
             notificar_asignacion_epp({
@@ -337,20 +330,19 @@ def guardar_asignacion_epp(data):
     supabase = get_supabase_client()
     
     try:
-        supabase.table('epp_asignaciones').insert(data).execute()
+        response = supabase.table('epp_asignaciones').insert(data).execute()
+        invalidar_tablas('epp_asignaciones')
+        return response.data[0]['id'] if response.data else None
     except Exception as e:
         st.error(f"Error en asignación: {e}")
+        return None
 
 def notificar_asignacion_epp(data):
     """Notificar a n8n sobre nueva asignación"""
     try:
-        requests.post(
-            st.secrets["N8N_WEBHOOK_URL"] + "/epp-asignado",
-            json=data,
-            timeout=5
-        )
-    except:
-        pass
+        encolar_evento("epp-asignado", data)
+    except Exception as e:
+        st.warning(f"⚠️ No se pudo registrar la notificación: {e}")
 
 def renovar_epp(usuario):
     """Renovar o reasignar EPP vencido o dañado"""
@@ -361,7 +353,7 @@ def renovar_epp(usuario):
     
     # Cargar asignaciones activas por vencer o vencidas
     asignaciones = supabase.from_('epp_asignaciones').select(
-        '*, epp_catalogo(*), usuarios(id, nombre_completo, area)'
+        columnas('epp.por_renovar')
     ).eq('estado', 'activo').execute().data
     
     if not asignaciones:
@@ -385,6 +377,27 @@ def renovar_epp(usuario):
     # Mostrar tabla
     st.markdown("#### ⚠️ EPP por Renovar/Reasignar")
     
+    # Renovación en lote: una sola llamada para todas las por vencer
+    with st.expander(f"🔁 Renovar todas ({len(df_vencidas)})"):
+        st.caption("Se crea una nueva asignación para cada EPP vencido o por vencer en los próximos 30 días.")
+        confirmar = st.checkbox("Confirmo la renovación de todas las asignaciones listadas", key="confirmar_renovacion_lote")
+        
+        if st.button("🔁 Renovar todas", type="primary", disabled=not confirmar):
+            try:
+                renovadas = renovar_asignaciones_epp(df_vencidas['id'].tolist(), usuario['id'])
+                st.session_state['renovacion_lote'] = (len(renovadas), len(df_vencidas) - len(renovadas))
+                st.rerun()
+            except Exception as e:
+                st.error(f"Error en renovación: {e}")
+    
+    # Resultado del último lote (se muestra tras el rerun)
+    resultado_lote = st.session_state.pop('renovacion_lote', None)
+    if resultado_lote:
+        renovados, omitidos = resultado_lote
+        st.success(f"✅ {renovados} EPP renovados")
+        if omitidos:
+            st.warning(f"⚠️ {omitidos} asignaciones no se renovaron (ya no activas o sin vida útil)")
+    
     for _, asig in df_vencidas.iterrows():
         with st.container():
             col1, col2, col3, col4 = st.columns([2, 3, 2, 2])
@@ -412,87 +425,114 @@ def renovar_epp(usuario):
             
             st.divider()
 
-def renovar_asignacion_epp(asignacion_id, usuario_id):
-    """Renovar una asignación de EPP"""
+def renovar_asignaciones_epp(asignacion_ids, usuario_id):
+    """
+    Renovar asignaciones de EPP con la RPC transaccional `renovar_epp_asignaciones`
+
+    Cada asignación activa se marca como 'renovado' y se crea la nueva en la
+    misma transacción; si algo falla no queda ninguna a medias.
+
+    Args:
+        asignacion_ids: IDs de las asignaciones a renovar
+        usuario_id: Usuario que realiza la renovación
+
+    Returns:
+        Lista de renovaciones {asignacion_id, nueva_asignacion_id,
+        trabajador_id, epp_nombre, nueva_fecha_vencimiento}
+    """
     supabase = get_supabase_client()
     
-    try:
-        # Obtener datos actuales
-        asignacion = supabase.table('epp_asignaciones').select('*').eq('id', asignacion_id).execute().data[0]
-        epp = supabase.table('epp_catalogo').select('*').eq('id', asignacion['epp_id']).execute().data[0]
-        
-        # Actualizar asignación actual a 'renovado'
-        supabase.table('epp_asignaciones').update({
-            'estado': 'renovado',
-            'fecha_devolucion': datetime.now().date().isoformat()
-        }).eq('id', asignacion_id).execute()
-        
-        # Crear nueva asignación
-        vida_util_dias = epp['vida_util_meses'] * 30
-        nueva_asignacion = {
-            'trabajador_id': asignacion['trabajador_id'],
-            'epp_id': asignacion['epp_id'],
-            'fecha_entrega': datetime.now().date().isoformat(),
-            'fecha_vencimiento': (datetime.now().date() + timedelta(days=vida_util_dias)).isoformat(),
-            'estado': 'activo',
-            'condicion': 'Nuevo',
-            'asignado_por': usuario_id,
-            'renovado_de': asignacion_id  # Referencia a asignación anterior
-        }
-        
-        result = supabase.table('epp_asignaciones').insert(nueva_asignacion).execute()
-        
-        # Notificar
-        notificar_renovacion_epp({
-            'trabajador_id': asignacion['trabajador_id'],
-            'epp_nombre': epp['nombre'],
-            'nueva_fecha_vencimiento': nueva_asignacion['fecha_vencimiento']
-        })
-        
-        st.success("✅ EPP renovado exitosamente")
+    renovadas = supabase.rpc('renovar_epp_asignaciones', {
+        'p_asignacion_ids': [int(i) for i in asignacion_ids],
+        'p_usuario_id': usuario_id,
+        'p_fecha': datetime.now().date().isoformat()
+    }).execute().data or []
+    
+    if renovadas:
+        invalidar_tablas('epp_asignaciones')
         
+        with lote_eventos():
+            for renovada in renovadas:
+                notificar_renovacion_epp({
+                    'trabajador_id': renovada['trabajador_id'],
+                    'epp_nombre': renovada['epp_nombre'],
+                    'nueva_fecha_vencimiento': renovada['nueva_fecha_vencimiento']
+                })
+    
+    return renovadas
+
+def renovar_asignacion_epp(asignacion_id, usuario_id):
+    """Renovar una asignación de EPP"""
+    try:
+        if renovar_asignaciones_epp([asignacion_id], usuario_id):
+            st.success("✅ EPP renovado exitosamente")
+        else:
+            st.warning("⚠️ La asignación ya no está activa o su EPP no tiene vida útil definida")
     except Exception as e:
         st.error(f"Error en renovación: {e}")
 
 def notificar_renovacion_epp(data):
     """Notificar a n8n sobre renovación"""
     try:
-        requests.post(
-            st.secrets["N8N_WEBHOOK_URL"] + "/epp-renovado",
-            json=data,
-            timeout=5
-        )
-    except:
-        pass
+        encolar_evento("epp-renovado", data)
+    except Exception as e:
+        st.warning(f"⚠️ No se pudo registrar la notificación: {e}")
+
+@cache_por_tablas('epp_asignaciones')
+def contar_asignaciones_epp(hoy):
+    """Conteos de asignaciones activas para los KPIs del dashboard de EPP (caché invalidada al cambiar la tabla)"""
+    supabase = get_supabase_client()
+    
+    def activas():
+        return supabase.table('epp_asignaciones').select(
+            columnas('epp.conteo'), count='exact', head=True
+        ).eq('estado', 'activo')
+    
+    return {
+        'activos': activas().execute().count,
+        'vencidos': activas().lte('fecha_vencimiento', hoy).execute().count,
+        # EPP por vencer en 30 días
+        'por_vencer': activas().lte('fecha_vencimiento', hoy + timedelta(days=30)).gt('fecha_vencimiento', hoy).execute().count
+    }
+
+@cache_por_tablas('epp_asignaciones', 'usuarios', 'epp_catalogo')
+def cargar_inventario_epp(estado_filtro):
+    """Asignaciones para el detalle del dashboard de EPP (caché invalidada al cambiar sus tablas)"""
+    supabase = get_supabase_client()
+    
+    query = supabase.from_('epp_asignaciones').select(
+        columnas('epp.inventario')
+    )
+    
+    if estado_filtro != "todos":
+        query = query.eq('estado', estado_filtro)
+    
+    return query.execute().data
 
 def dashboard_epp(usuario):
     """Dashboard de inventario y vencimientos"""
     
     st.subheader("📊 Dashboard de EPP")
     
-    supabase = get_supabase_client()
+    # Vuelve a dibujarse sola cuando cambian las asignaciones
+    vigilar_cambios('epp_asignaciones')
     
     # KPIs
     col_kpi1, col_kpi2, col_kpi3, col_kpi4 = st.columns(4)
     
-    total_asignaciones = supabase.table('epp_asignaciones').select('*', count='exact').execute()
-    total_activos = supabase.table('epp_asignaciones').select('*', count='exact').eq('estado', 'activo').execute()
-    total_vencidos = supabase.table('epp_asignaciones').select('*', count='exact').eq('estado', 'activo').lte('fecha_vencimiento', datetime.now().date()).execute()
+    conteos = contar_asignaciones_epp(datetime.now().date())
     
     with col_kpi1:
-        st.metric("📦 Total Asignaciones", total_activos.count)
+        st.metric("📦 Total Asignaciones", conteos['activos'])
     
     with col_kpi2:
-        # EPP por vencer en 30 días
-        fecha_vencimiento = datetime.now().date() + timedelta(days=30)
-        por_vencer = supabase.table('epp_asignaciones').select('*', count='exact').eq('estado', 'activo').lte('fecha_vencimiento', fecha_vencimiento).gt('fecha_vencimiento', datetime.now().date()).execute()
-        st.metric("⏰ Por Vencer", por_vencer.count)
+        st.metric("⏰ Por Vencer", conteos['por_vencer'])
     
     with col_kpi3:
-        st.metric("🚨 Vencidos", total_vencidos.count)
+        st.metric("🚨 Vencidos", conteos['vencidos'])
     
     with col_kpi4:
-        tasa_cumplimiento = (total_activos.count - total_vencidos.count) / total_activos.count * 100 if total_activos.count > 0 else 0
+        tasa_cumplimiento = (conteos['activos'] - conteos['vencidos']) / conteos['activos'] * 100 if conteos['activos'] > 0 else 0
         st.metric("✅ Cumplimiento", f"{tasa_cumplimiento:.1f}%")
     
     # Filtros
@@ -503,7 +543,7 @@ def dashboard_epp(usuario):
     with col_filtro1:
         area_filtro = st.selectbox(
             "Filtrar por Área",
-            options=["todos"] + [a['area'] for a in supabase.table('usuarios').select('area').execute().data if a['area']]
+            options=["todos"] + obtener_areas()
         )
     
     with col_filtro2:
@@ -513,14 +553,7 @@ def dashboard_epp(usuario):
         )
     
     # Cargar asignaciones
-    query = supabase.from_('epp_asignaciones').select(
-        '*, epp_catalogo(nombre, categoria), usuarios(nombre_completo, area)'
-    )
-    
-    if estado_filtro != "todos":
-        query = query.eq('estado', estado_filtro)
-    
-    asignaciones = query.execute().data
+    asignaciones = cargar_inventario_epp(estado_filtro)
     
     if not asignaciones:
         st.info("ℹ️ No hay asignaciones con los filtros seleccionados")
@@ -530,7 +563,7 @@ def dashboard_epp(usuario):
     
     # Aplicar filtro de área si es necesario
     if area_filtro != "todos":
-        df = df[df['usuarios']['area'] == area_filtro]
+        df = df[df['usuarios'].apply(lambda u: (u or {}).get('area')) == area_filtro]
     
     # Preparar datos
     df['fecha_vencimiento'] = pd.to_datetime(df['fecha_vencimiento']).dt.date
@@ -546,22 +579,22 @@ def dashboard_epp(usuario):
     df_display['Fecha Entrega'] = pd.to_datetime(df_display['fecha_entrega']).dt.strftime('%d/%m/%Y')
     df_display['Fecha Vencimiento'] = pd.to_datetime(df_display['fecha_vencimiento']).dt.strftime('%d/%m/%Y')
     
-    # Colorear por estado
+    # Colorear por estado (los días restantes se leen de df_display, no se muestran)
     def colorear_epp(row):
-        if row['estado'] == 'vencido' or row['dias_restantes'] < 0:
+        dias_restantes = df_display.at[row.name, 'dias_restantes']
+        if row['estado'] == 'vencido' or dias_restantes < 0:
             return ['background-color: #ffcccc'] * len(row)
-        elif row['dias_restantes'] <= 30:
+        elif dias_restantes <= 30:
             return ['background-color: #ffff99'] * len(row)
         else:
             return ['background-color: #ccffcc'] * len(row)
     
-    styled = df_display.style.apply(colorear_epp, axis=1)
-    
-    st.dataframe(
-        styled[['EPP', 'Trabajador', 'Área', 'Fecha Entrega', 'Fecha Vencimiento', 'estado']],
-        use_container_width=True
+    styled = df_display[['EPP', 'Trabajador', 'Área', 'Fecha Entrega', 'Fecha Vencimiento', 'estado']].style.apply(
+        colorear_epp, axis=1
     )
     
+    st.dataframe(styled, use_container_width=True)
+    
     # Exportar inventario
     if st.button("📥 Exportar Inventario"):
         excel_data = df_display.to_csv(index=False).encode('utf-8')
@@ -631,21 +664,15 @@ def configurar_alertas_epp(usuario):
     with col_btn1:
         if st.button("▶️ Activar Flujo de Alertas", type="primary"):
             try:
-                requests.post(
-                    st.secrets["N8N_WEBHOOK_URL"] + "/activar-alertas-epp",
-                    json=configuracion
-                )
+                encolar_evento("activar-alertas-epp", configuracion)
                 st.success("✅ Flujo de alertas EPP activado")
-            except:
-                st.error("❌ No se pudo conectar con n8n")
+            except Exception as e:
+                st.error(f"❌ No se pudo registrar la solicitud para n8n: {e}")
     
     with col_btn2:
         if st.button("⏸️ Pausar Alertas"):
             try:
-                requests.post(
-                    st.secrets["N8N_WEBHOOK_URL"] + "/pausar-alertas-epp",
-                    json={}
-                )
+                encolar_evento("pausar-alertas-epp", {})
                 st.warning("⚠️ Alertas EPP pausadas")
-            except:
-                st.error("❌ No se pudo conectar con n8n")
+            except Exception as e:
+                st.error(f"❌ No se pudo registrar la solicitud para n8n: {e}")
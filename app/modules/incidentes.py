@@ -1,11 +1,20 @@
 import streamlit as st
 import pandas as pd
+import plotly.express as px
 from datetime import datetime, timedelta
 from app.utils.supabase_client import get_supabase_client
-from app.utils.storage_helper import subir_archivo_storage
+from app.utils.cache_tablas import cache_por_tablas, invalidar_tablas
+from app.utils.cambios_realtime import vigilar_cambios
+from app.config.proyecciones import columnas
+from app.utils.datos_referencia import obtener_supervisor
+from app.utils.storage_helper import subir_archivo_storage, subir_archivos_paralelo, descartar_subida
+from app.utils.cola_subidas import preparar_subida, descartar_subidas, encolar_subidas, es_pendiente
+from app.utils.paginacion import paginar_consulta
+from app.utils.pestanas import mostrar_pestanas
+from app.utils.n8n_client import encolar_evento
+from app.utils.kpis import calcular_tasa_frecuencia
 from app.auth import requerir_rol
 import json
-import requests
 
 def mostrar(usuario):
     """Módulo de Análisis de Incidentes y Accidentes (Ley 29783 Art. 33-34)"""
@@ -16,25 +25,13 @@ def mostrar(usuario):
     if usuario['rol'] in ['trabajador', 'supervisor']:
         st.info("💡 Puedes reportar incidentes rápidamente desde tu móvil")
     
-    # Tabs principales
-    tab1, tab2, tab3, tab4 = st.tabs([
-        "⚡ Reportar Incidente (< 2 min)",
-        "🔍 Investigación y Análisis",
-        "✅ Acciones Correctivas",
-        "📊 Dashboard Incidentes"
-    ])
-    
-    with tab1:
-        reportar_incidente(usuario)
-    
-    with tab2:
-        investigar_incidente(usuario)
-    
-    with tab3:
-        gestionar_acciones(usuario)
-    
-    with tab4:
-        dashboard_incidentes(usuario)
+    # Pestañas: solo se ejecuta la activa
+    mostrar_pestanas({
+        "⚡ Reportar Incidente (< 2 min)": reportar_incidente,
+        "🔍 Investigación y Análisis": investigar_incidente,
+        "✅ Acciones Correctivas": gestionar_acciones,
+        "📊 Dashboard Incidentes": dashboard_incidentes,
+    }, clave="incidentes", args=(usuario,))
 
 def reportar_incidente(usuario):
     """Formulario ultra-rápido para reportar incidentes (< 2 min)"""
@@ -223,13 +220,21 @@ def reportar_incidente(usuario):
                 })
             }
             
+            # Evidencia: se copia al spool local y el registro guarda marcadores
+            # que la cola de subidas reemplaza por las URLs
+            subidas = [
+                preparar_subida(archivo, 'sst-evidencias')
+                for archivo in [foto, video, audio, *(documentos or [])]
+            ]
+            incidente_data['evidencia'] = [s['marcador'] for s in subidas if s]
+            
             # Guardar incidente
             incidente_id = guardar_incidente(incidente_data)
             
-            if incidente_id:
-                # Subir evidencia
-                with st.spinner("📤 Subiendo evidencia..."):
-                    subir_evidencia_incidente(incidente_id, foto, video, audio, documentos)
+            if not incidente_id:
+                descartar_subidas(subidas)
+            else:
+                encolar_subidas(subidas, f'incidentes/{incidente_id}/', 'incidentes', incidente_id, 'evidencia')
                 
                 # Notificar si es necesario
                 if notificar_inmediato or prioridad['nivel'] in ['alto', 'crítico']:
@@ -264,88 +269,65 @@ def guardar_incidente(data):
     
     try:
         response = supabase.table('incidentes').insert(data).execute()
+        invalidar_tablas('incidentes')
         return response.data[0]['id'] if response.data else None
     except Exception as e:
         st.error(f"Error guardando incidente: {e}")
         return None
 
-def subir_evidencia_incidente(incidente_id, foto, video, audio, documentos):
-    """Subir múltiples tipos de evidencia"""
-    urls = []
-    
-    # Foto
-    if foto:
-        url = subir_archivo_storage(
-            foto,
-            bucket='sst-evidencias',
-            carpeta=f'incidentes/{incidente_id}/'
-        )
-        if url: urls.append(url)
-    
-    # Video
-    if video:
-        url = subir_archivo_storage(
-            video,
+def subir_archivos_con_progreso(archivos, carpeta, titulo="📤 Subiendo evidencia..."):
+    """Subir archivos en paralelo mostrando el avance de cada uno"""
+    archivos = [a for a in archivos if a]
+    if not archivos:
+        return []
+    
+    with st.status(titulo, expanded=True) as estado:
+        barra = st.progress(0.0)
+        
+        def al_progresar(completados, total, resultado):
+            barra.progress(completados / total, text=f"{completados}/{total} archivos")
+            if resultado['error']:
+                st.write(f"❌ {resultado['nombre']}: {resultado['error']}")
+            else:
+                st.write(f"✅ {resultado['nombre']}")
+        
+        resultados = subir_archivos_paralelo(
+            archivos,
             bucket='sst-evidencias',
-            carpeta=f'incidentes/{incidente_id}/'
+            carpeta=carpeta,
+            al_progresar=al_progresar
         )
-        if url: urls.append(url)
-    
-    # Audio
-    if audio:
-        url = subir_archivo_storage(
-            audio,
-            bucket='sst-evidencias',
-            carpeta=f'incidentes/{incidente_id}/'
+        
+        fallidos = sum(1 for r in resultados if r['error'])
+        estado.update(
+            label=f"📤 Evidencia: {len(resultados) - fallidos} subidos, {fallidos} con error",
+            state="error" if fallidos else "complete",
+            expanded=bool(fallidos)
         )
-        if url: urls.append(url)
     
-    # Documentos
-    if documentos:
-        for doc in documentos:
-            url = subir_archivo_storage(
-                doc,
-                bucket='sst-evidencias',
-                carpeta=f'incidentes/{incidente_id}/'
-            )
-            if url: urls.append(url)
-    
-    # Actualizar incidente con URLs
-    if urls:
-        supabase = get_supabase_client()
-        supabase.table('incidentes').update({
-            'evidencia': urls
-        }).eq('id', incidente_id).execute()
+    return resultados
 
 def notificar_incidente(data):
     """Notificar vía n8n sobre nuevo incidente"""
     try:
-        supabase = get_supabase_client()
-        
         # Obtener supervisor del área
-        supervisor = supabase.table('usuarios').select(
-            'id', 'nombre_completo', 'email'
-        ).eq('rol', 'supervisor').eq('area', data['area']).execute().data
-        
-        supervisor_email = supervisor[0]['email'] if supervisor else "sst@empresa.com"
-        supervisor_id = supervisor[0]['id'] if supervisor else None
-        
-        # Enviar a n8n
-        requests.post(
-            st.secrets["N8N_WEBHOOK_URL"] + "/incidente-reportado",
-            json={
-                'codigo': data['codigo'],
-                'tipo': data['tipo'],
-                'area': data['area'],
-                'nivel_riesgo': data['nivel_riesgo'],
-                'descripcion': data['descripcion'],
-                'trabajador_nombre': data['trabajador_nombre'],
-                'supervisor_email': supervisor_email,
-                'supervisor_id': supervisor_id,
-                'prioridad': data['nivel_riesgo']
-            },
-            timeout=5
-        )
+        supervisor = obtener_supervisor(data['area'])
+        
+        supervisor_email = supervisor['email'] if supervisor else "sst@empresa.com"
+        supervisor_id = supervisor['id'] if supervisor else None
+        
+        # Enviar a n8n (outbox, entrega en segundo plano)
+        encolar_evento("incidente-reportado", {
+            'codigo': data['codigo'],
+            'tipo': data['tipo'],
+            'area': data['area'],
+            'nivel_riesgo': data['nivel_riesgo'],
+            'descripcion': data['descripcion'],
+            'trabajador_nombre': data['trabajador_nombre'],
+            'supervisor_email': supervisor_email,
+            'supervisor_id': supervisor_id,
+            'prioridad': data['nivel_riesgo']
+        })
     except Exception as e:
         st.warning(f"⚠️ No se pudo notificar al supervisor: {e}")
 
@@ -358,6 +340,7 @@ def actualizar_estado_incidente(incidente_id, estado):
             'estado': estado,
             'fecha_cierre': datetime.now().date() if estado == 'cerrado' else None
         }).eq('id', incidente_id).execute()
+        invalidar_tablas('incidentes')
     except Exception as e:
         st.error(f"Error actualizando estado: {e}")
 
@@ -367,11 +350,21 @@ def investigar_incidente(usuario):
     
     st.subheader("🔍 Investigación y Análisis de Causa Raíz")
     
+    # Resultado de la última investigación guardada (se muestra tras el rerun)
+    guardada = st.session_state.pop('investigacion_guardada', None)
+    if guardada:
+        st.success(f"✅ Investigación guardada. Estado: {guardada['estado'].upper()}")
+        if guardada['fallidos']:
+            st.warning(
+                "⚠️ La investigación quedó registrada, pero estos archivos no se subieron: "
+                + ", ".join(guardada['fallidos'])
+            )
+    
     supabase = get_supabase_client()
     
     # Cargar incidentes pendientes de investigación
     incidentes = supabase.table('incidentes').select(
-        '*, acciones_correctivas(*), usuarios!incidentes_reportado_por_fkey(nombre_completo)'
+        columnas('incidentes.investigacion')
     ).in_('estado', ['reportado', 'en_investigacion']).execute().data
     
     if not incidentes:
@@ -409,12 +402,18 @@ def investigar_incidente(usuario):
         if incidente_seleccionado.get('evidencia'):
             st.markdown("**Evidencia:**")
             for url in incidente_seleccionado['evidencia']:
-                st.link_button("Ver evidencia", url)
+                if es_pendiente(url):
+                    st.caption("⏳ Evidencia en proceso de subida")
+                else:
+                    st.link_button("Ver evidencia", url)
     
     # Formulario de investigación
     st.markdown("### 🔍 Investigación Detallada")
     
-    with st.form("form_investigacion", clear_on_submit=False):
+    # El número de formulario cambia tras guardar para vaciar sus campos
+    num_form = st.session_state.get('form_investigacion_num', 0)
+    
+    with st.form(f"form_investigacion_{num_form}", clear_on_submit=False):
         # Método de análisis
         metodo_analisis = st.selectbox(
             "Método de Análisis de Causa Raíz",
@@ -542,7 +541,7 @@ def investigar_incidente(usuario):
                 st.error("❌ Debes identificar la causa raíz")
             else:
                 # Guardar investigación
-                guardar_investigacion_incidente(
+                resultados = guardar_investigacion_incidente(
                     incidente_seleccionado['id'],
                     {
                         'metodo_analisis': metodo_analisis,
@@ -564,7 +563,6 @@ def investigar_incidente(usuario):
                 nuevo_estado = 'cerrado' if incidente_seleccionado['nivel_riesgo'] < 5 else 'analizado'
                 actualizar_estado_incidente(incidente_seleccionado['id'], nuevo_estado)
                 
-                st.success(f"✅ Investigación guardada. Estado: {nuevo_estado.upper()}")
                 
                 # Crear acciones correctivas automáticas
                 if recomendaciones:
@@ -575,10 +573,24 @@ def investigar_incidente(usuario):
                         usuario['id']
                     )
                 
+                # Limpiar formulario: sin esto, volver a enviarlo duplicaría
+                # las acciones correctivas
+                st.session_state['investigacion_guardada'] = {
+                    'estado': nuevo_estado,
+                    'fallidos': [r['nombre'] for r in resultados if r['error']]
+                }
+                st.session_state['form_investigacion_num'] = num_form + 1
+                for clave in ['fotos_inv', 'docs_inv', *(f"porque_{i}" for i in range(1, 6))]:
+                    st.session_state.pop(clave, None)
                 st.rerun()
 
 def guardar_investigacion_incidente(incidente_id, investigacion_data, fotos, docs):
-    """Guardar datos de investigación"""
+    """
+    Guardar datos de investigación y subir su evidencia
+
+    Returns:
+        Lista {'nombre', 'url', 'error'} por archivo
+    """
     supabase = get_supabase_client()
     
     try:
@@ -589,26 +601,18 @@ def guardar_investigacion_incidente(incidente_id, investigacion_data, fotos, doc
             'investigacion_data': json.dumps(investigacion_data),
             'estado': 'analizado'
         }).eq('id', incidente_id).execute()
+        invalidar_tablas('incidentes')
         
         # Subir evidencia de investigación
-        if fotos:
-            for foto in fotos:
-                subir_archivo_storage(
-                    foto,
-                    bucket='sst-evidencias',
-                    carpeta=f'incidentes/{incidente_id}/investigacion/'
-                )
-        
-        if docs:
-            for doc in docs:
-                subir_archivo_storage(
-                    doc,
-                    bucket='sst-evidencias',
-                    carpeta=f'incidentes/{incidente_id}/investigacion/'
-                )
+        return subir_archivos_con_progreso(
+            [*(fotos or []), *(docs or [])],
+            carpeta=f'incidentes/{incidente_id}/investigacion/',
+            titulo="📤 Subiendo evidencia de investigación..."
+        )
                 
     except Exception as e:
         st.error(f"Error guardando investigación: {e}")
+        return []
 
 def crear_accion_correctiva_automatica(incidente_id, recomendaciones, responsable_id):
     """Crear acciones correctivas derivadas de investigación"""
@@ -627,12 +631,10 @@ def crear_accion_correctiva_automatica(incidente_id, recomendaciones, responsabl
                     'fecha_limite': (datetime.now() + timedelta(days=7)).isoformat(),
                     'estado': 'abierta'
                 }).execute()
+                invalidar_tablas('acciones_correctivas')
         
         # Notificar vía n8n
-        requests.post(
-            st.secrets["N8N_WEBHOOK_URL"] + "/acciones-creadas",
-            json={"incidente_id": incidente_id, "num_acciones": len(acciones)}
-        )
+        encolar_evento("acciones-creadas", {"incidente_id": incidente_id, "num_acciones": len(acciones)})
         
     except Exception as e:
         st.warning(f"⚠️ No se pudieron crear todas las acciones: {e}")
@@ -667,49 +669,58 @@ def gestionar_acciones(usuario):
         )
     
     # Consultar acciones
-    query = supabase.from_('acciones_correctivas').select(
-        '*, incidentes(codigo, area), usuarios(nombre_completo)'
-    )
-    
-    if estado_filtro != "todos":
-        query = query.eq('estado', estado_filtro)
-    
-    if responsable_filtro == "yo":
-        query = query.eq('responsable_id', usuario['id'])
-    elif responsable_filtro == "otros":
-        query = query.neq('responsable_id', usuario['id'])
+    def construir_consulta(seleccion=columnas('incidentes.acciones'), count=None, head=None):
+        query = supabase.from_('acciones_correctivas').select(seleccion, count=count, head=head)
+        
+        if estado_filtro != "todos":
+            query = query.eq('estado', estado_filtro)
+        
+        if responsable_filtro == "yo":
+            query = query.eq('responsable_id', usuario['id'])
+        elif responsable_filtro == "otros":
+            query = query.neq('responsable_id', usuario['id'])
+        
+        return query
     
-    acciones = query.execute().data
+    def contar(query):
+        return query.execute().count or 0
     
-    if not acciones:
-        st.success("✅ No hay acciones con los filtros seleccionados")
-        return
-    
-    df_acciones = pd.DataFrame(acciones)
-    
-    # Dashboard de acciones
+    # Dashboard de acciones (conteos en el servidor, independientes de la página)
     st.markdown("### 📊 Resumen de Acciones")
     
     col_res1, col_res2, col_res3, col_res4 = st.columns(4)
     
     with col_res1:
-        st.metric("🔴 Abiertas", len(df_acciones[df_acciones['estado'] == 'abierta']))
+        st.metric("🔴 Abiertas", contar(construir_consulta(columnas('incidentes.conteo_acciones'), count='exact', head=True).eq('estado', 'abierta')))
     
     with col_res2:
-        st.metric("🟡 En Progreso", len(df_acciones[df_acciones['estado'] == 'en_progreso']))
+        st.metric("🟡 En Progreso", contar(construir_consulta(columnas('incidentes.conteo_acciones'), count='exact', head=True).eq('estado', 'en_progreso')))
     
     with col_res3:
-        st.metric("🟢 Implementadas", len(df_acciones[df_acciones['estado'] == 'implementada']))
+        st.metric("🟢 Implementadas", contar(construir_consulta(columnas('incidentes.conteo_acciones'), count='exact', head=True).eq('estado', 'implementada')))
     
     with col_res4:
         # Calcular atrasadas
-        atrasadas = sum(
-            1 for _, a in df_acciones.iterrows()
-            if pd.to_datetime(a['fecha_limite']).date() < datetime.now().date()
-            and a['estado'] not in ['implementada', 'verificada']
+        atrasadas = contar(
+            construir_consulta(columnas('incidentes.conteo_acciones'), count='exact', head=True)
+            .lt('fecha_limite', datetime.now().date())
+            .not_.in_('estado', ['implementada', 'verificada'])
         )
         st.metric("⏰ Atrasadas", atrasadas)
     
+    # Paginación keyset en el servidor
+    acciones = paginar_consulta(
+        construir_consulta,
+        clave="acciones",
+        firma_filtros=(estado_filtro, responsable_filtro, fecha_filtro)
+    )
+    
+    if not acciones:
+        st.success("✅ No hay acciones con los filtros seleccionados")
+        return
+    
+    df_acciones = pd.DataFrame(acciones)
+    
     # Lista de acciones
     st.markdown("### 📋 Acciones Detalladas")
     
@@ -790,26 +801,40 @@ def actualizar_accion(accion_id, data, evidencia_archivo):
             )
             data['evidencia_url'] = url
         
-        # Actualizar estado
-        supabase.table('acciones_correctivas').update(data).eq('id', accion_id).execute()
+        # Actualizar estado (si falla, se libera la evidencia recién subida)
+        try:
+            supabase.table('acciones_correctivas').update(data).eq('id', accion_id).execute()
+        except Exception:
+            descartar_subida(data.get('evidencia_url') if evidencia_archivo else None, 'sst-evidencias')
+            raise
+        invalidar_tablas('acciones_correctivas')
         
         # Notificar cierre
         if data['estado'] == 'implementada':
-            requests.post(
-                st.secrets["N8N_WEBHOOK_URL"] + "/accion-cerrada",
-                json={"accion_id": accion_id}
-            )
+            encolar_evento("accion-cerrada", {"accion_id": accion_id})
             
     except Exception as e:
         st.error(f"Error actualizando acción: {e}")
 
+@cache_por_tablas('incidentes')
+def cargar_incidentes_dashboard(fecha_inicio, fecha_fin, areas):
+    """Incidentes del período para el dashboard (caché invalidada al cambiar la tabla)"""
+    supabase = get_supabase_client()
+    
+    query = supabase.table('incidentes').select(
+        columnas('incidentes.dashboard')
+    ).gte('fecha_hora', fecha_inicio).lte('fecha_hora', fecha_fin)
+    
+    if areas:
+        query = query.in_('area', areas)
+    
+    return query.execute().data
+
 def dashboard_incidentes(usuario):
     """Dashboard de seguimiento de incidentes"""
     
     st.subheader("📊 Dashboard de Incidentes")
     
-    supabase = get_supabase_client()
-    
     # Filtros
     with st.expander("🔍 Filtros", expanded=True):
         col_f1, col_f2, col_f3 = st.columns(3)
@@ -832,15 +857,11 @@ def dashboard_incidentes(usuario):
                 ["Producción", "Almacén", "Oficinas", "Mantenimiento", "Planta Alta", "Planta Baja"]
             )
     
-    # Cargar datos
-    query = supabase.table('incidentes').select(
-        '*, acciones_correctivas(*), usuarios!incidentes_reportado_por_fkey(nombre_completo)'
-    ).gte('fecha_hora', fecha_inicio).lte('fecha_hora', fecha_fin)
-    
-    if area_filtro:
-        query = query.in_('area', area_filtro)
+    # Vuelve a dibujarse sola cuando cambian los incidentes
+    vigilar_cambios('incidentes')
     
-    incidentes = query.execute().data
+    # Cargar datos
+    incidentes = cargar_incidentes_dashboard(fecha_inicio, fecha_fin, area_filtro)
     
     if not incidentes:
         st.info("ℹ️ No hay incidentes en este período")
@@ -869,7 +890,8 @@ def dashboard_incidentes(usuario):
     with col_kpi4:
         # Calcular TF (Tasa de Frecuencia)
         horas_hombre = 50000  # Simulado - debería venir de sistema de asistencia
-        acc_con_lesion = len(df_incidentes[df_incidentes['consecuencias']['lesiones'] != 'No'])
+        lesiones = df_incidentes['consecuencias'].apply(lambda c: (c or {}).get('lesiones', 'No'))
+        acc_con_lesion = int((lesiones != 'No').sum())
         tf = calcular_tasa_frecuencia(acc_con_lesion, horas_hombre)
         st.metric("📊 Tasa Frecuencia", f"{tf:.2f}")
     
@@ -903,7 +925,7 @@ def dashboard_incidentes(usuario):
     
     # Preparar datos para mostrar
     df_display = df_incidentes.copy()
-    df_display['reportado_por'] = df_display['usuarios']['nombre_completo']
+    df_display['reportado_por'] = df_display['usuarios'].apply(lambda u: (u or {}).get('nombre_completo'))
     
     # Colorear por estado
     def color_estado(val):
@@ -912,7 +934,7 @@ def dashboard_incidentes(usuario):
         elif val == 'analizado': return 'background-color: #cce5ff'
         else: return 'background-color: #ccffcc'
     
-    styled = df_display[['codigo', 'tipo', 'area', 'fecha_hora', 'nivel_riesgo', 'estado', 'reportado_por']].style.applymap(
+    styled = df_display[['codigo', 'tipo', 'area', 'fecha_hora', 'nivel_riesgo', 'estado', 'reportado_por']].style.map(
         color_estado, subset=['estado']
     )
     
@@ -2,11 +2,18 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 from app.utils.supabase_client import get_supabase_client
+from app.utils.cache_tablas import invalidar_tablas
+from app.config.proyecciones import columnas
+from app.utils.pestanas import mostrar_pestanas
+from app.utils.n8n_client import encolar_evento, lote_eventos
+from dateutil.rrule import rrule, rrulestr, DAILY, WEEKLY, MONTHLY
+from itertools import islice
 from app.auth import requerir_rol
 import json
 import uuid
-import requests
-from app.utils.storage_helper import subir_archivo_storage
+from app.utils.storage_helper import subir_archivo_storage, descartar_subida
+from app.utils.cola_subidas import preparar_subida, descartar_subidas, encolar_subidas
+from app.utils.paginacion import paginar_consulta
 
 def mostrar(usuario):
     """Módulo de Inspecciones de Seguridad (Ley 29783 Art. 27)"""
@@ -14,25 +21,13 @@ def mostrar(usuario):
     
     st.title("📋 Inspecciones de Seguridad Laboral")
     
-    # Tabs principales
-    tab1, tab2, tab3, tab4 = st.tabs([
-        "📝 Crear Checklist",
-        "📅 Programar Inspección",
-        "🔍 Ejecutar Inspección",
-        "📊 Seguimiento Hallazgos"
-    ])
-    
-    with tab1:
-        crear_checklist(usuario)
-    
-    with tab2:
-        programar_inspeccion(usuario)
-    
-    with tab3:
-        ejecutar_inspeccion(usuario)
-    
-    with tab4:
-        seguimiento_hallazgos(usuario)
+    # Pestañas: solo se ejecuta la activa
+    mostrar_pestanas({
+        "📝 Crear Checklist": crear_checklist,
+        "📅 Programar Inspección": programar_inspeccion,
+        "🔍 Ejecutar Inspección": ejecutar_inspeccion,
+        "📊 Seguimiento Hallazgos": seguimiento_hallazgos,
+    }, clave="inspecciones", args=(usuario,))
 
 def crear_checklist(usuario):
     """Crear checklist digital personalizable"""
@@ -155,16 +150,14 @@ def guardar_checklist(data):
     try:
         # Insertar
         result = supabase.table('checklists').insert(data).execute()
+        invalidar_tablas('checklists')
         
         # Notificar vía n8n
-        requests.post(
-            st.secrets["N8N_WEBHOOK_URL"] + "/checklist-nueva",
-            json={
-                "checklist_id": result.data[0]['id'],
-                "nombre": data['nombre'],
-                "area": data['area']
-            }
-        )
+        encolar_evento("checklist-nueva", {
+            "checklist_id": result.data[0]['id'],
+            "nombre": data['nombre'],
+            "area": data['area']
+        })
     except Exception as e:
         st.error(f"Error guardando checklist: {e}")
 
@@ -176,7 +169,7 @@ def programar_inspeccion(usuario):
     supabase = get_supabase_client()
     
     # Cargar checklists disponibles
-    checklists = supabase.table('checklists').select('*').eq('activo', True).execute().data
+    checklists = supabase.table('checklists').select(columnas('inspecciones.checklists')).eq('activo', True).execute().data
     
     if not checklists:
         st.warning("⚠️ No hay checklists activas. Crea una primero.")
@@ -231,22 +224,36 @@ def programar_inspeccion(usuario):
                     value=4,
                     help="Ej: 4 semanas = 1 mes de inspecciones semanales"
                 )
+            
+            regla = st.text_input(
+                "Regla RRULE (opcional)",
+                placeholder="FREQ=WEEKLY;BYDAY=MO,TH;COUNT=8",
+                help="Regla iCalendar (RFC 5545). Si se indica, reemplaza frecuencia y repeticiones"
+            )
         
         submitted = st.form_submit_button("📅 Programar", type="primary")
         
         if submitted:
             if es_recurrente:
-                # Crear múltiples inspecciones
-                fechas = generar_fechas_recurrencia(fecha_programada, frecuencia, veces)
-                for fecha in fechas:
-                    guardar_inspeccion_programada({
-                        'checklist_id': checklist_id,
-                        'area': area,
-                        'fecha_programada': fecha,
-                        'supervisor_id': inspector_id,
-                        'estado': 'programada'
-                    })
-                st.success(f"✅ {len(fechas)} inspecciones programadas!")
+                # Crear todas las inspecciones en un solo insert
+                try:
+                    if regla.strip():
+                        fechas = expandir_regla_recurrencia(fecha_programada, regla.strip())
+                    else:
+                        fechas = generar_fechas_recurrencia(fecha_programada, frecuencia, veces)
+                except ValueError as e:
+                    st.error(f"Regla de recurrencia inválida: {e}")
+                    return
+                
+                ids = programar_inspecciones_masivo({
+                    'checklist_id': checklist_id,
+                    'area': area,
+                    'supervisor_id': inspector_id,
+                    'estado': 'programada'
+                }, fechas)
+                
+                if ids:
+                    st.success(f"✅ {len(ids)} inspecciones programadas!")
             else:
                 guardar_inspeccion_programada({
                     'checklist_id': checklist_id,
@@ -257,28 +264,85 @@ def programar_inspeccion(usuario):
                 })
                 st.success("✅ Inspección programada exitosamente!")
 
+# Tope de fechas al expandir reglas RRULE sin COUNT ni UNTIL
+MAX_INSPECCIONES_RECURRENTES = 366
+
+FRECUENCIAS_RRULE = {
+    "diaria": DAILY,
+    "semanal": WEEKLY,
+    "mensual": MONTHLY
+}
+
 def generar_fechas_recurrencia(fecha_inicio, frecuencia, veces):
     """Generar fechas para inspecciones recurrentes"""
-    fechas = []
-    fecha_actual = fecha_inicio
+    if frecuencia == "mensual" and fecha_inicio.day > 28:
+        # Día 29-31: en meses más cortos se usa el último día del mes
+        regla = rrule(MONTHLY, dtstart=fecha_inicio, count=veces,
+                      bymonthday=(fecha_inicio.day, -1), bysetpos=1)
+    else:
+        regla = rrule(FRECUENCIAS_RRULE[frecuencia], dtstart=fecha_inicio, count=veces)
+    
+    return [fecha.date() for fecha in regla]
+
+def expandir_regla_recurrencia(fecha_inicio, regla, max_fechas=MAX_INSPECCIONES_RECURRENTES):
+    """
+    Expandir una regla RRULE (RFC 5545) desde fecha_inicio
+    
+    Args:
+        fecha_inicio: date de la primera inspección (DTSTART)
+        regla: p.ej. "FREQ=WEEKLY;BYDAY=MO,TH;COUNT=8" o "FREQ=MONTHLY;UNTIL=20271231"
+        max_fechas: Tope de fechas generadas (reglas sin COUNT ni UNTIL)
+    
+    Returns:
+        Lista de date. Lanza ValueError si la regla no es válida.
+    """
+    dtstart = datetime.combine(fecha_inicio, datetime.min.time())
+    regla = regla.upper()
+    if regla.startswith("RRULE:"):
+        regla = regla[len("RRULE:"):]
+    
+    fechas = list(islice(rrulestr(regla, dtstart=dtstart), max_fechas))
+    return [fecha.date() for fecha in fechas]
+
+def programar_inspecciones_masivo(datos_base, fechas):
+    """
+    Programar una inspección por fecha con un solo insert a PostgREST
     
-    for i in range(veces):
-        fechas.append(fecha_actual)
-        
-        if frecuencia == "diaria":
-            fecha_actual += timedelta(days=1)
-        elif frecuencia == "semanal":
-            fecha_actual += timedelta(weeks=1)
-        elif frecuencia == "mensual":
-            # Sumar mes manualmente
-            mes = fecha_actual.month + 1
-            año = fecha_actual.year
-            if mes > 12:
-                mes = 1
-                año += 1
-            fecha_actual = fecha_actual.replace(year=año, month=mes)
-    
-    return fechas
+    Args:
+        datos_base: Campos comunes (checklist_id, area, supervisor_id, estado)
+        fechas: Lista de date
+    
+    Returns:
+        Lista de ids creados (en el orden de `fechas`), vacía si falla
+    """
+    supabase = get_supabase_client()
+    
+    filas = [
+        {**datos_base, 'fecha_programada': fecha.isoformat()}
+        for fecha in fechas
+    ]
+    
+    if not filas:
+        return []
+    
+    try:
+        result = supabase.table('inspecciones').insert(filas).execute()
+        invalidar_tablas('inspecciones')
+    except Exception as e:
+        st.error(f"Error programando inspecciones: {e}")
+        return []
+    
+    # Notificar al inspector (un envío en lote si la ruta está en N8N_RUTAS_LOTE)
+    with lote_eventos():
+        for fila in result.data:
+            encolar_evento("inspeccion-programada", {
+                "inspeccion_id": fila['id'],
+                "area": fila['area'],
+                "fecha": fila['fecha_programada'],
+                "inspector_id": fila['supervisor_id']
+            })
+    
+    return [fila['id'] for fila in result.data]
 
 def guardar_inspeccion_programada(data):
     """Guardar inspección programada y notificar"""
@@ -286,17 +350,15 @@ def guardar_inspeccion_programada(data):
     
     try:
         result = supabase.table('inspecciones').insert(data).execute()
+        invalidar_tablas('inspecciones')
         
         # Notificar al inspector
-        requests.post(
-            st.secrets["N8N_WEBHOOK_URL"] + "/inspeccion-programada",
-            json={
-                "inspeccion_id": result.data[0]['id'],
-                "area": data['area'],
-                "fecha": data['fecha_programada'].isoformat(),
-                "inspector_id": data['supervisor_id']
-            }
-        )
+        encolar_evento("inspeccion-programada", {
+            "inspeccion_id": result.data[0]['id'],
+            "area": data['area'],
+            "fecha": data['fecha_programada'].isoformat(),
+            "inspector_id": data['supervisor_id']
+        })
     except Exception as e:
         st.error(f"Error programando inspección: {e}")
 
@@ -309,7 +371,7 @@ def ejecutar_inspeccion(usuario):
     
     # Cargar inspecciones asignadas al usuario y pendientes
     inspecciones_pendientes = supabase.from_('inspecciones').select(
-        '*, checklists(*)'
+        columnas('inspecciones.pendientes')
     ).eq('supervisor_id', usuario['id']).in_('estado', ['programada', 'en_proceso']).execute().data
     
     if not inspecciones_pendientes:
@@ -490,6 +552,7 @@ def actualizar_estado_inspeccion(inspeccion_id, estado):
         'estado': estado,
         'fecha_realizada': datetime.now().date() if estado == 'completada' else None
     }).eq('id', inspeccion_id).execute()
+    invalidar_tablas('inspecciones')
 
 def guardar_resultado_inspeccion(inspeccion_id, respuestas, hallazgos, observaciones, estado):
     """Guardar resultados de inspección y crear hallazgos"""
@@ -503,6 +566,7 @@ def guardar_resultado_inspeccion(inspeccion_id, respuestas, hallazgos, observaci
             'observaciones': observaciones,
             'respuestas_json': json.dumps(respuestas)
         }).eq('id', inspeccion_id).execute()
+        invalidar_tablas('inspecciones')
         
         # Crear hallazgos
         for hallazgo in hallazgos:
@@ -514,16 +578,21 @@ def guardar_resultado_inspeccion(inspeccion_id, respuestas, hallazgos, observaci
                     inspeccion_id
                 )
             
-            # Insertar hallazgo
-            supabase.table('hallazgos').insert({
-                'inspeccion_id': inspeccion_id,
-                'descripcion': hallazgo['descripcion'],
-                'categoria': hallazgo['categoria'],
-                'evidencia': [evidencia_url] if evidencia_url else [],
-                'estado': 'abierto',
-                'responsable_id': hallazgo['responsable'],
-                'fecha_limite': hallazgo['fecha_limite'].isoformat()
-            }).execute()
+            # Insertar hallazgo (si falla, se libera la evidencia recién subida)
+            try:
+                supabase.table('hallazgos').insert({
+                    'inspeccion_id': inspeccion_id,
+                    'descripcion': hallazgo['descripcion'],
+                    'categoria': hallazgo['categoria'],
+                    'evidencia': [evidencia_url] if evidencia_url else [],
+                    'estado': 'abierto',
+                    'responsable_id': hallazgo['responsable'],
+                    'fecha_limite': hallazgo['fecha_limite'].isoformat()
+                }).execute()
+            except Exception:
+                descartar_subida(evidencia_url, 'sst-evidencias')
+                raise
+            invalidar_tablas('hallazgos')
     
     except Exception as e:
         st.error(f"Error guardando resultados: {e}")
@@ -535,17 +604,14 @@ def subir_evidencia_hallazgo(archivo, inspeccion_id):
 def notificar_hallazgos(inspeccion, hallazgos):
     """Notificar vía n8n sobre hallazgos detectados"""
     try:
-        requests.post(
-            st.secrets["N8N_WEBHOOK_URL"] + "/hallazgos-detectados",
-            json={
-                "inspeccion_id": inspeccion['id'],
-                "area": inspeccion['area'],
-                "total_hallazgos": len(hallazgos),
-                "hallazgos": hallazgos
-            }
-        )
-    except:
-        pass  # Silenciar error de notificación
+        encolar_evento("hallazgos-detectados", {
+            "inspeccion_id": inspeccion['id'],
+            "area": inspeccion['area'],
+            "total_hallazgos": len(hallazgos),
+            "hallazgos": hallazgos
+        })
+    except Exception as e:
+        st.warning(f"⚠️ No se pudo registrar la notificación de hallazgos: {e}")
 
 def seguimiento_hallazgos(usuario):
     """Seguimiento y cierre de hallazgos"""
@@ -577,14 +643,22 @@ def seguimiento_hallazgos(usuario):
         )
     
     # Consultar hallazgos
-    query = supabase.table('hallazgos').select(
-        '*, inspecciones(area, fecha_programada), usuarios(nombre_completo)'
-    )
-    
-    if estado_filtro != "todos":
-        query = query.eq('estado', estado_filtro)
+    def construir_consulta():
+        query = supabase.table('hallazgos').select(
+            columnas('inspecciones.hallazgos')
+        )
+        
+        if estado_filtro != "todos":
+            query = query.eq('estado', estado_filtro)
+        
+        return query
     
-    hallazgos = query.execute().data
+    # Paginación keyset en el servidor
+    hallazgos = paginar_consulta(
+        construir_consulta,
+        clave="hallazgos",
+        firma_filtros=(estado_filtro, area_filtro, fecha_filtro)
+    )
     
     if not hallazgos:
         st.success("✅ No hay hallazgos con los filtros seleccionados")
@@ -674,19 +748,22 @@ def actualizar_hallazgo(hallazgo_id, estado, comentarios, fecha_cierre, evidenci
             'fecha_cierre': fecha_cierre.isoformat() if fecha_cierre else None
         }
         
-        # Subir evidencia de cierre
-        if evidencia:
-            evidencia_url = subir_evidencia_hallazgo(evidencia, hallazgo_id)
-            update_data['evidencia_cierre'] = [evidencia_url]
+        # Evidencia de cierre: se sube en segundo plano, el registro guarda un marcador
+        subida = preparar_subida(evidencia, 'sst-evidencias')
+        if subida:
+            update_data['evidencia_cierre'] = [subida['marcador']]
         
-        supabase.table('hallazgos').update(update_data).eq('id', hallazgo_id).execute()
+        try:
+            supabase.table('hallazgos').update(update_data).eq('id', hallazgo_id).execute()
+        except Exception:
+            descartar_subidas([subida])
+            raise
+        invalidar_tablas('hallazgos')
+        encolar_subidas([subida], f"inspecciones/{hallazgo_id}/", 'hallazgos', hallazgo_id, 'evidencia_cierre')
         
         # Notificar cierre
         if estado == 'cerrado':
-            requests.post(
-                st.secrets["N8N_WEBHOOK_URL"] + "/hallazgo-cerrado",
-                json={"hallazgo_id": hallazgo_id}
-            )
+            encolar_evento("hallazgo-cerrado", {"hallazgo_id": hallazgo_id})
     
     except Exception as e:
         st.error(f"Error actualizando hallazgo: {e}")
@@ -4,6 +4,14 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta,date
 from app.utils.supabase_client import get_supabase_client
+from app.utils.datos_referencia import obtener_areas
+from app.utils.carga_paralela import cargar_en_paralelo, mostrar_tiempos_carga
+from app.utils.snapshots import consulta_tabla
+from app.utils.analitica import contar_por, contar_por_mes, pivotar, seleccionar, valores_distintos
+from app.utils.kpis import obtener_kpis
+from app.utils.cache_tablas import cache_por_tablas, invalidar_tablas
+from app.utils.pestanas import mostrar_pestanas
+from app.utils.n8n_client import encolar_evento
 from app.auth import requerir_rol
 import io
 from reportlab.lib.pagesizes import letter, A4
@@ -13,12 +21,8 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase import pdfmetrics
 import base64
-import os
 import json
-import requests
 from app.utils.storage_helper import subir_archivo_storage
-from dotenv import load_dotenv
-load_dotenv()
 
 def mostrar(usuario):
     """Módulo de Reportes Legales y Estadísticos (Ley 29783 Art. 24)"""
@@ -30,40 +34,27 @@ def mostrar(usuario):
     with st.sidebar.expander("🔧 Filtros de Reporte", expanded=True):
         filtros = crear_filtros_reportes()
     
-    # Tabs de reportes
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "📈 Resumen Ejecutivo",
-        "📋 Reporte Legal SUNAFIL",
-        "⚠️ Matriz de Riesgos",
-        "📉 Análisis Estadístico",
-        "📤 Exportar & Enviar"
-    ])
-    
     data = cargar_datos_reporte(filtros)
     
     if not data:
         st.error("No se pudieron cargar los datos del reporte")
         return
     
-    with tab1:
-        mostrar_resumen_ejecutivo(data, filtros)
-    
-    with tab2:
-        mostrar_reporte_legal_sunafil(data, filtros)
-    
-    with tab3:
-        mostrar_matriz_riesgos_interactiva(data, filtros)
-    
-    with tab4:
-        mostrar_analisis_estadistico(data, filtros)
-    
-    with tab5:
-        mostrar_exportar_enviar(data, filtros)
+    if usuario['rol'] == 'admin':
+        with st.sidebar.expander("⏱️ Tiempos de Carga"):
+            mostrar_tiempos_carga('reportes', st)
+    
+    # Pestañas de reportes: solo se ejecuta la activa
+    mostrar_pestanas({
+        "📈 Resumen Ejecutivo": mostrar_resumen_ejecutivo,
+        "📋 Reporte Legal SUNAFIL": mostrar_reporte_legal_sunafil,
+        "⚠️ Matriz de Riesgos": mostrar_matriz_riesgos_interactiva,
+        "📉 Análisis Estadístico": mostrar_analisis_estadistico,
+        "📤 Exportar & Enviar": mostrar_exportar_enviar,
+    }, clave="reportes", args=(data, filtros))
 
 def crear_filtros_reportes():
     """Crear filtros avanzados para personalizar reportes"""
-    supabase = get_supabase_client()
-    
     # Rango de fechas (últimos 3 meses por defecto)
     col1, col2 = st.columns(2)
     with col1:
@@ -80,8 +71,7 @@ def crear_filtros_reportes():
         )
     
     # Áreas
-    areas_data = supabase.table('riesgos').select('area').execute().data
-    areas = sorted(list(set([a['area'] for a in areas_data]))) if areas_data else []
+    areas = obtener_areas()
     areas_seleccionadas = st.multiselect("Áreas", areas, default=areas, key="rep_areas")
     
     # Tipos de incidente
@@ -107,46 +97,47 @@ def crear_filtros_reportes():
         'solo_fechas_limite': mostrar_solo_fechas_limite
     }
 
-@st.cache_data(ttl=600)  # Cache 10 minutos
+def filtros_consulta(filtros):
+    """Filtros [(columna, op, valor)] de incidentes y riesgos según los filtros del reporte"""
+    por_area = [('area', 'in', filtros['areas'])] if filtros['areas'] else []
+    
+    filtros_incidentes = [
+        ('fecha_hora', 'gte', filtros['fecha_inicio']),
+        ('fecha_hora', 'lte', filtros['fecha_fin'])
+    ] + por_area
+    if filtros['tipos_incidente']:
+        filtros_incidentes.append(('tipo', 'in', filtros['tipos_incidente']))
+    
+    filtros_riesgos = [('nivel_riesgo', 'gte', filtros['nivel_riesgo_min'])] + por_area
+    
+    return filtros_incidentes, filtros_riesgos
+
+@cache_por_tablas('incidentes', 'riesgos', 'epp_asignaciones', 'capacitaciones', 'inspecciones',
+                  'hallazgos', 'documentos', 'usuarios', 'epp_catalogo')
 def cargar_datos_reporte(filtros):
     """Cargar todos los datos necesarios para reportes"""
     try:
-        supabase = get_supabase_client()
+        filtros_incidentes, filtros_riesgos = filtros_consulta(filtros)
         
-        # Cargar incidentes con filtros
-        query_incidentes = supabase.table('incidentes').select('*, usuarios(nombre_completo)').gte(
-            'fecha_hora', filtros['fecha_inicio']
-        ).lte('fecha_hora', filtros['fecha_fin'])
-        
-        if filtros['areas']:
-            query_incidentes = query_incidentes.in_('area', filtros['areas'])
-        if filtros['tipos_incidente']:
-            query_incidentes = query_incidentes.in_('tipo', filtros['tipos_incidente'])
-        
-        incidentes = query_incidentes.execute().data
-        df_incidentes = pd.DataFrame(incidentes) if incidentes else pd.DataFrame()
+        # Las siete lecturas son independientes: se ejecutan en paralelo, cada
+        # una desde la instantánea local de su tabla (solo baja lo que cambió)
+        data = cargar_en_paralelo({
+            'incidentes': consulta_tabla('incidentes', 'reportes.incidentes', filtros_incidentes),
+            'riesgos': consulta_tabla('riesgos', 'reportes.riesgos', filtros_riesgos),
+            'epp': consulta_tabla('epp_asignaciones', 'reportes.epp'),
+            'capacitaciones': consulta_tabla('capacitaciones', 'reportes.capacitaciones'),
+            'inspecciones': consulta_tabla('inspecciones', 'reportes.inspecciones'),
+            'hallazgos': consulta_tabla('hallazgos', 'reportes.hallazgos'),
+            'documentos': consulta_tabla('documentos', 'reportes.documentos')
+        }, nombre_carga='reportes')
         
         # Aplanar usuarios en incidentes
+        df_incidentes = data['incidentes']
         if not df_incidentes.empty and 'usuarios' in df_incidentes.columns:
             df_incidentes['nombre_completo'] = df_incidentes['usuarios'].apply(lambda x: x.get('nombre_completo') if x else 'Sin Asignar')
-            
-        # Cargar riesgos
-        query_riesgos = supabase.table('riesgos').select('*, usuarios(nombre_completo)').gte(
-            'nivel_riesgo', filtros['nivel_riesgo_min']
-        )
-        if filtros['areas']:
-            query_riesgos = query_riesgos.in_('area', filtros['areas'])
-        riesgos = query_riesgos.execute().data
-        
-        df_riesgos = pd.DataFrame(riesgos) if riesgos else pd.DataFrame()
-        
-        
-        # Cargar EPP
-        epp = supabase.table('epp_asignaciones').select('*, usuarios(nombre_completo), epp_catalogo(*)').execute().data
-        
-        df_epp = pd.DataFrame(epp) if epp else pd.DataFrame()
         
         # Aplanar EPP: Extraer nombre del usuario y nombre del EPP
+        df_epp = data['epp']
         if not df_epp.empty:
             if 'usuarios' in df_epp.columns:
                 df_epp['nombre_completo'] = df_epp['usuarios'].apply(lambda x: x.get('nombre_completo') if x else '')
@@ -155,30 +146,7 @@ def cargar_datos_reporte(filtros):
             if 'epp_catalogo' in df_epp.columns:
                 df_epp['epp_nombre'] = df_epp['epp_catalogo'].apply(lambda x: x.get('nombre') if x else 'Desconocido')
         
-        # Cargar capacitaciones
-        capacitaciones = supabase.table('capacitaciones').select('*, asistentes_capacitacion(*)').execute().data
-        df_capacitaciones = pd.DataFrame(capacitaciones) if capacitaciones else pd.DataFrame()
-        
-        # Cargar inspecciones y hallazgos
-        inspecciones = supabase.table('inspecciones').select('*, checklists(*)').execute().data
-        df_inspecciones = pd.DataFrame(inspecciones) if inspecciones else pd.DataFrame()
-        
-        hallazgos = supabase.table('hallazgos').select('*, usuarios(nombre_completo)').execute().data
-        df_hallazgos = pd.DataFrame(hallazgos) if hallazgos else pd.DataFrame()
-        
-        # Cargar documentos
-        documentos = supabase.table('documentos').select('*, usuarios(nombre_completo)').execute().data
-        df_documentos = pd.DataFrame(documentos) if documentos else pd.DataFrame()
-        
-        return {
-            'incidentes': df_incidentes,
-            'riesgos': df_riesgos,
-            'epp': df_epp,
-            'capacitaciones': df_capacitaciones,
-            'inspecciones': df_inspecciones,
-            'hallazgos': df_hallazgos,
-            'documentos': df_documentos
-        }
+        return data
     except Exception as e:
         st.error(f"Error al cargar datos: {e}")
         return None
@@ -187,34 +155,40 @@ def mostrar_resumen_ejecutivo(data, filtros):
     """Generar resumen ejecutivo con KPIs"""
     st.header("📈 Resumen Ejecutivo de SST")
     
-    # Métricas clave
+    # Métricas clave (agregadas en el servidor vía RPC kpis_sst)
+    try:
+        kpis = obtener_kpis(
+            filtros['fecha_inicio'],
+            filtros['fecha_fin'],
+            areas=filtros['areas'],
+            tipos_incidente=filtros['tipos_incidente'],
+            nivel_riesgo_min=filtros['nivel_riesgo_min']
+        )
+    except Exception as e:
+        st.error(f"Error cargando indicadores: {e}")
+        return
+    
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total_incidentes = len(data['incidentes'])
-        st.metric("🚨 Total Incidentes", total_incidentes, delta=f"vs periodo anterior")
+        st.metric("🚨 Total Incidentes", kpis['incidentes_total'], delta=f"vs periodo anterior")
     
     with col2:
-        riesgos_criticos = len(data['riesgos'][data['riesgos']['nivel_riesgo'] >= 15])
-        st.metric("⚠️ Riesgos Críticos", riesgos_criticos, delta_color="inverse")
+        st.metric("⚠️ Riesgos Críticos", kpis['riesgos_criticos'], delta_color="inverse")
     
     with col3:
-        epp_vencido = len(data['epp'][pd.to_datetime(data['epp']['fecha_vencimiento']) < datetime.now()])
-        st.metric("🛡️ EPP Vencidos", epp_vencido, delta_color="inverse")
+        st.metric("🛡️ EPP Vencidos", kpis['epp_vencidos'], delta_color="inverse")
     
     with col4:
-        capac_realizada = len(data['capacitaciones'][data['capacitaciones']['estado'] == 'realizada'])
-        capac_total = len(data['capacitaciones'])
-        cumplimiento = (capac_realizada / capac_total * 100) if capac_total > 0 else 0
-        st.metric("🎯 % Cumplimiento", f"{cumplimiento:.1f}%")
+        st.metric("🎯 % Cumplimiento", f"{kpis['cumplimiento_capacitacion']:.1f}%")
     
     # Gráfico de tendencia de incidentes
     st.subheader("Tendencia de Incidentes")
-    if not data['incidentes'].empty:
-        data['incidentes']['mes'] = pd.to_datetime(data['incidentes']['fecha_hora']).dt.to_period('M').astype(str)
-        
-        tendencia = data['incidentes'].groupby('mes').size()
-        fig = px.line(tendencia, title="Incidentes por Mes", labels={'value': 'N° Incidentes'})
+    filtros_incidentes, _ = filtros_consulta(filtros)
+    tendencia = contar_por_mes('incidentes', 'fecha_hora', filtros_incidentes)
+    if not tendencia.empty:
+        fig = px.line(tendencia, x='mes', y='cantidad', title="Incidentes por Mes",
+                      labels={'cantidad': 'N° Incidentes'})
         fig.update_traces(mode='lines+markers')
         st.plotly_chart(fig, use_container_width=True)
 
@@ -277,7 +251,11 @@ def mostrar_matriz_riesgos_interactiva(data, filtros):
     """Mostrar matriz de riesgos para análisis"""
     st.header("⚠️ Matriz de Riesgos Interactiva")
     
-    if data['riesgos'].empty:
+    _, filtros_riesgos = filtros_consulta(filtros)
+    areas = valores_distintos('riesgos', 'area', filtros_riesgos)
+    tipos = valores_distintos('riesgos', 'tipo_peligro', filtros_riesgos)
+    
+    if not areas:
         st.info("No hay datos de riesgos")
         return
     
@@ -289,18 +267,18 @@ def mostrar_matriz_riesgos_interactiva(data, filtros):
                                       default=['pendiente', 'en_mitigacion'])
     with col2:
         area_seleccionada = st.multiselect("Área Específica", 
-                                          options=sorted(data['riesgos']['area'].unique()),
-                                          default=sorted(data['riesgos']['area'].unique()))
+                                          options=areas,
+                                          default=areas)
     with col3:
         tipo_peligro = st.multiselect("Tipo de Peligro",
-                                     options=sorted(data['riesgos']['tipo_peligro'].unique()),
-                                     default=sorted(data['riesgos']['tipo_peligro'].unique()))
-    
-    # Filtrar datos
-    riesgos_filtrados = data['riesgos'][
-        (data['riesgos']['estado'].isin(estado_riesgo)) &
-        (data['riesgos']['area'].isin(area_seleccionada)) &
-        (data['riesgos']['tipo_peligro'].isin(tipo_peligro))
+                                     options=tipos,
+                                     default=tipos)
+    
+    # Filtrar datos (se resuelve en la consulta, sobre la instantánea local)
+    riesgos_filtrados = filtros_riesgos + [
+        ('estado', 'in', estado_riesgo),
+        ('area', 'in', area_seleccionada),
+        ('tipo_peligro', 'in', tipo_peligro)
     ]
     
     
@@ -308,15 +286,10 @@ def mostrar_matriz_riesgos_interactiva(data, filtros):
     st.subheader("📊 Mapa de Calor de Riesgo")
     
     # Crear matriz 5x5
-    matriz = riesgos_filtrados.groupby(['probabilidad', 'severidad']).size().unstack(fill_value=0)
-    
     rango_1_5 = [1,2,3,4,5]
     
-    matriz = matriz.reindex(
-        index=rango_1_5,
-        columns=rango_1_5,
-        fill_value=0
-    )
+    matriz = pivotar('riesgos', 'probabilidad', 'severidad', riesgos_filtrados,
+                     indice=rango_1_5, encabezados=rango_1_5)
     
     fig = px.imshow(matriz,
                     labels=dict(x="Severidad", y="Probabilidad", color="Cantidad"),
@@ -333,10 +306,10 @@ def mostrar_matriz_riesgos_interactiva(data, filtros):
     
     # Tabla de riesgos críticos
     st.subheader("🎯 Riesgos Críticos (Nivel ≥ 15)")
-    criticos = riesgos_filtrados[riesgos_filtrados['nivel_riesgo'] >= 15]
+    criticos = seleccionar('riesgos', ['codigo', 'area', 'puesto_trabajo', 'peligro', 'nivel_riesgo', 'estado'],
+                           riesgos_filtrados + [('nivel_riesgo', 'gte', 15)])
     if not criticos.empty:
-        st.dataframe(criticos[['codigo', 'area', 'puesto_trabajo', 'peligro', 'nivel_riesgo', 'estado']], 
-                    use_container_width=True)
+        st.dataframe(criticos, use_container_width=True)
     else:
         st.success("✅ No hay riesgos críticos en este filtro")
 
@@ -344,29 +317,34 @@ def mostrar_analisis_estadistico(data, filtros):
     """Análisis estadístico avanzado"""
     st.header("📉 Análisis Estadístico Avanzado")
     
+    filtros_incidentes, filtros_riesgos = filtros_consulta(filtros)
+    
     # Distribución de incidentes
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Distribución por Área")
-        if not data['incidentes'].empty:
-            fig = px.bar(data['incidentes']['area'].value_counts(), 
+        por_area = contar_por('incidentes', ['area'], filtros_incidentes)
+        if not por_area.empty:
+            fig = px.bar(por_area, x='cantidad', y='area',
                         title="Incidentes por Área",
                         orientation='h')
             st.plotly_chart(fig, use_container_width=True)
     
     with col2:
         st.subheader("Distribución por Tipo de Peligro")
-        if not data['riesgos'].empty:
-            fig = px.pie(data['riesgos'], names='tipo_peligro', 
+        por_tipo = contar_por('riesgos', ['tipo_peligro'], filtros_riesgos)
+        if not por_tipo.empty:
+            fig = px.pie(por_tipo, names='tipo_peligro', values='cantidad',
                         title="Tipos de Peligros Identificados")
             st.plotly_chart(fig, use_container_width=True)
     
     # Análisis de hallazgos
     st.subheader("📋 Análisis de Hallazgos de Inspección")
-    if not data['hallazgos'].empty:
+    hallazgos = contar_por('hallazgos', ['categoria', 'estado'])
+    if not hallazgos.empty:
         # Hallazgos por estado
-        fig = px.sunburst(data['hallazgos'], path=['categoria', 'estado'], 
+        fig = px.sunburst(hallazgos, path=['categoria', 'estado'], values='cantidad',
                          title="Hallazgos por Categoría y Estado",
                          height=500)
         st.plotly_chart(fig, use_container_width=True)
@@ -585,18 +563,16 @@ def configurar_webhook_n8n(data, filtros, email, frecuencia):
         }
         
         resultado = supabase.table('configuraciones_reportes').upsert(config).execute()
+        invalidar_tablas('configuraciones_reportes')
         config_id = resultado.data[0]['id'] if resultado.data else "ID_PENDIENTE"
         
         # Disparar webhook de n8n para validación
-        requests.post(
-            os.getenv("N8N_WEBHOOK_URL") + "/configurar-reporte-automatico",
-            json={
-                'email': email,
-                'frecuencia': frecuencia,
-                'filtros': json.dumps(filtros_serializables),
-                'config_id': config_id
-            }
-        )
+        encolar_evento("configurar-reporte-automatico", {
+            'email': email,
+            'frecuencia': frecuencia,
+            'filtros': json.dumps(filtros_serializables),
+            'config_id': config_id
+        })
         
         st.success("✅ Webhook configurado. El reporte se enviará automáticamente.")
     except Exception as e:
@@ -1,11 +1,14 @@
 import streamlit as st
 import pandas as pd
 from app.utils.supabase_client import get_supabase_client
+from app.utils.cache_tablas import invalidar_tablas
+from app.config.proyecciones import columnas
+from app.utils.datos_referencia import obtener_usuarios
+from app.utils.paginacion import paginar_consulta
+from app.utils.pestanas import mostrar_pestanas
+from app.utils.n8n_client import encolar_evento
 from app.auth import requerir_rol
 import plotly.express as px
-import os
-from dotenv import load_dotenv
-load_dotenv()
 
 def mostrar(usuario):
     """Módulo de Gestión de Riesgos (Ley 29783 Art. 26-28)"""
@@ -13,33 +16,18 @@ def mostrar(usuario):
     
     st.title("⚠️ Gestión de Riesgos Laborales")
     
-    tab1, tab2, tab3 = st.tabs([
-        "📝 Registrar Riesgo",
-        "📋 Listar Riesgos",
-        "📊 Dashboard"
-    ])
-    
-    with tab1:
-        registrar_riesgo(usuario)
-    
-    with tab2:
-        listar_riesgos(usuario)
-    
-    with tab3:
-        dashboard_riesgos()
+    # Pestañas: solo se ejecuta la activa
+    mostrar_pestanas({
+        "📝 Registrar Riesgo": registrar_riesgo,
+        "📋 Listar Riesgos": listar_riesgos,
+        "📊 Dashboard": dashboard_riesgos,
+    }, clave="riesgos", args=(usuario,))
 
 def registrar_riesgo(usuario):
     """Formulario dinámico de evaluación de riesgos"""
     
-    supabase = get_supabase_client()
-    
-    # Consultar usuarios
-    response = supabase.table('usuarios').select('id, nombre_completo').execute()
-    
-    if response.data:
-        usuarios = response.data
-    else:
-        usuarios = []
+    # Usuarios (datos de referencia en caché)
+    usuarios = obtener_usuarios()
     
     with st.form("form_riesgo", clear_on_submit=True):
         st.subheader("Evaluación de Riesgo")
@@ -108,13 +96,10 @@ def guardar_riesgo(data):
     try:
         # Insertar en BD
         supabase.table('riesgos').insert(data).execute()
+        invalidar_tablas('riesgos')
         
         # Disparar webhook de n8n
-        import requests
-        requests.post(
-            os.getenv("N8N_WEBHOOK_URL") + "riesgo-nuevo",
-            json={"codigo": codigo, "nivel_riesgo": data['probabilidad'] * data['severidad']}
-        )
+        encolar_evento("riesgo-nuevo", {"codigo": codigo, "nivel_riesgo": data['probabilidad'] * data['severidad']})
         
     except Exception as e:
         st.error(f"Error al guardar: {e}")
@@ -133,17 +118,25 @@ def listar_riesgos(usuario):
         filtro_estado = st.selectbox("Estado", ["todos", "pendiente", "en_mitigacion", "controlado"])
     
     # Consulta
-    query = supabase.table('riesgos').select('*, usuarios(nombre_completo)')
-    
-    if filtro_area:
-        query = query.in_('area', filtro_area)
-    if filtro_estado != "todos":
-        query = query.eq('estado', filtro_estado)
+    def construir_consulta(seleccion=columnas('riesgos.listado')):
+        query = supabase.table('riesgos').select(seleccion)
+        
+        if filtro_area:
+            query = query.in_('area', filtro_area)
+        if filtro_estado != "todos":
+            query = query.eq('estado', filtro_estado)
+        
+        return query
     
-    response = query.execute()
+    # Paginación keyset en el servidor
+    filas = paginar_consulta(
+        construir_consulta,
+        clave="riesgos",
+        firma_filtros=(tuple(filtro_area), filtro_estado)
+    )
     
-    if response.data:
-        df = pd.DataFrame(response.data)
+    if filas:
+        df = pd.DataFrame(filas)
         
         # Columnas para la tabla
         df_display = df[['codigo', 'area', 'puesto_trabajo', 'peligro', 
@@ -161,7 +154,9 @@ def listar_riesgos(usuario):
         
         # Exportar a Excel
         if st.button("📥 Exportar a Excel"):
-            output = df.to_excel("riesgos.xlsx", index=False)
+            # Exportar todos los riesgos filtrados, no solo la página actual
+            df_export = pd.DataFrame(construir_consulta(columnas('riesgos.exportar')).execute().data)
+            output = df_export.to_excel("riesgos.xlsx", index=False)
             with open("riesgos.xlsx", "rb") as file:
                 st.download_button(
                     label="Descargar Excel",
@@ -171,11 +166,11 @@ def listar_riesgos(usuario):
     else:
         st.info("No se encontraron riesgos con los filtros seleccionados")
 
-def dashboard_riesgos():
+def dashboard_riesgos(usuario):
     """Visualización en tiempo real"""
     
     supabase = get_supabase_client()
-    data = supabase.table('riesgos').select('*').execute().data
+    data = supabase.table('riesgos').select(columnas('riesgos.dashboard')).execute().data
     
     if not data:
         st.warning("No hay datos para mostrar")
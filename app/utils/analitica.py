@@ -0,0 +1,113 @@
+"""
+Consultas analíticas sobre las instantáneas locales (Arrow/Parquet).
+
+Las pestañas de reportes piden el agregado que van a dibujar (conteos por
+grupo, pivotes, valores distintos, filas seleccionadas) en lugar de filtrar
+DataFrames completos con máscaras booleanas en cada cambio de widget. Cada
+consulta escanea solo las columnas que necesita, con el filtro empujado al
+Parquet (`snapshots.escanear`), y agrupa en Arrow; a pandas solo pasa el
+resultado, que es chico.
+
+Los filtros usan el formato de `snapshots`: [(columna, op, valor)] con op en
+'eq', 'in', 'gte', 'lte'. Con SNAPSHOTS_ACTIVOS=false (o si la instantánea no
+está disponible) las mismas consultas se resuelven pidiendo a PostgREST solo
+esas columnas y filas.
+"""
+import logging
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from app.config import settings
+from app.utils import snapshots
+
+logger = logging.getLogger(__name__)
+
+def _tabla(tabla, columnas, filtros):
+    """Tabla Arrow con `columnas` de las filas que cumplen `filtros`"""
+    if settings.SNAPSHOTS_ACTIVOS:
+        try:
+            return snapshots.escanear(tabla, columnas, filtros)
+        except Exception as e:
+            logger.warning("Instantánea '%s' no disponible, se consulta PostgREST: %s", tabla, e)
+
+    return pa.Table.from_pylist(snapshots.leer_remoto(tabla, ", ".join(columnas), filtros))
+
+def _renombrar_conteo(agregado):
+    return agregado.rename_columns(['cantidad' if c == 'count_all' else c for c in agregado.column_names])
+
+def contar(tabla, filtros=()):
+    """Cantidad de filas que cumplen `filtros`"""
+    return _tabla(tabla, ['id'], filtros).num_rows
+
+def contar_por(tabla, grupos, filtros=()):
+    """
+    Conteo de filas por combinación de `grupos`
+
+    Returns:
+        DataFrame con las columnas de `grupos` y 'cantidad', de mayor a menor
+    """
+    datos = _tabla(tabla, grupos, filtros)
+    if not datos.num_rows:
+        return pd.DataFrame(columns=[*grupos, 'cantidad'])
+
+    conteo = _renombrar_conteo(datos.group_by(grupos).aggregate([([], 'count_all')]))
+    return conteo.to_pandas()[[*grupos, 'cantidad']].sort_values('cantidad', ascending=False, ignore_index=True)
+
+def contar_por_mes(tabla, columna_fecha, filtros=()):
+    """
+    Conteo por mes ('AAAA-MM') de una columna de fecha/hora ISO
+
+    Returns:
+        DataFrame con 'mes' y 'cantidad', en orden cronológico
+    """
+    datos = _tabla(tabla, [columna_fecha], filtros)
+    if not datos.num_rows:
+        return pd.DataFrame(columns=['mes', 'cantidad'])
+
+    meses = pa.table({'mes': pc.utf8_slice_codeunits(pc.cast(datos[columna_fecha], pa.string()), 0, 7)})
+    conteo = _renombrar_conteo(meses.group_by('mes').aggregate([([], 'count_all')]))
+    return conteo.to_pandas()[['mes', 'cantidad']].sort_values('mes', ignore_index=True)
+
+def pivotar(tabla, filas, columnas, filtros=(), indice=None, encabezados=None):
+    """
+    Tabla de conteos `filas` x `columnas` (p.ej. probabilidad x severidad)
+
+    Args:
+        indice, encabezados: Valores a mostrar en filas y columnas aunque no
+                             tengan datos (se completan con 0)
+    """
+    conteo = contar_por(tabla, [filas, columnas], filtros)
+    if conteo.empty:
+        return pd.DataFrame(0, index=indice or [], columns=encabezados or [])
+
+    matriz = conteo.pivot_table(index=filas, columns=columnas, values='cantidad', aggfunc='sum', fill_value=0)
+
+    if indice is not None or encabezados is not None:
+        matriz = matriz.reindex(index=indice, columns=encabezados, fill_value=0)
+    return matriz.astype(int)
+
+def valores_distintos(tabla, columna, filtros=()):
+    """Valores no nulos distintos de una columna, ordenados"""
+    datos = _tabla(tabla, [columna], filtros)
+    if not datos.num_rows:
+        return []
+    return sorted(v for v in pc.unique(datos[columna]).to_pylist() if v is not None)
+
+def seleccionar(tabla, columnas, filtros=(), orden=None, descendente=False, limite=None):
+    """
+    Filas con `columnas` que cumplen `filtros`
+
+    Args:
+        orden: Columna por la que ordenar (opcional)
+        descendente: Orden descendente
+        limite: Máximo de filas a devolver
+    """
+    datos = _tabla(tabla, columnas, filtros)
+    if not datos.num_rows:
+        return pd.DataFrame(columns=columnas)
+
+    if orden:
+        datos = datos.sort_by([(orden, 'descending' if descendente else 'ascending')])
+    if limite:
+        datos = datos.slice(0, limite)
+    return datos.to_pandas()[[c for c in columnas if c in datos.column_names]]
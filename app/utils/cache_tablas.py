@@ -0,0 +1,52 @@
+import threading
+import streamlit as st
+from app.config import settings
+
+# Generación por tabla: cada escritura la incrementa. Los cargadores cacheados
+# incluyen en su clave de caché las generaciones de las tablas que leen, así
+# una escritura deja obsoletas solo las entradas que dependen de esa tabla y
+# el TTL puede ser largo sin servir datos viejos.
+_generaciones = {}
+_lock = threading.Lock()
+
+def generaciones(*tablas):
+    """Tupla con la generación actual de cada tabla (en el orden recibido)"""
+    with _lock:
+        return tuple(_generaciones.get(tabla, 0) for tabla in tablas)
+
+def invalidar_tablas(*tablas):
+    """Registrar una escritura en las tablas indicadas (write-through)"""
+    with _lock:
+        for tabla in tablas:
+            _generaciones[tabla] = _generaciones.get(tabla, 0) + 1
+
+def cache_por_tablas(*tablas, ttl=None):
+    """
+    Decorador equivalente a `st.cache_data` cuya clave incluye la generación
+    de las tablas leídas por la función
+
+    Args:
+        tablas: Tablas de las que depende el resultado
+        ttl: Segundos de vida de cada entrada (por defecto CACHE_TTL_SEG)
+    """
+    def decorador(funcion):
+        def cacheada(generaciones_tablas, *args, **kwargs):
+            return funcion(*args, **kwargs)
+
+        # Nombre propio para que Streamlit no comparta la caché entre funciones
+        cacheada.__module__ = funcion.__module__
+        cacheada.__qualname__ = funcion.__qualname__
+        cacheada.__name__ = funcion.__name__
+        cacheada.__doc__ = funcion.__doc__
+        cacheada = st.cache_data(ttl=ttl or settings.CACHE_TTL_SEG)(cacheada)
+
+        def envoltura(*args, **kwargs):
+            return cacheada(generaciones(*tablas), *args, **kwargs)
+
+        envoltura.__name__ = funcion.__name__
+        envoltura.__doc__ = funcion.__doc__
+        envoltura.tablas = tablas
+        envoltura.clear = cacheada.clear
+        return envoltura
+
+    return decorador
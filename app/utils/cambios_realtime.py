@@ -0,0 +1,136 @@
+"""
+Suscripción a cambios de Postgres (Supabase Realtime) para mantener las cachés al día.
+
+Un hilo por proceso escucha INSERT/UPDATE/DELETE de las tablas SST
+(REALTIME_TABLAS) y, por cada cambio, incrementa la generación de la tabla
+(`invalidar_tablas`). Con eso:
+
+- los cargadores con `cache_por_tablas` (dashboard, reportes, KPIs) dejan de
+  servir la entrada vieja sin esperar al TTL;
+- las instantáneas locales (app/utils/snapshots.py) bajan solo las filas
+  cambiadas en la siguiente lectura y, mientras la suscripción está activa,
+  no sondean PostgREST cada SNAPSHOT_SYNC_SEG; un DELETE marca la tabla para
+  reconciliar ids;
+- las páginas que llaman a `vigilar_cambios()` se vuelven a ejecutar en
+  pocos segundos cuando cambia una de sus tablas.
+
+Si la conexión se cae, el hilo reconecta con backoff. Cada vez que queda
+suscrito, incluida la primera, invalida todas las tablas: los cambios previos a
+la suscripción no llegan como eventos. Requiere las
+tablas en la publicación `supabase_realtime` (migración 20261016000006).
+"""
+import asyncio
+import logging
+import threading
+import time
+import streamlit as st
+from websockets.protocol import State
+from realtime import AsyncRealtimeClient, RealtimePostgresChangesListenEvent, RealtimeSubscribeStates
+from app.config import settings
+from app.utils.cache_tablas import generaciones, invalidar_tablas
+from app.utils import snapshots
+
+logger = logging.getLogger(__name__)
+
+_hilo = None
+_lock = threading.Lock()
+_conectado = threading.Event()
+
+def suscripcion_activa():
+    """True si el hilo está suscrito y recibiendo cambios"""
+    return _conectado.is_set()
+
+def _al_cambiar(payload):
+    datos = payload['data']
+    tabla = datos['table']
+
+    if datos['type'] == 'DELETE':
+        snapshots.marcar_borrados(tabla)
+    invalidar_tablas(tabla)
+
+def _conexion_abierta(cliente):
+    # El cliente no avisa cuando el servidor cierra limpio (código 1000): se
+    # mira el estado del websocket directamente
+    conexion = cliente._ws_connection
+    return conexion is not None and conexion.state is State.OPEN
+
+async def _escuchar():
+    """Suscribirse y esperar hasta que se pierda la conexión o el canal falle"""
+    cliente = AsyncRealtimeClient(
+        f"{settings.SUPABASE_URL.rstrip('/')}/realtime/v1",
+        settings.SUPABASE_SERVICE_KEY,
+        auto_reconnect=False
+    )
+    fallo = asyncio.Event()
+
+    def al_suscribir(estado, error):
+        if estado == RealtimeSubscribeStates.SUBSCRIBED:
+            logger.info("Suscripción realtime activa: %s", ", ".join(settings.REALTIME_TABLAS))
+            # Lo cambiado antes de suscribirse (desde el último sondeo, o
+            # mientras la conexión estuvo caída) no llegó como evento
+            invalidar_tablas(*settings.REALTIME_TABLAS)
+            _conectado.set()
+            snapshots.marcar_suscripcion(True)
+        else:
+            logger.warning("Suscripción realtime %s: %s", estado.value, error)
+            fallo.set()
+
+    try:
+        canal = cliente.channel('sst-cambios')
+        for tabla in settings.REALTIME_TABLAS:
+            canal.on_postgres_changes(
+                RealtimePostgresChangesListenEvent.All, _al_cambiar, table=tabla, schema='public'
+            )
+        await canal.subscribe(al_suscribir)
+
+        while not fallo.is_set() and _conexion_abierta(cliente):
+            await asyncio.sleep(settings.REALTIME_VERIFICAR_SEG)
+    finally:
+        _conectado.clear()
+        snapshots.marcar_suscripcion(False)
+        await cliente.close()
+
+def _bucle():
+    espera = 1
+    while True:
+        inicio = time.time()
+        try:
+            asyncio.run(_escuchar())
+        except Exception as e:
+            logger.warning("Suscripción realtime interrumpida: %s", e)
+
+        # Una conexión que duró un rato reinicia el backoff
+        if time.time() - inicio > settings.REALTIME_BACKOFF_MAX_SEG:
+            espera = 1
+        time.sleep(espera)
+        espera = min(espera * 2, settings.REALTIME_BACKOFF_MAX_SEG)
+
+def iniciar_suscripcion():
+    """Arrancar (una vez por proceso) el hilo de la suscripción"""
+    global _hilo
+
+    if not settings.REALTIME_ACTIVO or not settings.SUPABASE_URL:
+        return
+
+    with _lock:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_bucle, name="realtime_sst", daemon=True)
+            _hilo.start()
+
+@st.fragment(run_every=settings.REALTIME_REFRESCO_SEG)
+def _vigilar(tablas, clave):
+    if suscripcion_activa() and generaciones(*tablas) != st.session_state.get(clave):
+        st.rerun()
+
+def vigilar_cambios(*tablas):
+    """
+    Volver a ejecutar la página cuando cambie alguna de `tablas` (solo con la
+    suscripción activa; compara generaciones en memoria, no consulta Supabase)
+    """
+    if not settings.REALTIME_ACTIVO:
+        return
+
+    iniciar_suscripcion()
+    clave = "realtime_" + "_".join(tablas)
+    st.session_state[clave] = generaciones(*tablas)
+    _vigilar(tablas, clave)
@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Pool acotado y compartido por todas las sesiones: limita la concurrencia
+# total contra Supabase aunque varios usuarios abran el dashboard a la vez
+_executor = ThreadPoolExecutor(
+    max_workers=settings.CARGA_PARALELA_MAX_HILOS,
+    thread_name_prefix="carga_sst"
+)
+
+_tiempos = {}
+_lock = threading.Lock()
+
+def _ejecutar(consulta):
+    """Ejecutar una consulta PostgREST (o callable) y convertir a DataFrame"""
+    inicio = time.perf_counter()
+
+    if callable(consulta):
+        filas = consulta()
+    else:
+        filas = consulta.execute().data
+
+    if isinstance(filas, pd.DataFrame):
+        df = filas
+    else:
+        df = pd.DataFrame(filas) if filas else pd.DataFrame()
+    return df, time.perf_counter() - inicio
+
+def cargar_en_paralelo(consultas, nombre_carga):
+    """
+    Ejecutar consultas independientes en paralelo
+
+    Args:
+        consultas: dict {clave: consulta} donde consulta es un query builder
+                   de PostgREST (se llama a .execute()) o un callable que
+                   devuelve la lista de filas o un DataFrame
+        nombre_carga: Identificador para el registro de tiempos (ej: 'dashboard')
+
+    Returns:
+        dict {clave: DataFrame} con las mismas claves de `consultas`.
+        Si alguna consulta falla se relanza la primera excepción.
+    """
+    inicio = time.perf_counter()
+
+    futuros = {clave: _executor.submit(_ejecutar, consulta) for clave, consulta in consultas.items()}
+
+    resultado = {}
+    tiempos = {}
+    for clave, futuro in futuros.items():
+        resultado[clave], tiempos[clave] = futuro.result()
+
+    tiempos['total'] = time.perf_counter() - inicio
+
+    with _lock:
+        _tiempos[nombre_carga] = tiempos
+
+    logger.info(
+        "Carga '%s' en %.3fs: %s",
+        nombre_carga,
+        tiempos['total'],
+        ", ".join(f"{k}={v:.3f}s" for k, v in tiempos.items() if k != 'total')
+    )
+
+    return resultado
+
+def obtener_tiempos_carga(nombre_carga):
+    """Tiempos (segundos) por tabla de la última carga con ese nombre"""
+    with _lock:
+        return dict(_tiempos.get(nombre_carga, {}))
+
+def mostrar_tiempos_carga(nombre_carga, contenedor):
+    """Mostrar tabla de tiempos de la última carga en un contenedor de Streamlit"""
+    tiempos = obtener_tiempos_carga(nombre_carga)
+
+    if not tiempos:
+        contenedor.caption("Sin mediciones todavía")
+        return
+
+    contenedor.dataframe(
+        pd.DataFrame(
+            [{'Tabla': k, 'Segundos': round(v, 3)} for k, v in tiempos.items()]
+        ),
+        hide_index=True,
+        use_container_width=True
+    )
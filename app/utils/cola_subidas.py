@@ -0,0 +1,349 @@
+"""
+Cola de subidas a Storage en segundo plano.
+
+Los formularios no esperan a que los archivos lleguen a Supabase:
+`preparar_subida()` copia el archivo a un spool local y devuelve un marcador
+('pendiente:<token>') que se guarda en el registro en lugar de la URL. Con el
+registro ya insertado, `encolar_subidas()` deja la subida en una tabla SQLite
+y los hilos de la cola suben el archivo (con reintentos y backoff) y reemplazan
+el marcador por la URL en la columna indicada. La cola y el spool sobreviven a
+reinicios del proceso (la app llama a `iniciar_workers()` al arrancar); si la
+subida falla SUBIDA_COLA_MAX_INTENTOS veces, el marcador se quita del registro
+y la subida queda como 'fallido'. Los hilos de la cola también borran, cada
+ALMACENAMIENTO_LIMPIEZA_SEG, los objetos deduplicados que quedaron sin
+referencias.
+"""
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import streamlit as st
+from app.config import settings
+from app.utils.supabase_client import get_supabase_client
+from app.utils.cache_tablas import invalidar_tablas
+from app.utils import storage_helper
+
+logger = logging.getLogger(__name__)
+
+PREFIJO_PENDIENTE = "pendiente:"
+
+_workers = []
+_lock = threading.Lock()
+_lock_registros = threading.Lock()
+_hay_subidas = threading.Event()
+_esquema_creado = False
+_ultima_limpieza = 0
+
+def _crear_esquema(conexion):
+    conexion.execute("pragma journal_mode=wal")
+    conexion.execute("""
+        create table if not exists subidas (
+            id integer primary key autoincrement,
+            token text not null unique,
+            bucket text not null,
+            carpeta text not null,
+            nombre text not null,
+            content_type text not null,
+            tamano integer not null,
+            tabla text not null,
+            registro_id text not null,
+            columna text not null,
+            columna_miniatura text,
+            creado real not null,
+            estado text not null default 'pendiente',
+            intentos integer not null default 0,
+            proximo_intento real not null,
+            ultimo_error text,
+            url text
+        )
+    """)
+    conexion.execute(
+        "create index if not exists idx_subidas_pendientes on subidas (estado, proximo_intento)"
+    )
+
+@contextmanager
+def _conexion():
+    """Conexión SQLite por operación (la usan los hilos de la cola); confirma al salir"""
+    global _esquema_creado
+
+    carpeta = os.path.dirname(settings.SUBIDA_COLA_DB)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+
+    conexion = sqlite3.connect(settings.SUBIDA_COLA_DB, timeout=30)
+    try:
+        if not _esquema_creado:
+            _crear_esquema(conexion)
+            _esquema_creado = True
+        with conexion:
+            yield conexion
+    finally:
+        conexion.close()
+
+def _ruta_spool(token):
+    return os.path.join(settings.SUBIDA_SPOOL_DIR, token)
+
+def es_pendiente(valor):
+    """True si el valor de una columna es un marcador de subida pendiente"""
+    return isinstance(valor, str) and valor.startswith(PREFIJO_PENDIENTE)
+
+def preparar_subida(archivo, bucket):
+    """
+    Copiar un archivo de Streamlit al spool local
+
+    Args:
+        archivo: Archivo de st.file_uploader / st.camera_input (None se ignora)
+        bucket: Bucket de destino
+
+    Returns:
+        dict con 'marcador' (valor a guardar en el registro), o None si no hay archivo
+    """
+    if not archivo:
+        return None
+
+    token = uuid.uuid4().hex
+    os.makedirs(settings.SUBIDA_SPOOL_DIR, exist_ok=True)
+
+    with open(_ruta_spool(token), "wb") as f:
+        f.write(archivo.getbuffer() if hasattr(archivo, 'getbuffer') else archivo.getvalue())
+
+    return {
+        'token': token,
+        'marcador': PREFIJO_PENDIENTE + token,
+        'bucket': bucket,
+        'nombre': getattr(archivo, 'name', 'archivo.jpg'),
+        'content_type': getattr(archivo, 'type', None) or 'image/jpeg',
+        'tamano': os.path.getsize(_ruta_spool(token))
+    }
+
+def descartar_subidas(subidas):
+    """Borrar del spool subidas preparadas cuyo registro no se llegó a guardar"""
+    for subida in subidas:
+        if subida and os.path.exists(_ruta_spool(subida['token'])):
+            os.remove(_ruta_spool(subida['token']))
+
+def encolar_subidas(subidas, carpeta, tabla, registro_id, columna, columna_miniatura=None):
+    """
+    Encolar subidas preparadas para un registro ya guardado
+
+    Args:
+        subidas: Resultados de `preparar_subida` (se ignoran los None)
+        carpeta: Carpeta dentro del bucket (ej: 'incidentes/123/')
+        tabla: Tabla del registro
+        registro_id: id del registro
+        columna: Columna con el marcador; puede ser texto o una lista (jsonb/array)
+        columna_miniatura: Columna opcional para la URL de la miniatura
+    """
+    subidas = [s for s in subidas if s]
+    if not subidas:
+        return
+
+    ahora = time.time()
+    with _conexion() as conexion:
+        conexion.executemany(
+            "insert into subidas (token, bucket, carpeta, nombre, content_type, tamano, tabla, "
+            "registro_id, columna, columna_miniatura, creado, proximo_intento) "
+            "values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (s['token'], s['bucket'], carpeta, s['nombre'], s['content_type'], s['tamano'],
+                 tabla, str(registro_id), columna, columna_miniatura, ahora, ahora)
+                for s in subidas
+            ]
+        )
+
+    iniciar_workers()
+    _hay_subidas.set()
+
+class _ArchivoSpool:
+    """Archivo del spool con la interfaz que usa storage_helper (mapeado, sin leerlo entero)"""
+
+    def __init__(self, ruta, token, nombre, content_type):
+        self.file_id = token
+        self.name = nombre
+        self.type = content_type
+        self.size = os.path.getsize(ruta)
+        self._archivo = open(ruta, "rb")
+        self._mapa = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+    def getvalue(self):
+        return self._mapa if self._mapa is not None else b""
+
+    def read(self):
+        return self._mapa[:] if self._mapa is not None else b""
+
+    def cerrar(self):
+        if self._mapa is not None:
+            try:
+                self._mapa.close()
+            except BufferError:
+                # Queda una vista abierta (subida interrumpida); se libera con ella
+                pass
+        self._archivo.close()
+
+def _reemplazar_marcador(tabla, registro_id, columna, marcador, valor):
+    """
+    Sustituir el marcador por `valor` (o quitarlo si es None) en la columna del registro
+
+    Returns:
+        False si el registro ya no existe o ya no tiene el marcador
+    """
+    supabase = get_supabase_client()
+
+    # Varias subidas pueden apuntar a la misma lista: leer y escribir bajo lock
+    with _lock_registros:
+        filas = supabase.table(tabla).select(columna).eq('id', registro_id).execute().data
+        if not filas:
+            return False
+
+        actual = filas[0][columna]
+        if isinstance(actual, list) and marcador in actual:
+            nuevo = [valor if v == marcador else v for v in actual if v != marcador or valor is not None]
+        elif actual == marcador:
+            nuevo = valor
+        else:
+            return False
+
+        supabase.table(tabla).update({columna: nuevo}).eq('id', registro_id).execute()
+        invalidar_tablas(tabla)
+        return True
+
+def _procesar(subida):
+    """Subir un archivo del spool y actualizar su registro; lanza la excepción si falla"""
+    (id_, token, bucket, carpeta, nombre, content_type, tabla, registro_id,
+     columna, columna_miniatura) = subida
+    marcador = PREFIJO_PENDIENTE + token
+
+    archivo = _ArchivoSpool(_ruta_spool(token), token, nombre, content_type)
+    try:
+        url, url_miniatura = storage_helper._subir_con_miniatura(archivo, bucket, carpeta)
+    finally:
+        archivo.cerrar()
+
+    # Si el registro no queda apuntando a la URL, se libera la referencia que
+    # tomó la subida (el reintento vuelve a subir y toma otra)
+    try:
+        guardada = _reemplazar_marcador(tabla, registro_id, columna, marcador, url)
+    except Exception:
+        storage_helper.descartar_subida(url, bucket)
+        raise
+    if not guardada:
+        storage_helper.descartar_subida(url, bucket)
+        return url
+
+    if columna_miniatura and url_miniatura:
+        supabase = get_supabase_client()
+        supabase.table(tabla).update({columna_miniatura: url_miniatura}).eq('id', registro_id).execute()
+        invalidar_tablas(tabla)
+
+    return url
+
+def _tomar_siguiente():
+    """Reservar la próxima subida lista para este hilo (estado 'subiendo')"""
+    with _conexion() as conexion:
+        return conexion.execute(
+            "update subidas set estado = 'subiendo' where id = ("
+            "  select id from subidas where estado = 'pendiente' and proximo_intento <= ? "
+            "  order by id limit 1"
+            ") returning id, token, bucket, carpeta, nombre, content_type, tabla, registro_id, "
+            "columna, columna_miniatura",
+            (time.time(),)
+        ).fetchone()
+
+def _procesar_siguiente():
+    """Procesar una subida; devuelve False si no había ninguna lista"""
+    subida = _tomar_siguiente()
+    if not subida:
+        return False
+
+    id_, token = subida[0], subida[1]
+    try:
+        url = _procesar(subida)
+    except Exception as e:
+        with _conexion() as conexion:
+            intentos = conexion.execute("select intentos from subidas where id = ?", (id_,)).fetchone()[0] + 1
+            fallido = intentos >= settings.SUBIDA_COLA_MAX_INTENTOS
+            espera = min(2 ** intentos, settings.SUBIDA_COLA_BACKOFF_MAX_SEG)
+            conexion.execute(
+                "update subidas set estado = ?, intentos = ?, proximo_intento = ?, ultimo_error = ? where id = ?",
+                ('fallido' if fallido else 'pendiente', intentos, time.time() + espera, str(e)[:500], id_)
+            )
+        logger.warning("Subida %s (%s) falló, intento %s: %s", id_, subida[4], intentos, e)
+
+        if fallido:
+            try:
+                _reemplazar_marcador(subida[6], subida[7], subida[8], PREFIJO_PENDIENTE + token, None)
+            except Exception:
+                logger.exception("No se pudo quitar el marcador de la subida %s", id_)
+            descartar_subidas([{'token': token}])
+    else:
+        with _conexion() as conexion:
+            conexion.execute("update subidas set estado = 'subido', url = ? where id = ?", (url, id_))
+        descartar_subidas([{'token': token}])
+
+    return True
+
+def _limpiar_huerfanos():
+    """Borrar de Storage, cada ALMACENAMIENTO_LIMPIEZA_SEG, los objetos deduplicados sin referencias"""
+    global _ultima_limpieza
+
+    with _lock:
+        ahora = time.time()
+        if ahora - _ultima_limpieza < settings.ALMACENAMIENTO_LIMPIEZA_SEG:
+            return
+        _ultima_limpieza = ahora
+
+    eliminados = storage_helper.limpiar_objetos_huerfanos()
+    if eliminados:
+        logger.info("Storage: %s objeto(s) sin referencias eliminados", eliminados)
+
+def _bucle_worker():
+    while True:
+        try:
+            _limpiar_huerfanos()
+            procesada = _procesar_siguiente()
+        except Exception:
+            logger.exception("Error en la cola de subidas")
+            procesada = False
+
+        if not procesada:
+            _hay_subidas.wait(timeout=settings.SUBIDA_COLA_INTERVALO_SEG)
+            _hay_subidas.clear()
+
+def iniciar_workers():
+    """Arrancar (una vez por proceso) los hilos de la cola"""
+    with _lock:
+        vivos = [w for w in _workers if w.is_alive()]
+        if not vivos:
+            # Subidas que quedaron a medias por un reinicio vuelven a la cola
+            with _conexion() as conexion:
+                conexion.execute("update subidas set estado = 'pendiente' where estado = 'subiendo'")
+
+        for i in range(len(vivos), settings.SUBIDA_COLA_HILOS):
+            worker = threading.Thread(target=_bucle_worker, name=f"cola_subidas_{i}", daemon=True)
+            worker.start()
+            vivos.append(worker)
+
+        _workers[:] = vivos
+
+def estado_subidas(desde=0):
+    """Cantidad de subidas por estado ('pendiente', 'subiendo', 'subido', 'fallido') creadas desde `desde`"""
+    with _conexion() as conexion:
+        return dict(conexion.execute(
+            "select estado, count(*) from subidas where creado >= ? group by estado", (desde,)
+        ).fetchall())
+
+@st.fragment(run_every=settings.SUBIDA_COLA_INTERVALO_SEG)
+def mostrar_estado_subidas():
+    """Indicador de subidas en curso y fallidas del último día (se refresca solo)"""
+    en_curso = estado_subidas()
+    en_curso = en_curso.get('pendiente', 0) + en_curso.get('subiendo', 0)
+    fallidas = estado_subidas(desde=time.time() - 86400).get('fallido', 0)
+
+    if en_curso:
+        st.info(f"📤 {en_curso} archivo(s) subiéndose en segundo plano")
+    if fallidas:
+        st.warning(f"⚠️ {fallidas} archivo(s) no se pudieron subir en las últimas 24 h")
@@ -0,0 +1,69 @@
+import threading
+import time
+from app.config import settings
+from app.config.proyecciones import columnas
+from app.utils.supabase_client import get_supabase_client
+from app.utils.cache_tablas import generaciones
+
+# Datos de referencia (áreas, usuarios, catálogo EPP) compartidos por todo el
+# proceso. Cada tabla se carga una vez y se reutiliza hasta que vence el TTL
+# o se escribe en ella (invalidar_tablas sube su generación en cache_tablas).
+_cache = {}
+_lock = threading.Lock()
+
+def _cargar(tabla):
+    """Entrada en caché de la tabla: {'filas', 'por_id', 'generacion', 'cargado'}"""
+    generacion = generaciones(tabla)[0]
+
+    with _lock:
+        entrada = _cache.get(tabla)
+        if (entrada and entrada['generacion'] == generacion
+                and time.monotonic() - entrada['cargado'] < settings.REFERENCIA_TTL_SEG):
+            return entrada
+
+    supabase = get_supabase_client()
+    filas = supabase.table(tabla).select(columnas(f'referencia.{tabla}')).execute().data or []
+
+    entrada = {
+        'filas': filas,
+        'por_id': {fila['id']: fila for fila in filas if 'id' in fila},
+        'generacion': generacion,
+        'cargado': time.monotonic()
+    }
+
+    with _lock:
+        _cache[tabla] = entrada
+
+    return entrada
+
+def obtener_areas():
+    """Lista ordenada de nombres de área"""
+    return sorted({fila['area'] for fila in _cargar('areas')['filas'] if fila['area']})
+
+def obtener_usuarios():
+    """Todos los usuarios (sin password_hash)"""
+    return _cargar('usuarios')['filas']
+
+def obtener_trabajadores():
+    """Usuarios activos que no son administradores"""
+    return [u for u in obtener_usuarios() if u['activo'] and u['rol'] != 'admin']
+
+def usuarios_por_id():
+    """Diccionario id -> usuario"""
+    return _cargar('usuarios')['por_id']
+
+def obtener_supervisor(area):
+    """Primer supervisor del área o None"""
+    return next(
+        (u for u in obtener_usuarios() if u['rol'] == 'supervisor' and u['area'] == area),
+        None
+    )
+
+def obtener_epp_catalogo(solo_activos=True):
+    """Ítems del catálogo EPP"""
+    filas = _cargar('epp_catalogo')['filas']
+    return [e for e in filas if e['activo']] if solo_activos else filas
+
+def epp_por_id():
+    """Diccionario id -> ítem del catálogo EPP (incluye inactivos)"""
+    return _cargar('epp_catalogo')['por_id']
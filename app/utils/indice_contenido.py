@@ -0,0 +1,148 @@
+"""
+Índice local de contenido para Storage (deduplicación por SHA-256).
+
+Cada objeto subido se identifica por el hash de su contenido original y vive
+en una ruta derivada del hash (`objetos/ab/abcd....jpg`), de modo que la misma
+foto adjunta a un hallazgo, a su cierre y a un incidente se guarda una sola
+vez. El índice (SQLite, junto al outbox de n8n) recuerda qué hash ya está en
+cada bucket y cuántas referencias tiene: `eliminar_archivo_storage` solo libera
+una referencia, y los objetos sin referencias se borran con `objetos_huerfanos`
+tras un período de gracia.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from app.config import settings
+
+_esquema_creado = False
+
+def _crear_esquema(conexion):
+    conexion.execute("pragma journal_mode=wal")
+    conexion.execute("""
+        create table if not exists objetos (
+            bucket text not null,
+            sha256 text not null,
+            ruta text not null,
+            url text not null,
+            url_miniatura text,
+            tamano integer not null,
+            referencias integer not null default 0,
+            creado real not null,
+            liberado real,
+            primary key (bucket, sha256)
+        )
+    """)
+    conexion.execute("create unique index if not exists idx_objetos_url on objetos (url)")
+    conexion.execute("create index if not exists idx_objetos_huerfanos on objetos (referencias, liberado)")
+
+@contextmanager
+def _conexion():
+    """Conexión SQLite por operación (la usan los hilos de subida); confirma al salir"""
+    global _esquema_creado
+
+    carpeta = os.path.dirname(settings.ALMACENAMIENTO_INDICE_DB)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+
+    conexion = sqlite3.connect(settings.ALMACENAMIENTO_INDICE_DB, timeout=30)
+    try:
+        if not _esquema_creado:
+            _crear_esquema(conexion)
+            _esquema_creado = True
+        with conexion:
+            yield conexion
+    finally:
+        conexion.close()
+
+def calcular_sha256(archivo, paso=1024 * 1024):
+    """Hash del contenido de un archivo de Streamlit (o bytes) sin copiarlo entero"""
+    sha = hashlib.sha256()
+    datos = archivo if isinstance(archivo, (bytes, bytearray)) else archivo.getvalue()
+    vista = memoryview(datos)
+    for inicio in range(0, len(vista), paso):
+        sha.update(vista[inicio:inicio + paso])
+    return sha.hexdigest()
+
+def ruta_contenido(sha256, extension):
+    """Ruta del objeto dentro del bucket para un hash"""
+    return f"objetos/{sha256[:2]}/{sha256}.{extension}"
+
+def buscar_objeto(bucket, sha256):
+    """
+    Registrar una nueva referencia a un objeto ya subido
+
+    Returns:
+        (url, url_miniatura) si el contenido ya está en el bucket, o None
+    """
+    with _conexion() as conexion:
+        fila = conexion.execute(
+            "update objetos set referencias = referencias + 1, liberado = null "
+            "where bucket = ? and sha256 = ? returning url, url_miniatura",
+            (bucket, sha256)
+        ).fetchone()
+    return tuple(fila) if fila else None
+
+def registrar_objeto(bucket, sha256, ruta, url, url_miniatura, tamano):
+    """Registrar un objeto recién subido con una referencia"""
+    with _conexion() as conexion:
+        conexion.execute(
+            "insert into objetos (bucket, sha256, ruta, url, url_miniatura, tamano, referencias, creado) "
+            "values (?, ?, ?, ?, ?, ?, 1, ?) "
+            "on conflict (bucket, sha256) do update set "
+            "referencias = referencias + 1, liberado = null, "
+            "url_miniatura = coalesce(objetos.url_miniatura, excluded.url_miniatura)",
+            (bucket, sha256, ruta, url, url_miniatura, tamano, time.time())
+        )
+
+def liberar_referencia(url):
+    """
+    Quitar una referencia al objeto de esa URL
+
+    Returns:
+        Referencias restantes, o None si la URL no está en el índice (archivo
+        subido antes de la deduplicación)
+    """
+    with _conexion() as conexion:
+        fila = conexion.execute(
+            "update objetos set referencias = max(referencias - 1, 0), "
+            "liberado = case when referencias <= 1 then ? else liberado end "
+            "where url = ? returning referencias",
+            (time.time(), url)
+        ).fetchone()
+    return fila[0] if fila else None
+
+def objetos_huerfanos(gracia_seg=None):
+    """[(bucket, ruta), ...] sin referencias desde hace más de `gracia_seg`"""
+    if gracia_seg is None:
+        gracia_seg = settings.ALMACENAMIENTO_GRACIA_SEG
+
+    with _conexion() as conexion:
+        return conexion.execute(
+            "select bucket, ruta from objetos where referencias = 0 and liberado <= ?",
+            (time.time() - gracia_seg,)
+        ).fetchall()
+
+def olvidar_objetos(bucket, rutas):
+    """Quitar del índice objetos ya eliminados del bucket (si siguen sin referencias)"""
+    if not rutas:
+        return
+
+    marcas = ",".join("?" * len(rutas))
+    with _conexion() as conexion:
+        conexion.execute(
+            f"delete from objetos where bucket = ? and referencias = 0 and ruta in ({marcas})",
+            (bucket, *rutas)
+        )
+
+def estado_indice():
+    """Objetos, referencias y bytes únicos guardados por bucket"""
+    with _conexion() as conexion:
+        return {
+            bucket: {'objetos': objetos, 'referencias': referencias, 'bytes': tamano, 'huerfanos': huerfanos}
+            for bucket, objetos, referencias, tamano, huerfanos in conexion.execute(
+                "select bucket, count(*), sum(referencias), sum(tamano), sum(referencias = 0) "
+                "from objetos group by bucket"
+            )
+        }
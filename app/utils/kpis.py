@@ -0,0 +1,43 @@
+from app.utils.supabase_client import get_supabase_client
+from app.utils.cache_tablas import cache_por_tablas
+
+@cache_por_tablas('riesgos', 'incidentes', 'hallazgos', 'epp_asignaciones', 'capacitaciones')
+def obtener_kpis(fecha_inicio, fecha_fin, areas=None, tipos_incidente=None,
+                 nivel_riesgo_min=1, dias_epp=30, horas_hombre=50000):
+    """
+    Obtener los KPIs SST agregados en el servidor (RPC `kpis_sst`)
+
+    Args:
+        fecha_inicio, fecha_fin: Rango de fechas para incidentes
+        areas: Lista de áreas (vacía o None = todas)
+        tipos_incidente: Lista de tipos de incidente (vacía o None = todos)
+        nivel_riesgo_min: Nivel mínimo de riesgo considerado
+        dias_epp: Ventana en días para "EPP por vencer"
+        horas_hombre: Horas hombre trabajadas para TF/TS
+
+    Returns:
+        dict con riesgos_pendientes, riesgos_criticos, hallazgos_abiertos,
+        epp_por_vencer, epp_vencidos, capacitaciones_total,
+        capacitaciones_realizadas, cumplimiento_capacitacion,
+        incidentes_total, accidentes, dias_perdidos, tasa_frecuencia y
+        tasa_severidad
+    """
+    supabase = get_supabase_client()
+
+    return supabase.rpc('kpis_sst', {
+        'p_fecha_inicio': fecha_inicio.isoformat(),
+        'p_fecha_fin': fecha_fin.isoformat(),
+        'p_areas': list(areas) if areas else None,
+        'p_tipos_incidente': list(tipos_incidente) if tipos_incidente else None,
+        'p_nivel_riesgo_min': nivel_riesgo_min,
+        'p_dias_epp': dias_epp,
+        'p_horas_hombre': horas_hombre
+    }).execute().data
+
+def calcular_tasa_frecuencia(incidentes, horas_hombre):
+    """Tasa de Frecuencia = (N° Accidentes × 1,000,000) / Horas Hombre Trabajadas"""
+    return (incidentes * 1_000_000) / horas_hombre if horas_hombre > 0 else 0
+
+def calcular_tasa_severidad(dias_perdidos, horas_hombre):
+    """Tasa de Severidad = (Días Perdidos × 1,000,000) / Horas Hombre Trabajadas"""
+    return (dias_perdidos * 1_000_000) / horas_hombre if horas_hombre > 0 else 0
@@ -0,0 +1,290 @@
+"""
+Cliente n8n con outbox durable.
+
+Los módulos no llaman a n8n directamente: `encolar_evento()` guarda el evento
+en una tabla SQLite local y vuelve de inmediato. Un hilo en segundo plano lo
+entrega con reintentos (tenacity) y, si n8n sigue caído, lo reprograma con
+backoff exponencial. Los eventos sobreviven a reinicios del proceso; solo se
+marcan como 'fallido' tras N8N_MAX_INTENTOS y quedan en la tabla para revisión.
+Los ya entregados se borran pasados N8N_RETENCION_ENVIADOS_SEG. El worker se
+arranca al iniciar la app para entregar lo que quedó pendiente de otro proceso.
+
+Cada evento se envía en su propio POST con el payload tal cual, salvo en las
+rutas de N8N_RUTAS_LOTE (por defecto las de operaciones masivas:
+inspeccion-programada, asistencia-registrada, epp-renovado), que se agrupan:
+el worker espera hasta N8N_LOTE_LATENCIA_SEG (o N8N_LOTE_MAX eventos) y los
+envía en un solo POST; los encolados dentro de `with lote_eventos():` se envían
+juntos sin esperar. Esas rutas reciben siempre el sobre, aunque el lote tenga
+un solo evento:
+
+    {"lote": true, "total": n, "eventos": [payload, ...]}
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import requests
+from tenacity import Retrying, stop_after_attempt, wait_exponential, retry_if_exception_type
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_worker = None
+_ultima_limpieza = 0
+_lock = threading.Lock()
+_hay_eventos = threading.Event()
+_esquema_creado = False
+_lock_esquema = threading.Lock()
+_local = threading.local()
+
+def _crear_esquema(conexion):
+    conexion.execute("pragma journal_mode=wal")
+    conexion.execute("""
+        create table if not exists eventos (
+            id integer primary key autoincrement,
+            ruta text not null,
+            payload text not null,
+            creado real not null,
+            estado text not null default 'pendiente',
+            intentos integer not null default 0,
+            proximo_intento real not null,
+            ultimo_error text,
+            grupo text,
+            enviado real
+        )
+    """)
+    columnas = {fila[1] for fila in conexion.execute("pragma table_info(eventos)")}
+    if 'grupo' not in columnas:
+        conexion.execute("alter table eventos add column grupo text")
+    if 'enviado' not in columnas:
+        conexion.execute("alter table eventos add column enviado real")
+    conexion.execute(
+        "create index if not exists idx_eventos_pendientes on eventos (estado, proximo_intento)"
+    )
+
+@contextmanager
+def _conexion():
+    """Conexión SQLite por operación (el outbox lo usan varios hilos); confirma al salir"""
+    global _esquema_creado
+
+    carpeta = os.path.dirname(settings.N8N_OUTBOX_DB)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+
+    conexion = sqlite3.connect(settings.N8N_OUTBOX_DB, timeout=30)
+    try:
+        if not _esquema_creado:
+            with _lock_esquema:
+                if not _esquema_creado:
+                    _crear_esquema(conexion)
+                    _esquema_creado = True
+        with conexion:
+            yield conexion
+    finally:
+        conexion.close()
+
+def url_webhook(ruta):
+    """URL completa del webhook n8n para una ruta (p.ej. 'incidente-reportado')"""
+    base = settings.N8N_WEBHOOK_URL
+    if not base:
+        import streamlit as st
+        base = st.secrets["N8N_WEBHOOK_URL"]
+    return base.rstrip('/') + '/' + ruta.lstrip('/')
+
+def _guardar_eventos(eventos, grupo=None):
+    """Insertar [(ruta, payload), ...] en el outbox en una sola transacción; devuelve sus ids"""
+    ahora = time.time()
+
+    with _conexion() as conexion:
+        ids = [
+            conexion.execute(
+                "insert into eventos (ruta, payload, creado, proximo_intento, grupo) values (?, ?, ?, ?, ?)",
+                (ruta, json.dumps(payload, default=str), ahora, ahora, grupo)
+            ).lastrowid
+            for ruta, payload in eventos
+        ]
+
+    iniciar_worker()
+    _hay_eventos.set()
+
+    return ids
+
+def encolar_evento(ruta, payload):
+    """
+    Registrar un evento para n8n en el outbox local
+
+    Args:
+        ruta: Ruta del webhook relativa a N8N_WEBHOOK_URL
+        payload: dict serializable a JSON (fechas se convierten a texto)
+
+    Returns:
+        id del evento en el outbox (None si se está dentro de `lote_eventos`)
+    """
+    lote = getattr(_local, 'lote', None)
+    if lote is not None:
+        lote.append((ruta, payload))
+        return None
+
+    return _guardar_eventos([(ruta, payload)])[0]
+
+@contextmanager
+def lote_eventos():
+    """
+    Agrupar los eventos encolados dentro del bloque (operaciones masivas)
+
+    Se guardan en una sola transacción al salir; en las rutas de N8N_RUTAS_LOTE
+    el worker los envía sin esperar la ventana de agrupación, en lotes de hasta
+    N8N_LOTE_MAX.
+    """
+    if getattr(_local, 'lote', None) is not None:
+        # Bloque anidado: los eventos van al lote exterior
+        yield
+        return
+
+    _local.lote = []
+    try:
+        yield
+    finally:
+        eventos, _local.lote = _local.lote, None
+        if eventos:
+            _guardar_eventos(eventos, grupo=uuid.uuid4().hex)
+
+def _cuerpo(ruta, payloads):
+    """JSON a enviar: el sobre de lote en las rutas de N8N_RUTAS_LOTE, si no el payload solo"""
+    if ruta not in settings.N8N_RUTAS_LOTE:
+        (payload,) = payloads
+        return payload
+    return '{"lote": true, "total": %d, "eventos": [%s]}' % (len(payloads), ", ".join(payloads))
+
+def _enviar(ruta, cuerpo):
+    """POST al webhook con reintentos inmediatos; lanza la última excepción si fallan todos"""
+    for intento in Retrying(
+        stop=stop_after_attempt(settings.N8N_REINTENTOS),
+        wait=wait_exponential(multiplier=settings.N8N_BACKOFF_BASE_SEG, max=settings.N8N_BACKOFF_MAX_SEG),
+        retry=retry_if_exception_type(requests.RequestException),
+        reraise=True
+    ):
+        with intento:
+            respuesta = requests.post(
+                url_webhook(ruta),
+                data=cuerpo,
+                headers={"Content-Type": "application/json"},
+                timeout=settings.N8N_TIMEOUT_SEG
+            )
+            respuesta.raise_for_status()
+
+def _lotes_listos(eventos, ahora):
+    """
+    Agrupar eventos pendientes por ruta y devolver los lotes que ya deben
+    enviarse: lote lleno, ventana vencida, evento de `lote_eventos` o reintento.
+    Los eventos de rutas sin lote salen de inmediato, uno por lote.
+    """
+    lotes = []
+    por_ruta = {}
+    for evento in eventos:
+        if evento[1] in settings.N8N_RUTAS_LOTE:
+            por_ruta.setdefault(evento[1], []).append(evento)
+        else:
+            lotes.append((evento[1], [evento]))
+
+    for ruta, grupo in por_ruta.items():
+        listo = (
+            len(grupo) >= settings.N8N_LOTE_MAX
+            or ahora - min(e[3] for e in grupo) >= settings.N8N_LOTE_LATENCIA_SEG
+            or any(e[4] is not None or e[5] > 0 for e in grupo)
+        )
+        if listo:
+            for i in range(0, len(grupo), settings.N8N_LOTE_MAX):
+                lotes.append((ruta, grupo[i:i + settings.N8N_LOTE_MAX]))
+
+    return lotes
+
+def _procesar_pendientes():
+    """Entregar los lotes listos; devuelve cuántos eventos se procesaron"""
+    ahora = time.time()
+
+    with _conexion() as conexion:
+        eventos = conexion.execute(
+            "select id, ruta, payload, creado, grupo, intentos from eventos "
+            "where estado = 'pendiente' and proximo_intento <= ? order by id limit 1000",
+            (ahora,)
+        ).fetchall()
+
+    procesados = 0
+
+    for ruta, lote in _lotes_listos(eventos, ahora):
+        ids = [e[0] for e in lote]
+        marcas = ",".join("?" * len(ids))
+        intentos = max(e[5] for e in lote) + 1
+
+        try:
+            _enviar(ruta, _cuerpo(ruta, [e[2] for e in lote]))
+        except Exception as e:
+            estado = 'fallido' if intentos >= settings.N8N_MAX_INTENTOS else 'pendiente'
+            espera = min(settings.N8N_BACKOFF_BASE_SEG * 2 ** intentos, settings.N8N_REPROGRAMAR_MAX_SEG)
+            logger.warning("Webhook n8n '%s' (%s eventos) falló, intento %s: %s", ruta, len(ids), intentos, e)
+
+            with _conexion() as conexion:
+                conexion.execute(
+                    f"update eventos set estado = ?, intentos = ?, proximo_intento = ?, ultimo_error = ? "
+                    f"where id in ({marcas})",
+                    (estado, intentos, time.time() + espera, str(e)[:500], *ids)
+                )
+        else:
+            with _conexion() as conexion:
+                conexion.execute(
+                    f"update eventos set estado = 'enviado', intentos = ?, enviado = ? where id in ({marcas})",
+                    (intentos, time.time(), *ids)
+                )
+
+        procesados += len(ids)
+
+    return procesados
+
+def _limpiar_enviados():
+    """Borrar del outbox los eventos entregados hace más de N8N_RETENCION_ENVIADOS_SEG"""
+    global _ultima_limpieza
+
+    ahora = time.time()
+    if ahora - _ultima_limpieza < settings.N8N_RETENCION_ENVIADOS_SEG / 24:
+        return
+    _ultima_limpieza = ahora
+
+    with _conexion() as conexion:
+        borrados = conexion.execute(
+            "delete from eventos where estado = 'enviado' and coalesce(enviado, creado) < ?",
+            (ahora - settings.N8N_RETENCION_ENVIADOS_SEG,)
+        ).rowcount
+    if borrados:
+        logger.info("Outbox n8n: %s eventos enviados eliminados", borrados)
+
+def _bucle_worker():
+    while True:
+        try:
+            _limpiar_enviados()
+            procesados = _procesar_pendientes()
+        except Exception:
+            logger.exception("Error en el worker del outbox n8n")
+            procesados = 0
+
+        if not procesados:
+            _hay_eventos.wait(timeout=min(settings.N8N_INTERVALO_SEG, settings.N8N_LOTE_LATENCIA_SEG))
+            _hay_eventos.clear()
+
+def iniciar_worker():
+    """Arrancar (una vez por proceso) el hilo que vacía el outbox"""
+    global _worker
+
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_bucle_worker, name="n8n_outbox", daemon=True)
+            _worker.start()
+
+def estado_outbox():
+    """Cantidad de eventos por estado ('pendiente', 'enviado', 'fallido')"""
+    with _conexion() as conexion:
+        return dict(conexion.execute("select estado, count(*) from eventos group by estado").fetchall())
@@ -0,0 +1,99 @@
+import streamlit as st
+from app.config import settings
+
+def citar_valor(valor):
+    """
+    Valor entre comillas dobles para los filtros de `or_` de PostgREST
+
+    Sin comillas, una coma, un paréntesis o unas comillas dentro del valor
+    (texto ingresado por el usuario) cortan el filtro o agregan condiciones.
+    """
+    texto = str(valor).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{texto}"'
+
+def _estado_paginacion(clave, firma_filtros):
+    """Estado del cursor en session_state; se reinicia si cambian los filtros"""
+    nombre = f"paginacion_{clave}"
+    estado = st.session_state.get(nombre)
+
+    if estado is None or estado['firma'] != firma_filtros:
+        estado = {
+            'firma': firma_filtros,
+            'cursores': [None],  # cursores[i] = último (created_at, id) antes de la página i
+            'hay_siguiente': False,
+            'ultimo': None
+        }
+        st.session_state[nombre] = estado
+
+    return estado
+
+def _pagina_siguiente(estado):
+    if estado['hay_siguiente'] and estado['ultimo']:
+        estado['cursores'].append(estado['ultimo'])
+
+def _pagina_anterior(estado):
+    if len(estado['cursores']) > 1:
+        estado['cursores'].pop()
+
+def paginar_consulta(construir_consulta, clave, firma_filtros=None, tamano_pagina=None):
+    """
+    Paginación keyset (seek) sobre (created_at, id), del más reciente al más antiguo
+
+    Args:
+        construir_consulta: Callable sin argumentos que devuelve la consulta
+                            PostgREST con el select y los filtros ya aplicados
+        clave: Identificador único del listado (para session_state y widgets)
+        firma_filtros: Valor hashable con los filtros activos; si cambia se
+                       vuelve a la primera página
+        tamano_pagina: Filas por página (por defecto PAGINACION_TAMANO)
+
+    Returns:
+        Lista de filas de la página actual. Dibuja el cursor de página
+        en la posición donde se llama.
+    """
+    tamano_pagina = tamano_pagina or settings.PAGINACION_TAMANO
+    estado = _estado_paginacion(clave, firma_filtros)
+    cursor = estado['cursores'][-1]
+
+    query = construir_consulta()
+
+    if cursor:
+        created_at, id_ = cursor
+        query = query.or_(
+            f'created_at.lt.{citar_valor(created_at)},'
+            f'and(created_at.eq.{citar_valor(created_at)},id.lt.{citar_valor(id_)})'
+        )
+
+    # Se pide una fila extra para saber si existe página siguiente
+    filas = query.order('created_at', desc=True).order('id', desc=True).limit(tamano_pagina + 1).execute().data or []
+
+    estado['hay_siguiente'] = len(filas) > tamano_pagina
+    filas = filas[:tamano_pagina]
+    estado['ultimo'] = (filas[-1]['created_at'], filas[-1]['id']) if filas else None
+
+    numero_pagina = len(estado['cursores'])
+
+    col_ant, col_pag, col_sig = st.columns([1, 2, 1])
+
+    with col_ant:
+        st.button(
+            "◀ Anterior",
+            key=f"pag_ant_{clave}",
+            disabled=numero_pagina == 1,
+            on_click=_pagina_anterior,
+            args=(estado,)
+        )
+
+    with col_pag:
+        st.caption(f"Página {numero_pagina} · {len(filas)} registros")
+
+    with col_sig:
+        st.button(
+            "Siguiente ▶",
+            key=f"pag_sig_{clave}",
+            disabled=not estado['hay_siguiente'],
+            on_click=_pagina_siguiente,
+            args=(estado,)
+        )
+
+    return filas
@@ -0,0 +1,33 @@
+import streamlit as st
+
+@st.fragment
+def _contenido_pestana(funcion, args):
+    """Cuerpo de la pestaña activa: un widget dentro solo re-ejecuta este fragmento"""
+    funcion(*args)
+
+def mostrar_pestanas(pestanas, clave, args=()):
+    """
+    Navegación por pestañas que solo ejecuta la pestaña activa
+
+    A diferencia de `st.tabs`, que ejecuta el cuerpo de todas las pestañas en
+    cada rerun, aquí se dibuja un selector y solo se llama a la función de la
+    pestaña elegida, dentro de un `st.fragment`.
+
+    Args:
+        pestanas: dict {etiqueta: función} en el orden de visualización
+        clave: Identificador único del selector (session_state)
+        args: Argumentos posicionales para la función de la pestaña
+    """
+    etiquetas = list(pestanas)
+
+    activa = st.segmented_control(
+        "Sección",
+        etiquetas,
+        default=etiquetas[0],
+        key=f"pestana_{clave}",
+        label_visibility="collapsed",
+        width="stretch"
+    )
+
+    # segmented_control permite deseleccionar; se vuelve a la primera pestaña
+    _contenido_pestana(pestanas[activa or etiquetas[0]], args)
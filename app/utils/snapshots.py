@@ -0,0 +1,541 @@
+"""
+Instantáneas locales (Parquet) de las tablas que leen dashboard y reportes.
+
+Cada tabla se guarda en `SNAPSHOT_DIR/<tabla>/` como un `base.parquet` más
+archivos `delta-N.parquet` con las filas cambiadas en cada sincronización.
+La sincronización es incremental: pide a PostgREST solo las filas con
+`updated_at` posterior a la marca de agua (menos SNAPSHOT_SOLAPE_SEG, por
+relojes y transacciones que confirman tarde), paginando keyset sobre
+(updated_at, id); las filas del solape que ya están con el mismo updated_at
+se descartan, así una sincronización sin cambios no escribe un delta. Las
+lecturas abren los Parquet con memory map y el DataFrame resultante se
+reutiliza en el proceso mientras no cambien los archivos. Lecturas y
+sincronización toman el mismo lock por tabla: una lectura nunca mezcla una
+base reescrita con deltas ya consolidados.
+
+- Los deltas se consolidan en la base al pasar de SNAPSHOT_MAX_DELTAS.
+- Los borrados se detectan cada SNAPSHOT_RECONCILIAR_SEG comparando el
+  conteo remoto con el local (y, si difieren, la lista de ids).
+- Cada SNAPSHOT_RECARGA_SEG, o si cambia la proyección 'snapshot.<tabla>',
+  la tabla se descarga completa (refresca también los embebidos).
+- Una escritura local o un cambio recibido por realtime (`invalidar_tablas`)
+  fuerza la sincronización en la siguiente lectura; sin suscripción realtime
+  activa, además, se sincroniza como mucho cada SNAPSHOT_SYNC_SEG. Los plazos
+  de recarga completa y reconciliación se cumplen haya o no suscripción.
+
+Requiere la columna `updated_at` (migración 20261016000005_updated_at.sql).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from app.config import settings
+from app.config.proyecciones import columnas, dividir_select
+from app.utils.supabase_client import get_supabase_client
+from app.utils.cache_tablas import generaciones
+
+logger = logging.getLogger(__name__)
+
+_locks = {}
+_lock = threading.Lock()
+_ultima_sync = {}   # tabla -> (instante, generación)
+_dataframes = {}    # tabla -> (firma de archivos, DataFrame)
+_con_borrados = set()
+_suscripcion = threading.Event()
+
+def _lock_tabla(tabla):
+    with _lock:
+        return _locks.setdefault(tabla, threading.Lock())
+
+def _carpeta(tabla):
+    return os.path.join(settings.SNAPSHOT_DIR, tabla)
+
+def _ruta_estado(tabla):
+    return os.path.join(_carpeta(tabla), "estado.json")
+
+def _leer_estado(tabla):
+    try:
+        with open(_ruta_estado(tabla)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _escribir_atomico(ruta, escribir):
+    temporal = ruta + ".tmp"
+    escribir(temporal)
+    os.replace(temporal, ruta)
+
+def _guardar_estado(tabla, estado):
+    def escribir(ruta):
+        with open(ruta, "w") as f:
+            json.dump(estado, f)
+    _escribir_atomico(_ruta_estado(tabla), escribir)
+
+def _archivos(tabla):
+    """Rutas de la base y los deltas en orden de aplicación"""
+    carpeta = _carpeta(tabla)
+    if not os.path.isdir(carpeta):
+        return []
+
+    deltas = sorted(
+        (n for n in os.listdir(carpeta) if n.startswith("delta-") and n.endswith(".parquet")),
+        key=lambda n: int(n[6:-8])
+    )
+    base = ["base.parquet"] if os.path.exists(os.path.join(carpeta, "base.parquet")) else []
+    return [os.path.join(carpeta, n) for n in base + deltas]
+
+def _a_arrow(filas, columnas_json):
+    """Tabla Arrow de filas PostgREST; dicts y listas (jsonb, embebidos) se guardan como texto JSON"""
+    for fila in filas:
+        for columna, valor in fila.items():
+            if isinstance(valor, (dict, list)):
+                columnas_json.add(columna)
+
+    if columnas_json:
+        filas = [
+            {k: json.dumps(v) if k in columnas_json and v is not None else v for k, v in fila.items()}
+            for fila in filas
+        ]
+    return pa.Table.from_pylist(filas)
+
+def _escribir_parquet(tabla_arrow, ruta):
+    _escribir_atomico(ruta, lambda temporal: pq.write_table(tabla_arrow, temporal))
+
+def _leer_arrow(tabla):
+    """Base + deltas concatenados (sin resolver versiones repetidas)"""
+    tablas = [pq.read_table(ruta, memory_map=True) for ruta in _archivos(tabla)]
+    tablas = [t for t in tablas if t.num_columns]
+    if not tablas:
+        return None
+    return pa.concat_tables(tablas, promote_options="permissive")
+
+def _ultimas_versiones(tabla_arrow):
+    """DataFrame con la última versión de cada id (los deltas van después de la base)"""
+    df = tabla_arrow.to_pandas()
+    if 'id' in df.columns:
+        df = df.drop_duplicates('id', keep='last').reset_index(drop=True)
+    return df
+
+def _consolidar(tabla, ids_vigentes=None):
+    """Reescribir base + deltas como una sola base, quitando los ids borrados en el servidor"""
+    tabla_arrow = _leer_arrow(tabla)
+    if tabla_arrow is None:
+        return 0
+
+    df = _ultimas_versiones(tabla_arrow)
+    if ids_vigentes is not None:
+        df = df[df['id'].isin(ids_vigentes)]
+
+    _escribir_parquet(pa.Table.from_pandas(df, preserve_index=False), os.path.join(_carpeta(tabla), "base.parquet"))
+    for ruta in _archivos(tabla):
+        if not ruta.endswith("base.parquet"):
+            os.remove(ruta)
+    return len(df)
+
+def _descargar(tabla, select, desde=None):
+    """Filas con updated_at >= desde (todas si es None), paginando keyset sobre (updated_at, id)"""
+    supabase = get_supabase_client()
+    filas, cursor = [], None
+
+    while True:
+        query = supabase.table(tabla).select(select)
+        if cursor:
+            updated_at, id_ = cursor
+            query = query.or_(
+                f'updated_at.gt."{updated_at}",'
+                f'and(updated_at.eq."{updated_at}",id.gt."{id_}")'
+            )
+        elif desde:
+            query = query.gte('updated_at', desde)
+
+        pagina = query.order('updated_at').order('id').limit(settings.SNAPSHOT_LOTE).execute().data or []
+        filas += pagina
+
+        if len(pagina) < settings.SNAPSHOT_LOTE:
+            return filas
+        cursor = (pagina[-1]['updated_at'], pagina[-1]['id'])
+
+def _ids_remotos(tabla):
+    """Conjunto de ids de la tabla en el servidor (keyset sobre id)"""
+    supabase = get_supabase_client()
+    ids, ultimo = set(), None
+
+    while True:
+        query = supabase.table(tabla).select('id')
+        if ultimo is not None:
+            query = query.gt('id', ultimo)
+
+        pagina = query.order('id').limit(settings.SNAPSHOT_LOTE).execute().data or []
+        ids.update(fila['id'] for fila in pagina)
+
+        if len(pagina) < settings.SNAPSHOT_LOTE:
+            return ids
+        ultimo = pagina[-1]['id']
+
+def _conteo_remoto(tabla):
+    respuesta = get_supabase_client().table(tabla).select('id', count='exact').limit(1).execute()
+    return respuesta.count
+
+def _marca_agua(filas, actual):
+    """Mayor updated_at entre las filas descargadas y la marca anterior"""
+    marcas = [pd.Timestamp(f['updated_at']) for f in filas if f.get('updated_at')]
+    if actual:
+        marcas.append(pd.Timestamp(actual))
+    return max(marcas).isoformat() if marcas else None
+
+def _filas_nuevas(tabla, filas, marca_agua):
+    """
+    Quitar las filas del solape que la instantánea ya tiene con el mismo
+    (id, updated_at); las posteriores a la marca de agua siempre son nuevas
+    """
+    if not marca_agua:
+        return filas
+
+    limite = pd.Timestamp(marca_agua)
+    if all(pd.Timestamp(f['updated_at']) > limite for f in filas if f.get('updated_at')):
+        return filas
+
+    df = _leer_dataframe(tabla)
+    if 'updated_at' not in df.columns:
+        return filas
+    conocidas = {(id_, pd.Timestamp(u)) for id_, u in zip(df['id'], df['updated_at']) if pd.notna(u)}
+
+    return [
+        f for f in filas
+        if not f.get('updated_at')
+        or pd.Timestamp(f['updated_at']) > limite
+        or (f['id'], pd.Timestamp(f['updated_at'])) not in conocidas
+    ]
+
+def _reconciliar(tabla, estado):
+    """Quitar de la instantánea las filas borradas en el servidor"""
+    df = _leer_dataframe(tabla)
+    if len(df) != _conteo_remoto(tabla):
+        estado['filas'] = _consolidar(tabla, _ids_remotos(tabla))
+        estado['deltas'] = 0
+    else:
+        estado['filas'] = len(df)
+    estado['reconciliado'] = time.time()
+
+def marcar_suscripcion(activa):
+    """Con la suscripción realtime activa no se sondea cada SNAPSHOT_SYNC_SEG: se sincroniza al llegar cambios"""
+    if activa:
+        _suscripcion.set()
+    else:
+        _suscripcion.clear()
+
+def marcar_borrados(tabla):
+    """Reconciliar ids de `tabla` en la próxima sincronización (llegó un DELETE)"""
+    with _lock:
+        _con_borrados.add(tabla)
+
+def sincronizar(tabla, forzar=False):
+    """
+    Traer a la instantánea local los cambios de `tabla` desde la última sincronización
+
+    Args:
+        tabla: Tabla con proyección 'snapshot.<tabla>' registrada
+        forzar: Sincronizar aunque no haya pasado SNAPSHOT_SYNC_SEG
+
+    Returns:
+        Filas nuevas guardadas (0 si no hacía falta sincronizar o no hubo cambios)
+    """
+    generacion = generaciones(tabla)[0]
+
+    with _lock_tabla(tabla):
+        select = columnas(f'snapshot.{tabla}')
+        estado = _leer_estado(tabla)
+        completa = (
+            estado is None
+            or estado.get('select') != select
+            or time.time() - estado.get('descarga_completa', 0) >= settings.SNAPSHOT_RECARGA_SEG
+        )
+
+        # Los plazos de recarga completa y reconciliación se revisan antes que
+        # la suscripción: realtime no refresca embebidos ni detecta borrados
+        # de tablas sin eventos
+        ultima = _ultima_sync.get(tabla)
+        if (not forzar and not completa and ultima and ultima[1] == generacion
+                and time.time() - estado.get('reconciliado', 0) < settings.SNAPSHOT_RECONCILIAR_SEG
+                and (_suscripcion.is_set() or time.time() - ultima[0] < settings.SNAPSHOT_SYNC_SEG)):
+            return 0
+
+        os.makedirs(_carpeta(tabla), exist_ok=True)
+
+        if completa:
+            filas = _descargar(tabla, select)
+            columnas_json = set()
+            _escribir_parquet(_a_arrow(filas, columnas_json), os.path.join(_carpeta(tabla), "base.parquet"))
+            for ruta in _archivos(tabla):
+                if not ruta.endswith("base.parquet"):
+                    os.remove(ruta)
+
+            ahora = time.time()
+            estado = {
+                'select': select,
+                'marca_agua': _marca_agua(filas, None),
+                'columnas_json': sorted(columnas_json),
+                'deltas': 0,
+                'filas': len(filas),
+                'descarga_completa': ahora,
+                'reconciliado': ahora
+            }
+        else:
+            desde = None
+            if estado['marca_agua']:
+                desde = (pd.Timestamp(estado['marca_agua'])
+                         - timedelta(seconds=settings.SNAPSHOT_SOLAPE_SEG)).isoformat()
+            filas = _filas_nuevas(tabla, _descargar(tabla, select, desde), estado['marca_agua'])
+
+            if filas:
+                columnas_json = set(estado['columnas_json'])
+                estado['deltas'] += 1
+                _escribir_parquet(
+                    _a_arrow(filas, columnas_json),
+                    os.path.join(_carpeta(tabla), f"delta-{estado['deltas']}.parquet")
+                )
+                estado['columnas_json'] = sorted(columnas_json)
+                estado['marca_agua'] = _marca_agua(filas, estado['marca_agua'])
+
+                if estado['deltas'] > settings.SNAPSHOT_MAX_DELTAS:
+                    estado['filas'] = _consolidar(tabla)
+                    estado['deltas'] = 0
+
+            # Guardar antes de reconciliar: la reconciliación lee los archivos nuevos
+            _guardar_estado(tabla, estado)
+            with _lock:
+                con_borrados = tabla in _con_borrados
+                _con_borrados.discard(tabla)
+            if con_borrados or time.time() - estado.get('reconciliado', 0) >= settings.SNAPSHOT_RECONCILIAR_SEG:
+                _reconciliar(tabla, estado)
+
+        _guardar_estado(tabla, estado)
+        _ultima_sync[tabla] = (time.time(), generacion)
+
+    if completa or filas:
+        logger.info("Instantánea '%s': %s fila(s) %s", tabla, len(filas), "(completa)" if completa else "(delta)")
+    return len(filas)
+
+def _leer_dataframe(tabla):
+    """DataFrame de la instantánea (última versión por id), reutilizado mientras no cambien los archivos"""
+    rutas = _archivos(tabla)
+    firma = tuple((ruta, os.stat(ruta).st_mtime_ns) for ruta in rutas)
+
+    en_cache = _dataframes.get(tabla)
+    if en_cache and en_cache[0] == firma:
+        return en_cache[1]
+
+    tabla_arrow = _leer_arrow(tabla)
+    if tabla_arrow is None:
+        df = pd.DataFrame()
+    else:
+        df = _ultimas_versiones(tabla_arrow)
+        estado = _leer_estado(tabla) or {}
+        for columna in estado.get('columnas_json', []):
+            if columna in df.columns:
+                df[columna] = df[columna].map(lambda v: json.loads(v) if isinstance(v, str) else v)
+
+    _dataframes[tabla] = (firma, df)
+    return df
+
+def expresion_filtros(filtros, esquema):
+    """
+    Expresión Arrow equivalente a filtros [(columna, op, valor)] (misma
+    semántica que `_aplicar_filtros`); None si no hay filtros
+    """
+    expresion = None
+
+    for columna, op, valor in filtros:
+        if isinstance(valor, (date, datetime)):
+            valor = valor.isoformat()
+
+        if columna not in esquema.names or pa.types.is_null(esquema.field(columna).type):
+            # Columna ausente o sin ningún valor todavía: los nulos no cumplen ningún filtro
+            condicion = pc.scalar(False)
+        elif op == 'eq':
+            condicion = pc.field(columna) == valor
+        elif op == 'in':
+            condicion = pc.field(columna).isin(list(valor))
+        elif op == 'gte':
+            condicion = pc.field(columna) >= valor
+        elif op == 'lte':
+            condicion = pc.field(columna) <= valor
+        else:
+            raise ValueError(f"Operador de filtro no soportado: {op}")
+
+        expresion = condicion if expresion is None else expresion & condicion
+
+    return expresion
+
+def escanear(tabla, columnas_leer, filtros=()):
+    """
+    Tabla Arrow con la última versión de las filas de la instantánea que
+    cumplen `filtros`, leyendo solo `columnas_leer`
+
+    La proyección y el predicado se empujan al escaneo de cada Parquet (no se
+    materializa la tabla completa). Para no contar versiones viejas, cada
+    archivo excluye los ids que aparecen en deltas más nuevos.
+
+    Returns:
+        pyarrow.Table (sin filas ni columnas si la instantánea está vacía)
+    """
+    try:
+        sincronizar(tabla)
+    except Exception as e:
+        if not _archivos(tabla):
+            raise
+        logger.warning("No se pudo sincronizar '%s', se usa la instantánea local: %s", tabla, e)
+
+    with _lock_tabla(tabla):
+        rutas = [r for r in _archivos(tabla) if pq.read_schema(r).names]
+        if not rutas:
+            return pa.table({})
+
+        esquema = pa.unify_schemas([pq.read_schema(r) for r in rutas], promote_options="permissive")
+        columnas_leer = [c for c in columnas_leer if c in esquema.names]
+        filtro = expresion_filtros(filtros, esquema)
+
+        partes, ids_posteriores = [], []
+        for ruta in reversed(rutas):
+            dataset = ds.dataset(ruta, format="parquet", schema=esquema)
+
+            if not ids_posteriores:
+                partes.append(dataset.to_table(columns=columnas_leer, filter=filtro))
+            else:
+                # La exclusión se aplica sobre lo ya filtrado: leer 'id' solo de las filas que cumplen
+                parte = dataset.to_table(columns=list(dict.fromkeys(columnas_leer + ['id'])), filter=filtro)
+                vigentes = pc.invert(pc.is_in(parte['id'], value_set=pa.concat_arrays(ids_posteriores)))
+                partes.append(parte.filter(vigentes).select(columnas_leer))
+
+            if not ruta.endswith("base.parquet"):
+                ids_posteriores.append(dataset.to_table(columns=['id'])['id'].combine_chunks())
+
+        return pa.concat_tables(partes)
+
+def _aplicar_filtros(df, filtros):
+    """Filtros [(columna, op, valor)] con op 'eq', 'in', 'gte' o 'lte' (semántica PostgREST: nulos no pasan)"""
+    mascara = pd.Series(True, index=df.index)
+
+    for columna, op, valor in filtros:
+        serie = df[columna]
+        if isinstance(valor, (date, datetime)):
+            valor = valor.isoformat()
+
+        presentes = serie.notna()
+        valores = serie[presentes]
+        if op == 'eq':
+            cumple = valores == valor
+        elif op == 'in':
+            cumple = valores.isin(list(valor))
+        elif op == 'gte':
+            cumple = valores >= valor
+        elif op == 'lte':
+            cumple = valores <= valor
+        else:
+            raise ValueError(f"Operador de filtro no soportado: {op}")
+
+        mascara &= cumple.reindex(df.index, fill_value=False)
+
+    return df[mascara]
+
+def leer_snapshot(tabla, vista, filtros=()):
+    """
+    Filas de una vista leídas de la instantánea local (sincronizada antes si toca)
+
+    Args:
+        tabla: Tabla de origen
+        vista: Vista registrada en proyecciones (define las columnas devueltas)
+        filtros: Lista de (columna, op, valor); op en 'eq', 'in', 'gte', 'lte'
+
+    Returns:
+        DataFrame propio del llamador (se puede modificar)
+    """
+    try:
+        sincronizar(tabla)
+    except Exception as e:
+        # Sin conexión se sirve la copia local si existe
+        if not _archivos(tabla):
+            raise
+        logger.warning("No se pudo sincronizar '%s', se usa la instantánea local: %s", tabla, e)
+
+    with _lock_tabla(tabla):
+        df = _leer_dataframe(tabla)
+    if df.empty:
+        return pd.DataFrame()
+
+    nombres = [parte.split('(')[0].split('!')[0].strip() for parte in dividir_select(columnas(vista))]
+    df = _aplicar_filtros(df, filtros)
+    return df[[n for n in nombres if n in df.columns]].reset_index(drop=True)
+
+def consulta_remota(tabla, select, filtros=()):
+    """Consulta PostgREST equivalente a filtros [(columna, op, valor)]"""
+    query = get_supabase_client().table(tabla).select(select)
+    for columna, op, valor in filtros:
+        query = getattr(query, 'in_' if op == 'in' else op)(columna, valor)
+    return query
+
+def leer_remoto(tabla, select, filtros=()):
+    """
+    Todas las filas de `consulta_remota`, en páginas de SNAPSHOT_LOTE ordenadas
+    por id (una sola consulta quedaría cortada en el máximo de filas de PostgREST)
+    """
+    filas = []
+
+    while True:
+        pagina = consulta_remota(tabla, select, filtros).order('id').range(
+            len(filas), len(filas) + settings.SNAPSHOT_LOTE - 1
+        ).execute().data or []
+        filas += pagina
+
+        if len(pagina) < settings.SNAPSHOT_LOTE:
+            return filas
+
+def consulta_tabla(tabla, vista, filtros=()):
+    """
+    Consulta para `cargar_en_paralelo`: lee de la instantánea local si
+    SNAPSHOTS_ACTIVOS, o directamente de PostgREST
+
+    Args:
+        tabla: Tabla de origen
+        vista: Vista registrada en proyecciones
+        filtros: Lista de (columna, op, valor); op en 'eq', 'in', 'gte', 'lte'
+    """
+    def remota():
+        return consulta_remota(tabla, columnas(vista), filtros)
+
+    if not settings.SNAPSHOTS_ACTIVOS:
+        return remota()
+
+    def local():
+        try:
+            return leer_snapshot(tabla, vista, filtros)
+        except Exception as e:
+            logger.warning("Instantánea '%s' no disponible, se consulta PostgREST: %s", tabla, e)
+            return leer_remoto(tabla, columnas(vista), filtros)
+
+    return local
+
+def estado_snapshots():
+    """Filas, deltas, marca de agua y bytes en disco por tabla"""
+    if not os.path.isdir(settings.SNAPSHOT_DIR):
+        return {}
+
+    resultado = {}
+    for tabla in sorted(os.listdir(settings.SNAPSHOT_DIR)):
+        estado = _leer_estado(tabla)
+        if estado is None:
+            continue
+        resultado[tabla] = {
+            'filas': estado.get('filas'),
+            'deltas': estado.get('deltas'),
+            'marca_agua': estado.get('marca_agua'),
+            'bytes': sum(os.path.getsize(ruta) for ruta in _archivos(tabla))
+        }
+    return resultado
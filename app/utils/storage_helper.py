@@ -1,11 +1,307 @@
 import streamlit as st
-from supabase import create_client
+import base64
+import io
+import logging
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import os
-from dotenv import load_dotenv
+import httpx
+from PIL import Image, ImageOps
+from app.utils.supabase_client import get_supabase_client, get_http_client
+from app.utils import indice_contenido
+from app.config import settings
 
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Imágenes que se redimensionan y recomprimen antes de subir
+TIPOS_IMAGEN = {'image/jpeg', 'image/jpg', 'image/png', 'image/webp'}
+
+# Pool acotado y compartido para subidas concurrentes (evidencias múltiples)
+_executor = ThreadPoolExecutor(
+    max_workers=settings.SUBIDA_PARALELA_MAX_HILOS,
+    thread_name_prefix="subida_sst"
+)
+
+# Subidas TUS sin terminar: (bucket, carpeta, archivo, tamaño) -> (url_subida, ruta).
+# Si el usuario reintenta el mismo archivo, se continúa desde el último bloque.
+_subidas_pendientes = {}
+_lock_pendientes = threading.Lock()
+
+def _tamano(archivo):
+    """Tamaño en bytes sin leer el archivo completo"""
+    if hasattr(archivo, 'size'):
+        return archivo.size
+    return archivo.getbuffer().nbytes
+
+def _iterar_bloque(archivo, offset, tamano, paso=256 * 1024):
+    """
+    Emitir los bytes [offset, offset + tamano) del archivo en trozos de `paso`
+
+    El cuerpo del PATCH se envía en streaming, así nunca se copia el bloque
+    completo. Los UploadedFile de Streamlit son BytesIO que comparten el buffer
+    con el servidor; `read()` forzaría una copia del archivo entero, por eso se
+    corta una vista de `getvalue()`.
+    """
+    fin = offset + tamano
+    if hasattr(archivo, 'getvalue'):
+        vista = memoryview(archivo.getvalue())
+        for inicio in range(offset, fin, paso):
+            yield bytes(vista[inicio:min(inicio + paso, fin)])
+    else:
+        archivo.seek(offset)
+        for inicio in range(offset, fin, paso):
+            yield archivo.read(min(paso, fin - inicio))
+
+def _cabeceras_tus():
+    return {
+        "Authorization": f"Bearer {settings.SUPABASE_SERVICE_KEY}",
+        "apikey": settings.SUPABASE_SERVICE_KEY,
+        "Tus-Resumable": "1.0.0"
+    }
+
+def _metadata_tus(**campos):
+    """Cabecera Upload-Metadata: pares 'clave valor_base64' separados por coma"""
+    return ",".join(
+        f"{clave} {base64.b64encode(str(valor).encode()).decode()}" for clave, valor in campos.items()
+    )
+
+def _offset_servidor(http, url_subida):
+    """Bytes que el servidor ya recibió de una subida TUS"""
+    respuesta = http.head(url_subida, headers=_cabeceras_tus())
+    respuesta.raise_for_status()
+    return int(respuesta.headers["Upload-Offset"])
+
+def _subir_tus(archivo, bucket, carpeta, nombre_archivo, content_type, sobrescribir=False):
+    """
+    Subida reanudable (protocolo TUS de Supabase Storage) por bloques
+
+    Cada bloque se envía en streaming, así la memoria por subida no depende
+    del tamaño del archivo. Un bloque que falla se reintenta
+    desde el offset que confirma el servidor; si se agotan los reintentos, la
+    subida queda registrada y el siguiente intento con el mismo archivo la
+    continúa en lugar de empezar de cero. Si el servidor ya no la acepta
+    (URL vencida o respuesta 4xx), se descarta y se crea una nueva.
+
+    Returns:
+        Ruta del objeto dentro del bucket
+    """
+    http = get_http_client()
+    tamano = _tamano(archivo)
+    bloque = settings.SUBIDA_TUS_BLOQUE_MB * 1024 * 1024
+    clave = (bucket, carpeta, getattr(archivo, 'file_id', None) or getattr(archivo, 'name', None), tamano)
+    
+    with _lock_pendientes:
+        pendiente = _subidas_pendientes.get(clave)
+    
+    offset = None
+    if pendiente:
+        try:
+            offset = _offset_servidor(http, pendiente[0])
+            url_subida, nombre_archivo = pendiente
+        except httpx.HTTPError as e:
+            # URL de subida vencida o eliminada (404/410): se empieza una nueva
+            logger.info("Subida TUS %s no se puede reanudar, se reinicia: %s", pendiente[0], e)
+            with _lock_pendientes:
+                _subidas_pendientes.pop(clave, None)
+    
+    if offset is None:
+        respuesta = http.post(
+            f"{settings.SUPABASE_URL.rstrip('/')}/storage/v1/upload/resumable",
+            headers={
+                **_cabeceras_tus(),
+                "Upload-Length": str(tamano),
+                "x-upsert": "true" if sobrescribir else "false",
+                "Upload-Metadata": _metadata_tus(
+                    bucketName=bucket,
+                    objectName=nombre_archivo,
+                    contentType=content_type,
+                    cacheControl=3600
+                )
+            }
+        )
+        respuesta.raise_for_status()
+        url_subida = respuesta.headers["Location"]
+        offset = 0
+        with _lock_pendientes:
+            _subidas_pendientes[clave] = (url_subida, nombre_archivo)
+    
+    fallos = 0
+    try:
+        while offset < tamano:
+            largo = min(bloque, tamano - offset)
+            try:
+                respuesta = http.patch(
+                    url_subida,
+                    content=_iterar_bloque(archivo, offset, largo),
+                    headers={
+                        **_cabeceras_tus(),
+                        "Upload-Offset": str(offset),
+                        "Content-Length": str(largo),
+                        "Content-Type": "application/offset+octet-stream"
+                    }
+                )
+                respuesta.raise_for_status()
+                offset = int(respuesta.headers["Upload-Offset"])
+                fallos = 0
+            except httpx.HTTPError:
+                fallos += 1
+                if fallos > settings.SUBIDA_TUS_REINTENTOS:
+                    raise
+                time.sleep(min(2 ** fallos, 10))
+                offset = _offset_servidor(http, url_subida)
+    except httpx.HTTPStatusError as e:
+        # El servidor rechazó la subida (vencida, eliminada, offset inválido):
+        # no se registra para reanudar, el próximo intento empieza de cero
+        if e.response.status_code < 500:
+            with _lock_pendientes:
+                _subidas_pendientes.pop(clave, None)
+        raise
+    
+    with _lock_pendientes:
+        _subidas_pendientes.pop(clave, None)
+    
+    return nombre_archivo
+
+def procesar_imagen(datos):
+    """
+    Redimensionar y recomprimir una imagen, y generar su miniatura WebP
+
+    El lado mayor se limita a IMAGEN_MAX_PX y se guarda como JPEG con
+    IMAGEN_CALIDAD (PNG si tiene transparencia). Se respeta la orientación
+    EXIF de las fotos de celular. Si el resultado no es más liviano que el
+    original y no hizo falta reducirla, se conserva el original.
+
+    Args:
+        datos: bytes de la imagen
+
+    Returns:
+        (bytes, content_type, extension, bytes_miniatura), o None si no es
+        una imagen que Pillow pueda abrir
+    """
+    try:
+        imagen = Image.open(io.BytesIO(datos))
+        imagen = ImageOps.exif_transpose(imagen)
+    except Exception as e:
+        logger.warning("No se pudo procesar la imagen, se sube el original: %s", e)
+        return None
+    
+    formato_original = imagen.format
+    reducida = max(imagen.size) > settings.IMAGEN_MAX_PX
+    imagen.thumbnail((settings.IMAGEN_MAX_PX, settings.IMAGEN_MAX_PX), Image.Resampling.LANCZOS)
+    
+    salida = io.BytesIO()
+    if imagen.mode in ('RGBA', 'LA') or (imagen.mode == 'P' and 'transparency' in imagen.info):
+        imagen.save(salida, format='PNG', optimize=True)
+        content_type, extension = 'image/png', 'png'
+    else:
+        imagen.convert('RGB').save(
+            salida, format='JPEG', quality=settings.IMAGEN_CALIDAD, optimize=True, progressive=True
+        )
+        content_type, extension = 'image/jpeg', 'jpg'
+    
+    procesada = salida.getvalue()
+    if not reducida and len(procesada) >= len(datos) and formato_original in ('JPEG', 'PNG', 'WEBP'):
+        procesada = bytes(datos)
+        content_type = Image.MIME[formato_original]
+        extension = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}[formato_original]
+    
+    miniatura = imagen.copy()
+    miniatura.thumbnail((settings.IMAGEN_MINIATURA_PX, settings.IMAGEN_MINIATURA_PX), Image.Resampling.LANCZOS)
+    salida_miniatura = io.BytesIO()
+    miniatura.save(salida_miniatura, format='WEBP', quality=settings.IMAGEN_MINIATURA_CALIDAD, method=4)
+    
+    return procesada, content_type, extension, salida_miniatura.getvalue()
+
+def ruta_miniatura(ruta):
+    """Ruta (o URL) de la miniatura WebP guardada junto a una imagen"""
+    return ruta.rsplit('.', 1)[0] + '_mini.webp'
+
+def _subir_con_miniatura(archivo, bucket, carpeta):
+    """
+    Subir un archivo; lanza la excepción si falla
+
+    Con ALMACENAMIENTO_DEDUP la ruta es el SHA-256 del contenido original: si
+    ese contenido ya está en el bucket no se sube nada y se devuelve la URL
+    existente (sumando una referencia en el índice local). Las imágenes se
+    procesan con `procesar_imagen` y su miniatura se sube al lado. Los archivos
+    de más de SUBIDA_TUS_UMBRAL_MB se suben por bloques con TUS; los demás en
+    una sola petición.
+
+    Returns:
+        (URL pública, URL pública de la miniatura o None)
+    """
+    supabase = get_supabase_client()  # Cliente compartido (service key)
+    
+    sha256 = None
+    if settings.ALMACENAMIENTO_DEDUP and hasattr(archivo, 'getvalue'):
+        sha256 = indice_contenido.calcular_sha256(archivo)
+        existente = indice_contenido.buscar_objeto(bucket, sha256)
+        if existente:
+            return existente
+    
+    # Generar nombre único
+    extension = archivo.name.split('.')[-1] if hasattr(archivo, 'name') else 'jpg'
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    base = f"{carpeta}{timestamp}_{uuid.uuid4()}"
+    content_type = archivo.type if hasattr(archivo, 'type') else 'image/jpeg'
+    
+    file_bytes = miniatura = None
+    if settings.IMAGEN_COMPRIMIR and content_type in TIPOS_IMAGEN and hasattr(archivo, 'getvalue'):
+        imagen = procesar_imagen(archivo.getvalue())
+        if imagen:
+            file_bytes, content_type, extension, miniatura = imagen
+    
+    opciones = {"content-type": content_type}
+    if sha256:
+        # Mismo contenido, misma ruta: sobrescribir es inofensivo y evita el
+        # conflicto si el índice local se perdió
+        nombre_archivo = indice_contenido.ruta_contenido(sha256, extension.lower())
+        opciones["upsert"] = "true"
+    else:
+        nombre_archivo = f"{base}.{extension}"
+    
+    if file_bytes is None and hasattr(archivo, 'getvalue') and _tamano(archivo) > settings.SUBIDA_TUS_UMBRAL_MB * 1024 * 1024:
+        nombre_archivo = _subir_tus(archivo, bucket, carpeta, nombre_archivo, content_type, sobrescribir=bool(sha256))
+    else:
+        # Subir archivo
+        if file_bytes is None:
+            file_bytes = archivo.read() if hasattr(archivo, 'read') else archivo.getvalue()
+        
+        supabase.storage.from_(bucket).upload(
+            file=file_bytes,
+            path=nombre_archivo,
+            file_options=opciones
+        )
+    
+    # La miniatura es opcional: si falla, los listados usan el original
+    url_miniatura = None
+    if miniatura:
+        try:
+            supabase.storage.from_(bucket).upload(
+                file=miniatura,
+                path=ruta_miniatura(nombre_archivo),
+                file_options={**opciones, "content-type": "image/webp", "cache-control": "31536000"}
+            )
+            url_miniatura = supabase.storage.from_(bucket).get_public_url(ruta_miniatura(nombre_archivo))
+        except Exception as e:
+            logger.warning("No se pudo subir la miniatura de %s: %s", nombre_archivo, e)
+    
+    # Obtener URL pública
+    url = supabase.storage.from_(bucket).get_public_url(nombre_archivo)
+    
+    if sha256:
+        indice_contenido.registrar_objeto(
+            bucket, sha256, nombre_archivo, url, url_miniatura,
+            len(file_bytes) if file_bytes is not None else _tamano(archivo)
+        )
+    
+    return url, url_miniatura
+
+def _subir(archivo, bucket, carpeta):
+    """Subir un archivo y devolver su URL pública; lanza la excepción si falla"""
+    return _subir_con_miniatura(archivo, bucket, carpeta)[0]
 
 def subir_archivo_storage(archivo, bucket, carpeta):
     """
@@ -23,48 +319,138 @@ def subir_archivo_storage(archivo, bucket, carpeta):
         return None
     
     try:
-        supabase = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_SERVICE_KEY")  # Usar service key para upload
-        )
-        
-        # Generar nombre único
-        extension = archivo.name.split('.')[-1] if hasattr(archivo, 'name') else 'jpg'
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        nombre_archivo = f"{carpeta}{timestamp}_{uuid.uuid4()}.{extension}"
-        
-        # Subir archivo
-        file_bytes = archivo.read() if hasattr(archivo, 'read') else archivo.getvalue()
-        content_type = archivo.type if hasattr(archivo, 'type') else 'image/jpeg'
-        
-        supabase.storage.from_(bucket).upload(
-            file=file_bytes,
-            path=nombre_archivo,
-            file_options={"content-type": content_type}
-        )
-        
-        # Obtener URL pública
-        url_publica = supabase.storage.from_(bucket).get_public_url(nombre_archivo)
-        
-        return url_publica
-        
+        return _subir(archivo, bucket, carpeta)
     except Exception as e:
         st.error(f"Error subiendo archivo: {e}")
         return None
 
-def eliminar_archivo_storage(url_publica, bucket):
-    """Eliminar archivo por URL pública"""
+def subir_imagen_storage(archivo, bucket, carpeta):
+    """
+    Subir una imagen comprimida junto con su miniatura WebP
+    
+    Returns:
+        (URL pública, URL de la miniatura), o (None, None) si error. La URL
+        de la miniatura es None si el archivo no es una imagen procesable.
+    """
+    if not archivo:
+        return None, None
+    
     try:
-        supabase = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_SERVICE_KEY")  # Usar service key para upload
-        )
+        return _subir_con_miniatura(archivo, bucket, carpeta)
+    except Exception as e:
+        st.error(f"Error subiendo archivo: {e}")
+        return None, None
+
+def subir_archivos_paralelo(archivos, bucket, carpeta, al_progresar=None):
+    """
+    Subir varios archivos a la vez con un pool de hilos acotado
+    
+    Todas las subidas usan el cliente Supabase compartido. Un archivo que
+    falla no detiene a los demás: su error queda en el resultado.
+    
+    Args:
+        archivos: Lista de archivos de Streamlit (se ignoran los None)
+        bucket: Nombre del bucket
+        carpeta: Carpeta dentro del bucket
+        al_progresar: callable(completados, total, resultado) llamado en el
+                      hilo de Streamlit cada vez que termina un archivo
+    
+    Returns:
+        Lista en el orden de `archivos` con {'nombre', 'url', 'error'}
+    """
+    archivos = [a for a in archivos if a]
+    futuros = {
+        _executor.submit(_subir, archivo, bucket, carpeta): i
+        for i, archivo in enumerate(archivos)
+    }
+    
+    resultados = [None] * len(archivos)
+    for completados, futuro in enumerate(as_completed(futuros), start=1):
+        i = futuros[futuro]
+        nombre = getattr(archivos[i], 'name', f'archivo_{i + 1}')
+        try:
+            resultados[i] = {'nombre': nombre, 'url': futuro.result(), 'error': None}
+        except Exception as e:
+            resultados[i] = {'nombre': nombre, 'url': None, 'error': str(e)}
+        
+        if al_progresar:
+            al_progresar(completados, len(archivos), resultados[i])
+    
+    return resultados
+
+def _rutas_con_miniatura(rutas):
+    """Rutas a eliminar: cada imagen junto con su miniatura (si no existe, se ignora)"""
+    resultado = []
+    for ruta in rutas:
+        resultado.append(ruta)
+        if ruta.rsplit('.', 1)[-1].lower() in ('jpg', 'jpeg', 'png', 'webp'):
+            resultado.append(ruta_miniatura(ruta))
+    return resultado
+
+def limpiar_objetos_huerfanos(gracia_seg=None):
+    """
+    Eliminar del bucket los objetos deduplicados que quedaron sin referencias
+
+    Args:
+        gracia_seg: Antigüedad mínima sin referencias (por defecto
+                    ALMACENAMIENTO_GRACIA_SEG), para no borrar un objeto que
+                    otra sesión está volviendo a adjuntar
+
+    Returns:
+        Cantidad de objetos eliminados
+    """
+    supabase = get_supabase_client()
+    
+    por_bucket = {}
+    for bucket, ruta in indice_contenido.objetos_huerfanos(gracia_seg):
+        por_bucket.setdefault(bucket, []).append(ruta)
+    
+    eliminados = 0
+    for bucket, rutas in por_bucket.items():
+        supabase.storage.from_(bucket).remove(_rutas_con_miniatura(rutas))
+        indice_contenido.olvidar_objetos(bucket, rutas)
+        eliminados += len(rutas)
+    
+    return eliminados
+
+def _eliminar(url_publica, bucket):
+    """Liberar la referencia (objeto deduplicado) o borrar el objeto; lanza la excepción si falla"""
+    restantes = indice_contenido.liberar_referencia(url_publica)
+    
+    if restantes is None:
+        supabase = get_supabase_client()  # Cliente compartido (service key)
         
         # Extraer ruta del URL
         # URL: https://bucket.supabase.co/storage/v1/object/public/bucket/ruta/archivo.jpg
         ruta = url_publica.split(f"/{bucket}/")[-1]
         
-        supabase.storage.from_(bucket).remove([ruta])
+        # Con la imagen se elimina su miniatura
+        supabase.storage.from_(bucket).remove(_rutas_con_miniatura([ruta]))
+
+def descartar_subida(url_publica, bucket):
+    """
+    Deshacer una subida cuyo registro no se pudo guardar (sin mostrar errores)
+    
+    Sin esto, la referencia que tomó la subida en el índice de contenido
+    nunca se libera y el objeto no se borra aunque nadie lo use.
+    """
+    if not url_publica:
+        return
+    try:
+        _eliminar(url_publica, bucket)
+    except Exception as e:
+        logger.warning("No se pudo descartar la subida %s: %s", url_publica, e)
+
+def eliminar_archivo_storage(url_publica, bucket):
+    """
+    Eliminar archivo por URL pública
+    
+    Si el archivo está en el índice de contenido solo se libera una referencia;
+    el objeto se borra cuando nadie más lo usa: la cola de subidas ejecuta
+    `limpiar_objetos_huerfanos` cada ALMACENAMIENTO_LIMPIEZA_SEG.
+    """
+    try:
+        _eliminar(url_publica, bucket)
         return True
         
     except Exception as e:
@@ -1,9 +1,67 @@
-import os
+import atexit
+import threading
+import httpx
 from supabase import create_client, Client
-from dotenv import load_dotenv
-load_dotenv()
+from supabase.lib.client_options import SyncClientOptions
+from app.config import settings
+
+_cliente = None
+_http_client = None
+_lock = threading.Lock()
+
+def _crear_http_client() -> httpx.Client:
+    """Cliente httpx con pool de conexiones y HTTP/2 keep-alive"""
+    return httpx.Client(
+        http2=settings.SUPABASE_HTTP2,
+        follow_redirects=True,
+        limits=httpx.Limits(
+            max_connections=settings.SUPABASE_POOL_MAX_CONEXIONES,
+            max_keepalive_connections=settings.SUPABASE_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.SUPABASE_POOL_KEEPALIVE_SEG
+        ),
+        timeout=httpx.Timeout(
+            settings.SUPABASE_TIMEOUT_SEG,
+            connect=settings.SUPABASE_TIMEOUT_CONEXION_SEG
+        )
+    )
 
 def get_supabase_client() -> Client:
-    supabase_url = os.getenv("SUPABASE_URL")
-    supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
-    return create_client(supabase_url, supabase_key)
+    """
+    Cliente Supabase único por proceso.
+
+    Todas las sesiones de Streamlit, los módulos y el storage helper comparten
+    el mismo pool HTTP, así la conexión TLS se negocia una sola vez y se
+    reutiliza entre reruns.
+    """
+    global _cliente, _http_client
+
+    if _cliente is not None:
+        return _cliente
+
+    with _lock:
+        if _cliente is None:
+            _http_client = _crear_http_client()
+            _cliente = create_client(
+                settings.SUPABASE_URL,
+                settings.SUPABASE_SERVICE_KEY,
+                options=SyncClientOptions(httpx_client=_http_client)
+            )
+
+    return _cliente
+
+def get_http_client() -> httpx.Client:
+    """Pool HTTP del cliente Supabase, para llamadas directas (p.ej. subidas TUS)"""
+    get_supabase_client()
+    return _http_client
+
+def cerrar_supabase_client():
+    """Cerrar el pool HTTP compartido (al terminar el proceso)"""
+    global _cliente, _http_client
+
+    with _lock:
+        if _http_client is not None:
+            _http_client.close()
+        _cliente = None
+        _http_client = None
+
+atexit.register(cerrar_supabase_client)
@@ -0,0 +1,234 @@
+"""
+Verificación estática de las proyecciones de columnas.
+
+Recorre las vistas de la app y comprueba que toda columna leída de una fila
+(`fila['col']`, `fila.get('col')`, `df[['a', 'b']]`) esté incluida en la
+proyección registrada en `app/config/proyecciones.py` que usa esa vista.
+También rechaza `select('*')`.
+
+Uso:
+    python -m app.utils.verificar_proyecciones
+
+También lo ejecuta la suite de pruebas (tests/test_proyecciones.py).
+
+Termina con código 1 si encuentra columnas no proyectadas.
+"""
+import ast
+import sys
+from pathlib import Path
+from app.config.proyecciones import PROYECCIONES, VISTAS_SNAPSHOT, dividir_select
+
+RAIZ_APP = Path(__file__).resolve().parent.parent
+
+ARCHIVOS = [RAIZ_APP / 'auth.py'] + sorted((RAIZ_APP / 'modules').glob('*.py'))
+
+# Funciones que reciben los datos cargados por otra función (dict de DataFrames)
+CONSUMIDORES = {
+    'dashboard.mostrar_tendencias': ['dashboard.incidentes'],
+    'dashboard.mostrar_analisis_riesgos': ['dashboard.riesgos'],
+    'dashboard.mostrar_analisis_incidentes': ['dashboard.incidentes'],
+    'dashboard.mostrar_analisis_inspecciones': ['dashboard.inspecciones', 'dashboard.hallazgos'],
+    'dashboard.mostrar_reportes_legales': ['dashboard.incidentes', 'dashboard.riesgos'],
+    'dashboard.generar_reporte_legal': ['dashboard.incidentes', 'dashboard.riesgos'],
+    'reportes.mostrar_resumen_ejecutivo': ['reportes.incidentes', 'reportes.riesgos', 'reportes.epp',
+                                           'reportes.capacitaciones'],
+    'reportes.mostrar_reporte_legal_sunafil': ['reportes.incidentes', 'reportes.riesgos', 'reportes.epp',
+                                               'reportes.capacitaciones', 'reportes.documentos'],
+    'reportes.mostrar_matriz_riesgos_interactiva': ['reportes.riesgos'],
+    'reportes.mostrar_analisis_estadistico': ['reportes.incidentes', 'reportes.riesgos',
+                                              'reportes.hallazgos'],
+    'reportes.generar_reporte_excel': ['reportes.incidentes', 'reportes.riesgos', 'reportes.epp',
+                                       'reportes.capacitaciones', 'reportes.hallazgos'],
+    'reportes.generar_reporte_pdf': ['reportes.incidentes', 'reportes.riesgos', 'reportes.epp'],
+}
+
+# Funciones de app/utils/datos_referencia.py y la proyección que devuelven
+FUNCIONES_REFERENCIA = {
+    'obtener_usuarios': 'referencia.usuarios',
+    'obtener_trabajadores': 'referencia.usuarios',
+    'usuarios_por_id': 'referencia.usuarios',
+    'obtener_supervisor': 'referencia.usuarios',
+    'obtener_epp_catalogo': 'referencia.epp_catalogo',
+    'epp_por_id': 'referencia.epp_catalogo',
+}
+
+# Módulos importados cuyos subíndices nunca son filas (st.session_state, os.environ)
+MODULOS_NO_FILA = {'st', 'os'}
+
+# Variables que no son filas de la base de datos, por función. La exención es
+# explícita: una variable con el mismo nombre en otra función sí se verifica.
+NO_FILAS_POR_FUNCION = {
+    'capacitaciones.gestionar_asistentes': {'editada'},       # fila del st.data_editor
+    'dashboard.mostrar_reportes_legales': {'reporte'},        # resultado de generar_reporte_legal
+    'dashboard.generar_reporte_legal': {'indicadores'},       # KPIs calculados
+    'epp.gestionar_catalogo': {'subida'},                     # cola_subidas.preparar_subida
+    'epp.asignar_epp': {'subida'},
+    'incidentes.investigar_incidente': {'guardada', 'r'},     # session_state y resultados de subida
+    'inspecciones.ejecutar_inspeccion': {'pregunta'},         # ítem del JSON items del checklist
+    'reportes.mostrar_resumen_ejecutivo': {'filtros', 'kpis'},
+    'reportes.generar_reporte_pdf': {'filtros', 'styles'},
+}
+
+# Claves del dict de DataFrames devuelto por los cargadores
+CLAVES_CARGADOR = {
+    'riesgos', 'incidentes', 'inspecciones', 'hallazgos', 'epp', 'capacitaciones', 'documentos',
+}
+
+# Columnas que cargar_datos_reporte aplana desde los embebidos
+COLUMNAS_APLANADAS = {'epp_nombre'}
+
+# Columnas JSON: sus claves internas no son columnas
+COLUMNAS_JSON = {'consecuencias', 'items', 'evidencia', 'filtros'}
+
+def columnas_proyectadas(select):
+    """Nombres accesibles en las filas devueltas por un `select` de PostgREST"""
+    nombres = set()
+    for parte in dividir_select(select):
+        if '(' in parte:
+            cabecera, interior = parte.split('(', 1)
+            nombres |= columnas_proyectadas(interior.rsplit(')', 1)[0])
+        else:
+            cabecera = parte
+        # alias:columna o tabla!fk
+        cabecera = cabecera.split('::')[0]
+        nombre = cabecera.split(':')[0] if ':' in cabecera else cabecera.split('!')[0]
+        nombres.add(nombre.strip())
+    return nombres
+
+def _raiz(nodo):
+    """Nombre base de una expresión (x en x['a']['b'], x.attr, x.get(...))"""
+    while True:
+        if isinstance(nodo, ast.Subscript):
+            nodo = nodo.value
+        elif isinstance(nodo, ast.Attribute):
+            nodo = nodo.value
+        elif isinstance(nodo, ast.Call):
+            nodo = nodo.func
+        else:
+            return nodo.id if isinstance(nodo, ast.Name) else None
+
+def _claves(slice_):
+    if isinstance(slice_, ast.Constant) and isinstance(slice_.value, str):
+        return [slice_.value]
+    if isinstance(slice_, ast.List):
+        return [e.value for e in slice_.elts if isinstance(e, ast.Constant) and isinstance(e.value, str)]
+    return []
+
+def _vistas_usadas(funcion):
+    vistas = []
+    for nodo in ast.walk(funcion):
+        if (isinstance(nodo, ast.Call) and isinstance(nodo.func, ast.Name)
+                and nodo.func.id == 'columnas' and nodo.args
+                and isinstance(nodo.args[0], ast.Constant)):
+            vistas.append(nodo.args[0].value)
+        elif (isinstance(nodo, ast.Call) and isinstance(nodo.func, ast.Name)
+                and nodo.func.id == 'consulta_tabla' and len(nodo.args) > 1
+                and isinstance(nodo.args[1], ast.Constant)):
+            vistas.append(nodo.args[1].value)
+        elif (isinstance(nodo, ast.Call) and isinstance(nodo.func, ast.Name)
+                and nodo.func.id in FUNCIONES_REFERENCIA):
+            vistas.append(FUNCIONES_REFERENCIA[nodo.func.id])
+    return vistas
+
+def verificar_funcion(modulo, funcion):
+    errores = []
+    vistas = _vistas_usadas(funcion) + CONSUMIDORES.get(f"{modulo}.{funcion.name}", [])
+    if not vistas:
+        return errores
+
+    permitidas = CLAVES_CARGADOR | COLUMNAS_APLANADAS
+    for vista in vistas:
+        if vista not in PROYECCIONES:
+            errores.append(f"{modulo}.{funcion.name}: vista '{vista}' no registrada")
+            continue
+        permitidas |= columnas_proyectadas(PROYECCIONES[vista])
+
+    # Columnas derivadas: las que la propia función asigna
+    derivadas = set()
+    # Variables que no son filas: dicts armados en la función y, salvo en los
+    # consumidores, los parámetros (payloads del llamador)
+    no_filas = MODULOS_NO_FILA | NO_FILAS_POR_FUNCION.get(f"{modulo}.{funcion.name}", set())
+    if f"{modulo}.{funcion.name}" not in CONSUMIDORES:
+        no_filas |= {a.arg for a in funcion.args.args}
+    for nodo in ast.walk(funcion):
+        if isinstance(nodo, ast.Subscript) and isinstance(nodo.ctx, ast.Store):
+            derivadas |= set(_claves(nodo.slice))
+        elif isinstance(nodo, ast.Assign) and isinstance(nodo.value, ast.Dict):
+            no_filas |= {t.id for t in nodo.targets if isinstance(t, ast.Name)}
+
+    for nodo in ast.walk(funcion):
+        claves = []
+        if isinstance(nodo, ast.Subscript) and isinstance(nodo.ctx, ast.Load):
+            claves = _claves(nodo.slice)
+            base = nodo.value
+        elif (isinstance(nodo, ast.Call) and isinstance(nodo.func, ast.Attribute)
+                and nodo.func.attr == 'get' and nodo.args):
+            claves = _claves(nodo.args[0])
+            base = nodo.func.value
+        if not claves or _raiz(base) in no_filas:
+            continue
+        if isinstance(base, ast.Subscript) and set(_claves(base.slice)) & COLUMNAS_JSON:
+            continue
+        for clave in claves:
+            if clave not in permitidas and clave not in derivadas:
+                errores.append(
+                    f"{modulo}.py:{nodo.lineno} {funcion.name}: columna '{clave}' "
+                    f"no proyectada en {', '.join(vistas)}"
+                )
+    return errores
+
+def verificar_archivo(ruta):
+    arbol = ast.parse(ruta.read_text(encoding='utf-8'))
+    modulo = ruta.stem
+    errores = []
+
+    for nodo in ast.walk(arbol):
+        # select('*') directo
+        if (isinstance(nodo, ast.Call) and isinstance(nodo.func, ast.Attribute)
+                and nodo.func.attr == 'select'):
+            for arg in nodo.args:
+                if isinstance(arg, ast.Constant) and isinstance(arg.value, str) and '*' in arg.value:
+                    errores.append(f"{modulo}.py:{nodo.lineno}: select('*') sin proyección")
+
+    for nodo in arbol.body:
+        if isinstance(nodo, ast.FunctionDef):
+            errores += verificar_funcion(modulo, nodo)
+
+    return errores
+
+def verificar_snapshots():
+    """Las vistas servidas desde instantáneas deben estar contenidas en 'snapshot.<tabla>'"""
+    errores = []
+    for tabla, vistas in VISTAS_SNAPSHOT.items():
+        disponibles = columnas_proyectadas(PROYECCIONES[f'snapshot.{tabla}'])
+        for vista in vistas:
+            for columna in sorted(columnas_proyectadas(PROYECCIONES[vista]) - disponibles):
+                errores.append(f"snapshot.{tabla}: falta '{columna}' (usada por {vista})")
+    return errores
+
+def verificar_exenciones():
+    """Toda exención de NO_FILAS_POR_FUNCION debe nombrar una función existente"""
+    funciones = {
+        f"{ruta.stem}.{nodo.name}"
+        for ruta in ARCHIVOS
+        for nodo in ast.parse(ruta.read_text(encoding='utf-8')).body
+        if isinstance(nodo, ast.FunctionDef)
+    }
+    return [f"exención para '{nombre}': la función no existe"
+            for nombre in sorted(set(NO_FILAS_POR_FUNCION) - funciones)]
+
+def verificar():
+    """Lista de errores de proyección en todos los módulos"""
+    errores = verificar_snapshots() + verificar_exenciones()
+    for ruta in ARCHIVOS:
+        errores += verificar_archivo(ruta)
+    return errores
+
+if __name__ == "__main__":
+    errores = verificar()
+    for error in errores:
+        print(error)
+    if errores:
+        print(f"\n{len(errores)} columna(s) no proyectada(s)")
+        sys.exit(1)
+    print(f"Proyecciones OK ({len(PROYECCIONES)} vistas)")
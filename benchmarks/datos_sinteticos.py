@@ -0,0 +1,529 @@
+"""
+Generador de un conjunto de datos SST sintético y reproducible.
+
+Produce las tablas que leen los módulos (usuarios, áreas, catálogo EPP,
+checklists, riesgos, incidentes, inspecciones, hallazgos, acciones
+correctivas, asignaciones de EPP, capacitaciones con sus asistentes y
+encuestas, documentos y su historial de versiones) con la forma en que las
+devuelve PostgREST: fechas en ISO, jsonb como texto JSON y claves foráneas
+válidas. Con la misma semilla y fecha de referencia se obtiene siempre el
+mismo conjunto.
+
+`filas` fija el tamaño de las tablas transaccionales (riesgos, incidentes,
+hallazgos, asignaciones de EPP y documentos); el resto escala a partir de
+ella. Las columnas de texto usan cadenas Arrow, de modo que 1M de filas por
+tabla entra en memoria. Lo consume `benchmarks.postgrest_simulado`.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.datos_sinteticos [--filas 1000 100000] [--semilla 42]
+"""
+import argparse
+import json
+import os
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+AREAS = ["Producción", "Almacén", "Oficinas", "Mantenimiento", "Planta Alta", "Planta Baja",
+         "Área Externa", "Seguridad"]
+ROLES = ["admin", "sst", "supervisor", "gerente", "trabajador"]
+PESOS_ROLES = [0.01, 0.04, 0.10, 0.02, 0.83]
+
+NOMBRES = ["José", "María", "Luis", "Ana", "Carlos", "Rosa", "Jorge", "Carmen", "Miguel", "Lucía",
+           "Juan", "Elena", "Pedro", "Patricia", "Víctor", "Sofía", "Raúl", "Milagros", "César", "Diana"]
+APELLIDOS = ["Quispe", "Flores", "Sánchez", "Rodríguez", "García", "Huamán", "Mamani", "Chávez",
+             "Torres", "Ramírez", "Vargas", "Rojas", "Mendoza", "Castillo", "Gutiérrez", "Díaz"]
+
+PUESTOS = ["Operario de producción", "Montacarguista", "Almacenero", "Soldador", "Electricista",
+           "Mecánico", "Asistente administrativo", "Supervisor de turno", "Vigilante", "Técnico de calidad"]
+ACTIVIDADES = ["Operación de maquinaria", "Carga y descarga", "Trabajo en altura", "Soldadura",
+               "Mantenimiento eléctrico", "Digitación", "Limpieza de equipos", "Despacho"]
+TIPOS_PELIGRO = ["Físico", "Químico", "Biológico", "Ergonómico", "Psicosocial", "Mecánico"]
+PELIGROS = {
+    "Físico": ["Ruido continuo", "Iluminación deficiente", "Temperatura elevada", "Vibración"],
+    "Químico": ["Vapores de solventes", "Polvo de cemento", "Contacto con ácidos"],
+    "Biológico": ["Residuos contaminados", "Agua estancada"],
+    "Ergonómico": ["Postura forzada", "Levantamiento de cargas", "Movimientos repetitivos"],
+    "Psicosocial": ["Carga laboral excesiva", "Trabajo nocturno"],
+    "Mecánico": ["Atrapamiento en partes móviles", "Caída de objetos", "Superficie resbaladiza",
+                 "Proyección de partículas"],
+}
+CONTROLES = ["Uso de EPP", "Guardas de seguridad", "Capacitación específica", "Señalización",
+             "Pausas activas", "Procedimiento escrito de trabajo seguro", ""]
+
+TIPOS_INCIDENTE = ["incidente", "accidente", "enfermedad_laboral"]
+ESTADOS_INCIDENTE = ["reportado", "en_investigacion", "analizado", "cerrado"]
+LESIONES = ["No", "Leve", "Grave", "Crítico"]
+DANOS = ["No", "Menor", "Moderado", "Mayor"]
+DESCRIPCIONES_INCIDENTE = [
+    "Trabajador resbala en piso húmedo del pasillo", "Corte en la mano al manipular planchas",
+    "Caída de caja desde estante superior", "Golpe con montacargas en zona de despacho",
+    "Exposición a vapores durante limpieza", "Atrapamiento de dedo en faja transportadora",
+    "Quemadura leve con soldadura", "Tropiezo con cable suelto", "Dolor lumbar tras levantar carga",
+    "Proyección de viruta al ojo",
+]
+
+CATEGORIAS_HALLAZGO = ["Orden y limpieza", "EPP", "Señalización", "Extintores", "Instalaciones eléctricas",
+                       "Máquinas y herramientas", "Almacenamiento", "Primeros auxilios"]
+DESCRIPCIONES_HALLAZGO = ["Extintor con carga vencida", "Pasillo obstruido con material",
+                          "Trabajador sin lentes de seguridad", "Tablero eléctrico sin rotular",
+                          "Señal de salida deteriorada", "Guarda de máquina retirada",
+                          "Botiquín incompleto", "Apilamiento inestable de cajas"]
+
+EPP_CATALOGO = [
+    ("Casco de seguridad", "Cabeza", 24), ("Lentes de seguridad", "Ojos", 12),
+    ("Careta facial", "Ojos", 18), ("Respirador media cara", "Vías Respiratorias", 12),
+    ("Mascarilla N95", "Vías Respiratorias", 1), ("Guantes de nitrilo", "Manos", 3),
+    ("Guantes de cuero", "Manos", 6), ("Guantes dieléctricos", "Manos", 12),
+    ("Zapatos de seguridad", "Pies", 12), ("Botas de jebe", "Pies", 12),
+    ("Chaleco reflectivo", "Cuerpo", 12), ("Mameluco", "Cuerpo", 12),
+    ("Tapones auditivos", "Oídos", 3), ("Orejeras", "Oídos", 24),
+    ("Arnés de cuerpo entero", "Caídas", 36), ("Línea de vida", "Caídas", 36),
+]
+CONDICIONES_EPP = ["Nuevo", "Usado - Buena condición", "Usado - Regular", "Renovado"]
+PROVEEDORES = ["Seguridad Industrial SAC", "Protección Total EIRL", "EPP Perú SA", "Andes Safety SAC"]
+
+TEMAS = ["Inducción SST", "Uso correcto de EPP", "Trabajo en altura", "Manejo de extintores",
+         "Primeros auxilios", "Ergonomía en oficina", "Riesgo eléctrico", "Plan de emergencia",
+         "Manipulación de cargas", "Materiales peligrosos"]
+METODOS = ["Presencial", "Virtual", "Híbrido", "E-learning"]
+INSTRUCTORES = ["Ing. Paredes", "Lic. Salazar", "Ing. Cornejo", "Dra. Villanueva", "Bombero Ríos"]
+
+TIPOS_DOCUMENTO = ["manual", "procedimiento", "politica", "plan_emergencia", "informe_auditoria"]
+ESTADOS_DOCUMENTO = ["borrador", "revision", "aprobado", "obsoleto"]
+TITULOS_DOCUMENTO = ["Reglamento interno de SST", "Procedimiento de trabajo en altura",
+                     "Política de seguridad y salud", "Plan de respuesta ante emergencias",
+                     "Informe de auditoría interna", "Procedimiento de bloqueo y etiquetado",
+                     "Manual de uso de EPP", "IPERC de línea de producción"]
+
+def tamanos(filas):
+    """Filas por tabla para una escala (las tablas maestras crecen más despacio)"""
+    return {
+        'usuarios': min(max(filas // 20, 30), 50_000),
+        'checklists': 8,
+        'epp_catalogo': len(EPP_CATALOGO),
+        'riesgos': filas,
+        'incidentes': filas,
+        'acciones_correctivas': max(filas // 5, 10),
+        'inspecciones': max(filas // 4, 10),
+        'hallazgos': filas,
+        'epp_asignaciones': filas,
+        'capacitaciones': max(filas // 10, 10),
+        'asistentes_capacitacion': filas,
+        'encuestas_capacitacion': max(filas // 4, 10),
+        'documentos': filas,
+        'historial_versiones': max(filas // 5, 10),
+    }
+
+def _texto(valores):
+    return pd.array(valores, dtype="string[pyarrow]")
+
+def _elegir(rng, opciones, n, pesos=None):
+    return np.asarray(opciones, dtype=object)[rng.choice(len(opciones), size=n, p=pesos)]
+
+def _con_nulos(valores, mascara):
+    """Cadenas Arrow con NULL donde `mascara` es True"""
+    serie = pd.Series(valores, dtype="string[pyarrow]")
+    serie[mascara] = pd.NA
+    return serie.array
+
+def _fechas(rng, n, desde, hasta):
+    """Fechas ISO (AAAA-MM-DD) uniformes en [desde, hasta]"""
+    dias = rng.integers(0, (hasta - desde).days + 1, size=n)
+    return (np.datetime64(desde) + dias).astype(str)
+
+def _marcas(rng, n, desde, hasta):
+    """Marcas de tiempo ISO con zona (timestamptz) uniformes en [desde, hasta]"""
+    segundos = rng.integers(0, int((hasta - desde).total_seconds()) + 1, size=n)
+    marcas = np.datetime64(desde, 's') + segundos.astype('timedelta64[s]')
+    return np.char.add(np.datetime_as_string(marcas, unit='s'), '+00:00')
+
+def _dia(marcas):
+    """Fecha (datetime64[D]) de marcas ISO con zona"""
+    return marcas.astype('U10').astype('datetime64[D]')
+
+def _sumar_dias(fechas, dias):
+    return (fechas.astype('datetime64[D]') + np.asarray(dias).astype('timedelta64[D]')).astype(str)
+
+def _codigos(prefijo, ids):
+    return _texto(prefijo + pd.Series(ids).astype(str).str.zfill(6))
+
+def _ids_aleatorios(rng, ids, n):
+    return ids[rng.integers(0, len(ids), size=n)]
+
+def _usuarios(rng, n, creado_desde, ahora):
+    ids = np.arange(1, n + 1)
+    roles = _elegir(rng, ROLES, n, PESOS_ROLES)
+    roles[:len(ROLES)] = ROLES  # al menos un usuario por rol; el 1 es admin
+    nombres = _elegir(rng, NOMBRES, n) + " " + _elegir(rng, APELLIDOS, n) + " " + _elegir(rng, APELLIDOS, n)
+    areas = _elegir(rng, AREAS, n)
+    marcas = _marcas(rng, n, creado_desde, ahora)
+
+    return pd.DataFrame({
+        'id': ids,
+        'created_at': _texto(marcas),
+        'updated_at': _texto(marcas),
+        'email': _texto([f"usuario{i}@empresa.pe" for i in ids]),
+        'nombre_completo': _texto(nombres),
+        'area': _texto(areas),
+        'rol': _texto(roles),
+        'activo': pd.array(rng.random(n) > 0.05, dtype="boolean"),
+        'password_hash': _texto(np.full(n, "$argon2id$v=19$m=65536,t=3,p=4$sintetico$sintetico")),
+    })
+
+def _epp_catalogo():
+    n = len(EPP_CATALOGO)
+    nombres, categorias, vidas = zip(*EPP_CATALOGO)
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'nombre': _texto(nombres),
+        'descripcion': _texto([f"{nombre} certificado" for nombre in nombres]),
+        'categoria': _texto(categorias),
+        'vida_util_meses': np.asarray(vidas),
+        'certificacion': _texto(["ANSI / NTP"] * n),
+        'requiere_mantenimiento': pd.array([c == "Caídas" for c in categorias], dtype="boolean"),
+        'foto_url': _con_nulos([None] * n, np.ones(n, dtype=bool)),
+        'foto_miniatura_url': _con_nulos([None] * n, np.ones(n, dtype=bool)),
+        'activo': pd.array([True] * n, dtype="boolean"),
+    })
+
+def _checklists(n, ahora):
+    items = json.dumps([
+        {'pregunta': f"¿{categoria} conforme?", 'categoria': categoria} for categoria in CATEGORIAS_HALLAZGO
+    ], ensure_ascii=False)
+    marca = ahora.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'created_at': _texto([marca] * n),
+        'nombre': _texto([f"Checklist {area}" for area in (AREAS * n)[:n]]),
+        'items': _texto([items] * n),
+    })
+
+def _riesgos(rng, n, usuarios, desde, ahora):
+    ids = np.arange(1, n + 1)
+    tipos = _elegir(rng, TIPOS_PELIGRO, n)
+    peligros = np.empty(n, dtype=object)
+    for tipo in TIPOS_PELIGRO:
+        mascara = tipos == tipo
+        peligros[mascara] = _elegir(rng, PELIGROS[tipo], int(mascara.sum()))
+    probabilidad = rng.integers(1, 6, size=n)
+    severidad = rng.integers(1, 6, size=n)
+    creado = _marcas(rng, n, desde, ahora)
+
+    return pd.DataFrame({
+        'id': ids,
+        'created_at': _texto(creado),
+        'updated_at': _texto(creado),
+        'codigo': _codigos("R-", ids),
+        'area': _texto(_elegir(rng, AREAS, n)),
+        'puesto_trabajo': _texto(_elegir(rng, PUESTOS, n)),
+        'actividad': _texto(_elegir(rng, ACTIVIDADES, n)),
+        'peligro': _texto(peligros),
+        'tipo_peligro': _texto(tipos),
+        'probabilidad': probabilidad,
+        'severidad': severidad,
+        'nivel_riesgo': probabilidad * severidad,
+        'controles_actuales': _texto(_elegir(rng, CONTROLES, n)),
+        'estado': _texto(_elegir(rng, ["pendiente", "en_mitigacion", "controlado"], n, [0.45, 0.3, 0.25])),
+        'responsable_id': _ids_aleatorios(rng, usuarios, n),
+    })
+
+def _incidentes(rng, n, usuarios, nombres, desde, ahora):
+    ids = np.arange(1, n + 1)
+    fecha_hora = _marcas(rng, n, desde, ahora)
+    lesiones = rng.choice(len(LESIONES), size=n, p=[0.5, 0.3, 0.15, 0.05])
+    danos = rng.choice(len(DANOS), size=n, p=[0.4, 0.35, 0.2, 0.05])
+    gravedad = lesiones * 3 + danos
+    consecuencias = [
+        f'{{"lesiones": "{LESIONES[l]}", "danos": "{DANOS[d]}", "gravedad": {g}}}'
+        for l, d, g in zip(lesiones, danos, gravedad)
+    ]
+    estados = _elegir(rng, ESTADOS_INCIDENTE, n, [0.2, 0.2, 0.15, 0.45])
+    cierre = _sumar_dias(_dia(fecha_hora), rng.integers(1, 60, size=n))
+    reportado_por = _ids_aleatorios(rng, usuarios, n)
+
+    return pd.DataFrame({
+        'id': ids,
+        'created_at': _texto(fecha_hora),
+        'updated_at': _texto(fecha_hora),
+        'codigo': _codigos("INC-", ids),
+        'tipo': _texto(_elegir(rng, TIPOS_INCIDENTE, n, [0.6, 0.3, 0.1])),
+        'fecha_hora': _texto(fecha_hora),
+        'area': _texto(_elegir(rng, AREAS, n)),
+        'puesto_trabajo': _texto(_elegir(rng, PUESTOS, n)),
+        'trabajador_nombre': _texto(nombres[reportado_por - 1]),
+        'descripcion': _texto(_elegir(rng, DESCRIPCIONES_INCIDENTE, n)),
+        'consecuencias': _texto(consecuencias),
+        'testigos': _texto(np.full(n, "[]")),
+        'evidencia': _texto(np.full(n, "[]")),
+        'estado': _texto(estados),
+        'nivel_riesgo': gravedad,
+        'reportado_por': reportado_por,
+        'fecha_cierre': _con_nulos(cierre, estados != "cerrado"),
+        'informe_inicial': _con_nulos(np.full(n, ""), np.ones(n, dtype=bool)),
+    })
+
+def _acciones_correctivas(rng, n, incidentes, usuarios, desde, ahora):
+    ids = np.arange(1, n + 1)
+    creado = _marcas(rng, n, desde, ahora)
+    return pd.DataFrame({
+        'id': ids,
+        'created_at': _texto(creado),
+        'updated_at': _texto(creado),
+        'incidente_id': _ids_aleatorios(rng, incidentes, n),
+        'descripcion': _texto(_elegir(rng, CONTROLES[:-1], n)),
+        'responsable_id': _ids_aleatorios(rng, usuarios, n),
+        'fecha_limite': _texto(_sumar_dias(_dia(creado),
+                                           rng.integers(7, 90, size=n))),
+        'estado': _texto(_elegir(rng, ["abierta", "en_progreso", "implementada", "verificada"], n)),
+        'porcentaje_avance': rng.integers(0, 11, size=n) * 10,
+        'comentarios': _con_nulos(np.full(n, ""), np.ones(n, dtype=bool)),
+        'evidencia_url': _con_nulos(np.full(n, ""), np.ones(n, dtype=bool)),
+    })
+
+def _inspecciones(rng, n, checklists, usuarios, desde, hoy):
+    ids = np.arange(1, n + 1)
+    programada = _fechas(rng, n, desde, hoy + timedelta(days=90))
+    estados = np.where(programada > hoy.isoformat(), "programada",
+                       _elegir(rng, ["completada", "en_proceso", "programada"], n, [0.85, 0.05, 0.1]))
+    realizada = _con_nulos(programada, estados != "completada")
+
+    return pd.DataFrame({
+        'id': ids,
+        'created_at': _texto(np.char.add(programada, 'T08:00:00+00:00')),
+        'updated_at': _texto(np.char.add(programada, 'T08:00:00+00:00')),
+        'checklist_id': _ids_aleatorios(rng, checklists, n),
+        'area': _texto(_elegir(rng, AREAS, n)),
+        'fecha_programada': _texto(programada),
+        'fecha_realizada': realizada,
+        'estado': _texto(estados),
+        'supervisor_id': _ids_aleatorios(rng, usuarios, n),
+    })
+
+def _hallazgos(rng, n, inspecciones, usuarios, desde, ahora):
+    ids = np.arange(1, n + 1)
+    creado = _marcas(rng, n, desde, ahora)
+    dia = _dia(creado)
+    estados = _elegir(rng, ["abierto", "en_proceso", "cerrado"], n, [0.3, 0.15, 0.55])
+
+    return pd.DataFrame({
+        'id': ids,
+        'created_at': _texto(creado),
+        'updated_at': _texto(creado),
+        'inspeccion_id': _ids_aleatorios(rng, inspecciones, n),
+        'descripcion': _texto(_elegir(rng, DESCRIPCIONES_HALLAZGO, n)),
+        'categoria': _texto(_elegir(rng, CATEGORIAS_HALLAZGO, n)),
+        'evidencia': _texto(np.full(n, "[]")),
+        'estado': _texto(estados),
+        'responsable_id': _ids_aleatorios(rng, usuarios, n),
+        'fecha_limite': _texto(_sumar_dias(dia, rng.integers(7, 45, size=n))),
+        'fecha_cierre': _con_nulos(_sumar_dias(dia, rng.integers(1, 60, size=n)), estados != "cerrado"),
+        'comentarios': _con_nulos(np.full(n, ""), np.ones(n, dtype=bool)),
+    })
+
+def _epp_asignaciones(rng, n, usuarios, catalogo, desde, hoy):
+    ids = np.arange(1, n + 1)
+    epp = rng.integers(0, len(catalogo), size=n)
+    vida = catalogo['vida_util_meses'].to_numpy()[epp]
+    entrega = _fechas(rng, n, desde, hoy)
+    vencimiento = _sumar_dias(entrega, vida * 30)
+    vencido = vencimiento < hoy.isoformat()
+    estados = np.where(vencido, _elegir(rng, ["vencido", "renovado", "activo"], n, [0.5, 0.4, 0.1]), "activo")
+    devolucion = _con_nulos(vencimiento, estados != "renovado")
+    marcas = np.char.add(entrega, 'T09:00:00+00:00')
+
+    return pd.DataFrame({
+        'id': ids,
+        'created_at': _texto(marcas),
+        'updated_at': _texto(marcas),
+        'trabajador_id': _ids_aleatorios(rng, usuarios, n),
+        'epp_id': catalogo['id'].to_numpy()[epp],
+        'fecha_entrega': _texto(entrega),
+        'fecha_vencimiento': _texto(vencimiento),
+        'fecha_devolucion': devolucion,
+        'estado': _texto(estados),
+        'condicion': _texto(_elegir(rng, CONDICIONES_EPP, n, [0.7, 0.15, 0.05, 0.1])),
+        'numero_serie': _texto([f"SN-{i:08d}" for i in ids]),
+        'proveedor': _texto(_elegir(rng, PROVEEDORES, n)),
+        'orden_compra': _texto([f"OC-{2024 + i % 3}-{i % 5000:04d}" for i in ids]),
+        'foto_entrega_url': _con_nulos(np.full(n, ""), np.ones(n, dtype=bool)),
+        'asignado_por': _ids_aleatorios(rng, usuarios[:max(len(usuarios) // 10, 1)], n),
+        'renovado_de': pd.array([None] * n, dtype="Int64"),
+    })
+
+def _capacitaciones(rng, n, desde, hoy):
+    ids = np.arange(1, n + 1)
+    programada = _fechas(rng, n, desde, hoy + timedelta(days=120))
+    estados = np.where(programada > hoy.isoformat(), "programada",
+                       _elegir(rng, ["realizada", "cancelada"], n, [0.9, 0.1]))
+    marcas = np.char.add(programada, 'T08:00:00+00:00')
+
+    return pd.DataFrame({
+        'id': ids,
+        'created_at': _texto(marcas),
+        'updated_at': _texto(marcas),
+        'codigo': _codigos("CAP-", ids),
+        'tema': _texto(_elegir(rng, TEMAS, n)),
+        'fecha_programada': _texto(programada),
+        'instructor': _texto(_elegir(rng, INSTRUCTORES, n)),
+        'metodo': _texto(_elegir(rng, METODOS, n)),
+        'area_destino': _texto(_elegir(rng, AREAS, n)),
+        'duracion_horas': rng.integers(1, 9, size=n),
+        'estado': _texto(estados),
+    })
+
+def _asistentes(rng, n, capacitaciones, usuarios):
+    # Pares únicos (capacitacion_id, trabajador_id), como exige la restricción de la tabla
+    pares = np.unique(np.stack([
+        _ids_aleatorios(rng, capacitaciones, n), _ids_aleatorios(rng, usuarios, n)
+    ], axis=1), axis=0)
+    m = len(pares)
+    asistio = rng.random(m) > 0.15
+
+    return pd.DataFrame({
+        'id': np.arange(1, m + 1),
+        'capacitacion_id': pares[:, 0],
+        'trabajador_id': pares[:, 1],
+        'asistio': pd.array(asistio, dtype="boolean"),
+        'calificacion': pd.array(np.where(asistio, rng.integers(10, 21, size=m), 0), dtype="Int64"),
+        'feedback': _con_nulos(np.full(m, ""), np.ones(m, dtype=bool)),
+        'fecha_asistencia': _con_nulos(np.full(m, ""), np.ones(m, dtype=bool)),
+    })
+
+def _encuestas(rng, n, capacitaciones, usuarios):
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'capacitacion_id': _ids_aleatorios(rng, capacitaciones, n),
+        'trabajador_id': _ids_aleatorios(rng, usuarios, n),
+        'satisfaccion': rng.integers(1, 6, size=n),
+        'utilidad': _texto(_elegir(rng, ["Sí, completamente", "Más o menos", "No, fue confuso"], n)),
+        'comentarios': _con_nulos(np.full(n, ""), np.ones(n, dtype=bool)),
+    })
+
+def _documentos(rng, n, usuarios, desde, hoy):
+    ids = np.arange(1, n + 1)
+    tipos = _elegir(rng, TIPOS_DOCUMENTO, n)
+    estados = _elegir(rng, ESTADOS_DOCUMENTO, n, [0.15, 0.15, 0.6, 0.1])
+    creado = _marcas(rng, n, desde, desde + (hoy - desde))
+    titulos = _elegir(rng, TITULOS_DOCUMENTO, n)
+
+    return pd.DataFrame({
+        'id': ids,
+        'created_at': _texto(creado),
+        'updated_at': _texto(creado),
+        'codigo': _codigos("DOC-", ids),
+        'titulo': _texto(titulos),
+        'tipo': _texto(tipos),
+        'version': _texto([f"{v}.0" for v in rng.integers(1, 6, size=n)]),
+        'area': _texto(_elegir(rng, AREAS, n)),
+        'estado': _texto(estados),
+        'aprobado': pd.array(estados == "aprobado", dtype="boolean"),
+        'keywords': _texto(np.char.lower(titulos.astype(str))),
+        'fecha_vigencia': _texto(_fechas(rng, n, hoy - timedelta(days=180), hoy + timedelta(days=540))),
+        'archivo_url': _texto([f"https://sintetico.supabase.co/storage/v1/object/public/sst-documentos/"
+                               f"documentos/{t}/{i}.pdf" for t, i in zip(tipos, ids)]),
+        'observaciones': _con_nulos(np.full(n, ""), np.ones(n, dtype=bool)),
+        'responsable_id': _ids_aleatorios(rng, usuarios, n),
+    })
+
+def _historial_versiones(rng, n, documentos, desde, hoy):
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'documento_id': _ids_aleatorios(rng, documentos, n),
+        'version': _texto([f"{v}.0" for v in rng.integers(1, 5, size=n)]),
+        'fecha_reemplazo': _texto(_fechas(rng, n, desde, hoy)),
+        'archivo_url': _con_nulos(np.full(n, ""), np.ones(n, dtype=bool)),
+    })
+
+def generar(filas=1000, semilla=42, hoy=None):
+    """
+    Conjunto de datos SST sintético
+
+    Args:
+        filas: Filas de las tablas transaccionales (1k a 1M)
+        semilla: Semilla del generador (mismo valor, mismos datos)
+        hoy: Fecha de referencia (por defecto hoy); los datos cubren los
+             dos años anteriores y las programaciones los meses siguientes
+
+    Returns:
+        dict tabla -> DataFrame con columnas como las devuelve PostgREST
+    """
+    rng = np.random.default_rng(semilla)
+    hoy = hoy or date.today()
+    desde = hoy - timedelta(days=730)
+    desde_marca = pd.Timestamp(desde).to_pydatetime()
+    ahora = pd.Timestamp(hoy).to_pydatetime() + timedelta(hours=18)
+    n = tamanos(filas)
+
+    usuarios = _usuarios(rng, n['usuarios'], desde_marca - timedelta(days=365), ahora)
+    ids_usuarios = usuarios['id'].to_numpy()
+    nombres = usuarios['nombre_completo'].to_numpy(dtype=object)
+    catalogo = _epp_catalogo()
+    checklists = _checklists(n['checklists'], ahora)
+
+    tablas = {
+        'areas': pd.DataFrame({'id': np.arange(1, len(AREAS) + 1), 'area': _texto(AREAS)}),
+        'usuarios': usuarios,
+        'epp_catalogo': catalogo,
+        'checklists': checklists,
+        'riesgos': _riesgos(rng, n['riesgos'], ids_usuarios, desde_marca, ahora),
+        'incidentes': _incidentes(rng, n['incidentes'], ids_usuarios, nombres, desde_marca, ahora),
+    }
+    tablas['acciones_correctivas'] = _acciones_correctivas(
+        rng, n['acciones_correctivas'], tablas['incidentes']['id'].to_numpy(), ids_usuarios, desde_marca, ahora
+    )
+    tablas['inspecciones'] = _inspecciones(
+        rng, n['inspecciones'], checklists['id'].to_numpy(), ids_usuarios, desde, hoy
+    )
+    tablas['hallazgos'] = _hallazgos(
+        rng, n['hallazgos'], tablas['inspecciones']['id'].to_numpy(), ids_usuarios, desde_marca, ahora
+    )
+    tablas['epp_asignaciones'] = _epp_asignaciones(rng, n['epp_asignaciones'], ids_usuarios, catalogo, desde, hoy)
+    tablas['capacitaciones'] = _capacitaciones(rng, n['capacitaciones'], desde, hoy)
+    ids_capacitaciones = tablas['capacitaciones']['id'].to_numpy()
+    tablas['asistentes_capacitacion'] = _asistentes(rng, n['asistentes_capacitacion'], ids_capacitaciones, ids_usuarios)
+    tablas['encuestas_capacitacion'] = _encuestas(rng, n['encuestas_capacitacion'], ids_capacitaciones, ids_usuarios)
+    tablas['documentos'] = _documentos(rng, n['documentos'], ids_usuarios, desde, hoy)
+    tablas['historial_versiones'] = _historial_versiones(
+        rng, n['historial_versiones'], tablas['documentos']['id'].to_numpy(), desde, hoy
+    )
+    return tablas
+
+def guardar(tablas, carpeta):
+    """Guardar el conjunto en `carpeta` (un Parquet por tabla, con sus tipos)"""
+    os.makedirs(carpeta, exist_ok=True)
+    for nombre, df in tablas.items():
+        df.to_parquet(os.path.join(carpeta, f"{nombre}.parquet"), index=False)
+
+def cargar(carpeta):
+    """Conjunto guardado con `guardar`"""
+    tablas = {}
+    for archivo in sorted(os.listdir(carpeta)):
+        if archivo.endswith(".parquet"):
+            df = pd.read_parquet(os.path.join(carpeta, archivo))
+            # Parquet guarda 'string' sin el backend: se vuelve a cadenas Arrow
+            tablas[os.path.splitext(archivo)[0]] = df.astype(
+                {columna: "string[pyarrow]" for columna in df.select_dtypes("string").columns}
+            )
+    return tablas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, nargs="+", default=[1000, 100_000])
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    for filas in args.filas:
+        inicio = time.perf_counter()
+        tablas = generar(filas, args.semilla)
+        duracion = time.perf_counter() - inicio
+
+        print(f"\nfilas={filas}  generado en {duracion:.1f} s")
+        print(f"{'tabla':<24} {'filas':>10} {'MB':>8}")
+        for nombre, df in tablas.items():
+            print(f"{nombre:<24} {len(df):>10} {df.memory_usage(deep=True).sum() / 2**20:>8.1f}")
+
+if __name__ == "__main__":
+    main()
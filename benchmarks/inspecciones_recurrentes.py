@@ -0,0 +1,101 @@
+"""
+Benchmark: programar inspecciones recurrentes fila por fila vs. en bloque.
+
+Compara `guardar_inspeccion_programada` por cada fecha (camino anterior) con
+`programar_inspecciones_masivo` (un insert). PostgREST y n8n se simulan con
+una latencia fija por llamada HTTP, de modo que el resultado refleja el número
+de viajes de red y no el rendimiento de una base real.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.inspecciones_recurrentes [--latencia-ms 40] [--fechas 52 104]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+
+os.environ["N8N_OUTBOX_DB"] = os.path.join(tempfile.mkdtemp(), "outbox.db")
+os.environ.setdefault("N8N_WEBHOOK_URL", "http://n8n.local/webhook")
+os.environ["N8N_LOTE_LATENCIA_SEG"] = "0.1"
+
+from app.modules import inspecciones
+from app.utils import n8n_client
+
+class _Respuesta:
+    def __init__(self, data):
+        self.data = data
+
+class _ConsultaSimulada:
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.filas = []
+
+    def insert(self, filas):
+        self.filas = filas if isinstance(filas, list) else [filas]
+        return self
+
+    def execute(self):
+        self.cliente.llamadas += 1
+        time.sleep(self.cliente.latencia)
+        datos = []
+        for fila in self.filas:
+            self.cliente.siguiente_id += 1
+            datos.append({**fila, 'id': self.cliente.siguiente_id})
+        return _Respuesta(datos)
+
+class _ClienteSimulado:
+    def __init__(self, latencia):
+        self.latencia = latencia
+        self.llamadas = 0
+        self.siguiente_id = 0
+
+    def table(self, nombre):
+        return _ConsultaSimulada(self)
+
+def _esperar_outbox():
+    while n8n_client.estado_outbox().get('pendiente'):
+        time.sleep(0.05)
+
+def medir(camino, fechas, latencia):
+    """(segundos del submit, llamadas PostgREST, POSTs a n8n)"""
+    cliente = _ClienteSimulado(latencia)
+    envios = []
+
+    def enviar_simulado(ruta, cuerpo):
+        time.sleep(latencia)
+        envios.append(ruta)
+
+    inspecciones.get_supabase_client = lambda: cliente
+    n8n_client._enviar = enviar_simulado
+
+    base = {'checklist_id': 1, 'area': 'Producción', 'supervisor_id': 1, 'estado': 'programada'}
+
+    inicio = time.perf_counter()
+    if camino == "fila_por_fila":
+        for fecha in fechas:
+            inspecciones.guardar_inspeccion_programada({**base, 'fecha_programada': fecha})
+    else:
+        inspecciones.programar_inspecciones_masivo(base, fechas)
+    duracion = time.perf_counter() - inicio
+
+    _esperar_outbox()
+    return duracion, cliente.llamadas, len(envios)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latencia-ms", type=float, default=40)
+    parser.add_argument("--fechas", type=int, nargs="+", default=[52, 104])
+    args = parser.parse_args()
+
+    latencia = args.latencia_ms / 1000
+    print(f"{'fechas':>6} {'camino':<14} {'submit (ms)':>12} {'PostgREST':>10} {'n8n POST':>9}")
+
+    for n in args.fechas:
+        fechas = inspecciones.generar_fechas_recurrencia(date.today(), "semanal", n)
+        for camino in ("fila_por_fila", "masivo"):
+            duracion, llamadas, envios = medir(camino, fechas, latencia)
+            print(f"{n:>6} {camino:<14} {duracion * 1000:>12.1f} {llamadas:>10} {envios:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Benchmark de carga y dibujo de los módulos, sin red, con AppTest.
+
+Cada punto de entrada (ENTRADAS) se ejecuta headless con
+`streamlit.testing.v1.AppTest` contra el cliente simulado
+(`benchmarks.postgrest_simulado`) cargado con el conjunto sintético
+(`benchmarks.datos_sinteticos`) a varias escalas. Cada combinación de escala
+y punto de entrada corre en un proceso nuevo (cachés vacías y pico de memoria
+propio) que ejecuta la página --repeticiones veces: la primera es la carga en
+frío (cachés de Streamlit, instantáneas locales y datos de referencia vacíos)
+y las demás, en caliente (sesión nueva con las cachés del proceso llenas).
+
+Por ejecución se registra el tiempo de pared, las consultas PostgREST/RPC, los
+bytes de las respuestas y el pico de RSS por encima del que había antes de
+ejecutar (el conjunto de datos ya cargado no cuenta). Con --linea-base se
+compara contra un JSON guardado con --guardar-linea-base: las regresiones
+por encima de --tolerancia (y los errores de una página) se listan y el
+proceso termina con código 1, para usarlo como control antes de desplegar.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.modulos [--filas 1000 10000 100000] [--repeticiones 3]
+        [--entradas dashboard.mostrar ...] [--linea-base benchmarks/linea_base_modulos.json]
+        [--guardar-linea-base benchmarks/linea_base_modulos.json] [--json salida.json]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+# punto de entrada -> (módulo, función)
+ENTRADAS = {
+    'dashboard.mostrar': ('app.modules.dashboard', 'mostrar'),
+    'riesgos.listar_riesgos': ('app.modules.riesgos', 'listar_riesgos'),
+    'epp.dashboard_epp': ('app.modules.epp', 'dashboard_epp'),
+    'incidentes.dashboard_incidentes': ('app.modules.incidentes', 'dashboard_incidentes'),
+    'reportes.generar_reporte_excel': ('app.modules.reportes', 'generar_reporte_excel'),
+    'reportes.generar_reporte_pdf': ('app.modules.reportes', 'generar_reporte_pdf'),
+    'documental.repositorio_documental': ('app.modules.documental', 'repositorio_documental'),
+}
+
+METRICAS = ['segundos', 'consultas', 'bytes_respuesta', 'rss_extra_mb']
+
+# Margen absoluto además de la tolerancia relativa (ruido de medición); las
+# consultas son deterministas y cualquier aumento cuenta como regresión
+MARGENES = {'segundos': 0.02, 'consultas': 0, 'bytes_respuesta': 0, 'rss_extra_mb': 16}
+
+# Los módulos informan las excepciones que capturan con st.error("Error ...");
+# otros st.error son indicadores de estado (p.ej. "🔴 VENCIDO") y no cuentan
+_MENSAJE_ERROR = re.compile(r"^(❌\s*)?(Error|No se pud)")
+
+def _pagina(modulo, funcion, usuario):
+    """Script que ejecuta AppTest: sesión autenticada y un punto de entrada"""
+    import importlib
+    from datetime import date, timedelta
+    import streamlit as st
+
+    st.session_state.usuario = usuario
+    modulo = importlib.import_module(modulo)
+
+    if funcion.startswith('generar_reporte'):
+        # Exportación "Completo" con los filtros por defecto de Reportes
+        from app.utils.datos_referencia import obtener_areas
+        filtros = {
+            'fecha_inicio': date.today() - timedelta(days=90),
+            'fecha_fin': date.today(),
+            'areas': obtener_areas(),
+            'tipos_incidente': ["incidente", "accidente", "enfermedad_laboral"],
+            'nivel_riesgo_min': 1,
+            'solo_fechas_limite': False
+        }
+        data = modulo.cargar_datos_reporte(filtros)
+        archivo = getattr(modulo, funcion)(data, "Completo", filtros)
+        st.caption(f"{archivo['filename']}: {len(archivo['data'])} bytes")
+    else:
+        getattr(modulo, funcion)(usuario)
+
+def _memoria_mb(campo):
+    """VmRSS / VmHWM del proceso en MB (Linux)"""
+    with open("/proc/self/status") as f:
+        return int(re.search(rf"{campo}:\s+(\d+)", f.read()).group(1)) / 1024
+
+def _reiniciar_pico_rss():
+    """Llevar el pico de RSS (VmHWM) al RSS actual; False si el sistema no lo permite"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def _pico_rss_mb():
+    try:
+        return _memoria_mb("VmHWM")
+    except OSError:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 2**20 if sys.platform == "darwin" else pico / 1024
+
+def _ejecutar_entrada(entrada, carpeta, repeticiones, latencia, timeout):
+    """(en el proceso hijo) Ejecutar un punto de entrada `repeticiones` veces"""
+    import importlib
+    from streamlit.testing.v1 import AppTest
+    from benchmarks import datos_sinteticos, postgrest_simulado
+
+    cliente = postgrest_simulado.ClienteSimulado(datos_sinteticos.cargar(carpeta), latencia=latencia)
+    postgrest_simulado.instalar(cliente)
+
+    admin = cliente.tablas['usuarios'].iloc[0]
+    usuario = {campo: admin[campo] for campo in ('email', 'nombre_completo', 'rol', 'area')}
+    usuario['id'] = int(admin['id'])
+
+    modulo, funcion = ENTRADAS[entrada]
+    # La importación se mide aparte (benchmarks.tiempo_importacion)
+    importlib.import_module(modulo)
+
+    corridas = []
+    for _ in range(repeticiones):
+        cliente.reiniciar_contadores()
+        pico_confiable = _reiniciar_pico_rss()
+        rss_inicio = _pico_rss_mb()
+
+        app = AppTest.from_function(_pagina, args=(modulo, funcion, usuario), default_timeout=timeout)
+        inicio = time.perf_counter()
+        try:
+            app.run()
+            errores = [e.message for e in app.exception] + [
+                e.value for e in app.error if _MENSAJE_ERROR.match(e.value)
+            ]
+        except Exception as e:
+            errores = [f"{type(e).__name__}: {e}"]
+        duracion = time.perf_counter() - inicio
+
+        contadores = cliente.contadores()
+        corridas.append({
+            'segundos': duracion,
+            'consultas': contadores['consultas'],
+            'bytes_respuesta': contadores['bytes_respuesta'],
+            'rss_extra_mb': (_pico_rss_mb() - rss_inicio) if pico_confiable else None,
+            'detalle': contadores['detalle'],
+            'errores': errores,
+        })
+
+    return corridas
+
+def _resumir(corridas):
+    """Frío = primera ejecución; caliente = mediana de las siguientes"""
+    resumen = {'frio': corridas[0], 'caliente': None}
+    if len(corridas) > 1:
+        resto = corridas[1:]
+        resumen['caliente'] = {
+            metrica: statistics.median(c[metrica] for c in resto) if resto[0][metrica] is not None else None
+            for metrica in METRICAS
+        }
+        resumen['caliente']['errores'] = sorted({e for c in resto for e in c['errores']})
+    return resumen
+
+def preparar_datos(filas, semilla, carpeta_base):
+    """Carpeta con el conjunto sintético de la escala (se genera una vez por día y semilla)"""
+    from benchmarks import datos_sinteticos
+
+    carpeta = os.path.join(carpeta_base, f"{filas}-{semilla}-{date.today().isoformat()}")
+    marca = os.path.join(carpeta, ".completo")
+    if not os.path.exists(marca):
+        datos_sinteticos.guardar(datos_sinteticos.generar(filas, semilla), carpeta)
+        open(marca, "w").close()
+    return carpeta
+
+def medir(entrada, carpeta, args):
+    """Lanzar el proceso hijo de un punto de entrada y devolver su resumen"""
+    temporal = tempfile.mkdtemp(prefix="sst_bench_")
+    entorno = {
+        **os.environ,
+        'SNAPSHOT_DIR': os.path.join(temporal, "snapshots"),
+        'SNAPSHOTS_ACTIVOS': "false" if args.sin_instantaneas else "true",
+        'REALTIME_ACTIVO': "false",
+        'N8N_OUTBOX_DB': os.path.join(temporal, "outbox.db"),
+        'SUBIDA_COLA_DB': os.path.join(temporal, "cola_subidas.db"),
+        'SUBIDA_SPOOL_DIR': os.path.join(temporal, "spool"),
+        'ALMACENAMIENTO_INDICE_DB': os.path.join(temporal, "indice_contenido.db"),
+    }
+    try:
+        proceso = subprocess.run(
+            [sys.executable, "-m", "benchmarks.modulos", "--hijo", entrada, "--datos", carpeta,
+             "--repeticiones", str(args.repeticiones), "--latencia-ms", str(args.latencia_ms),
+             "--timeout-seg", str(args.timeout_seg)],
+            capture_output=True, text=True, env=entorno
+        )
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+    if proceso.returncode != 0:
+        error = proceso.stderr.strip().splitlines()[-1:] or ["sin salida"]
+        corrida = {metrica: None for metrica in METRICAS}
+        return {'frio': {**corrida, 'detalle': {}, 'errores': error}, 'caliente': None}
+
+    return _resumir(json.loads(proceso.stdout.strip().splitlines()[-1]))
+
+def _valor(resultado, fase, metrica):
+    return (resultado.get(fase) or {}).get(metrica)
+
+def comparar(resultados, linea_base, tolerancia):
+    """Lista de regresiones (texto) respecto de la línea base"""
+    anteriores = {(r['filas'], r['entrada']): r for r in linea_base['resultados']}
+    regresiones = []
+
+    for resultado in resultados:
+        anterior = anteriores.get((resultado['filas'], resultado['entrada']))
+        if anterior is None:
+            continue
+        for fase in ('frio', 'caliente'):
+            for metrica in METRICAS:
+                actual, base = _valor(resultado, fase, metrica), _valor(anterior, fase, metrica)
+                if actual is None or base is None:
+                    continue
+                umbral = base if metrica == 'consultas' else base * (1 + tolerancia) + MARGENES[metrica]
+                if actual > umbral:
+                    regresiones.append(
+                        f"{resultado['entrada']} ({resultado['filas']} filas, {fase}): "
+                        f"{metrica} {base:.6g} -> {actual:.6g}"
+                    )
+    return regresiones
+
+def _ms(valor):
+    return f"{valor * 1000:.0f}" if valor is not None else "-"
+
+def _entero(valor):
+    return f"{valor:.0f}" if valor is not None else "-"
+
+def _mostrar(resultado):
+    frio, caliente = resultado['frio'], resultado['caliente'] or {}
+    bytes_frio = frio['bytes_respuesta']
+    rss = frio['rss_extra_mb']
+    print(
+        f"{resultado['filas']:>8} {resultado['entrada']:<34} {_ms(frio['segundos']):>9} "
+        f"{_ms(caliente.get('segundos')):>9} {_entero(frio['consultas']):>6} "
+        f"{_entero(caliente.get('consultas')):>6} "
+        f"{f'{bytes_frio / 2**20:.2f}' if bytes_frio is not None else '-':>8} "
+        f"{f'{rss:.0f}' if rss is not None else '-':>8}"
+    )
+    for error in sorted(set(frio['errores']) | set(caliente.get('errores', []))):
+        print(f"{'':>8} ⚠️  {error[:150]}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--entradas", nargs="+", choices=list(ENTRADAS), default=list(ENTRADAS))
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--latencia-ms", type=float, default=0)
+    parser.add_argument("--timeout-seg", type=float, default=600)
+    parser.add_argument("--sin-instantaneas", action="store_true",
+                        help="Leer de PostgREST en vez de las instantáneas locales (SNAPSHOTS_ACTIVOS=false)")
+    parser.add_argument("--datos", default=os.path.join(tempfile.gettempdir(), "sst_benchmark_datos"),
+                        help="Carpeta donde se guardan los conjuntos sintéticos generados")
+    parser.add_argument("--linea-base", help="JSON con resultados anteriores a comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="Aumento relativo admitido antes de marcar una regresión")
+    parser.add_argument("--guardar-linea-base", help="Guardar los resultados como nueva línea base")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    parser.add_argument("--hijo", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        corridas = _ejecutar_entrada(args.hijo, args.datos, args.repeticiones,
+                                     args.latencia_ms / 1000, args.timeout_seg)
+        print(json.dumps(corridas, default=str))
+        return
+
+    configuracion = {
+        'semilla': args.semilla,
+        'repeticiones': args.repeticiones,
+        'latencia_ms': args.latencia_ms,
+        'instantaneas': not args.sin_instantaneas,
+    }
+    resultados = []
+
+    print(f"{'filas':>8} {'entrada':<34} {'frío ms':>9} {'cal. ms':>9} {'q frío':>6} {'q cal.':>6} "
+          f"{'MB resp':>8} {'RSS+ MB':>8}")
+    for filas in args.filas:
+        carpeta = preparar_datos(filas, args.semilla, args.datos)
+        for entrada in args.entradas:
+            resultado = {'filas': filas, 'entrada': entrada, **medir(entrada, carpeta, args)}
+            resultados.append(resultado)
+            _mostrar(resultado)
+
+    salida = {'configuracion': configuracion, 'resultados': resultados}
+    for ruta in filter(None, [args.json, args.guardar_linea_base]):
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(salida, f, indent=2, ensure_ascii=False, default=str)
+
+    fallidas = [r for r in resultados if r['frio']['errores'] or (r['caliente'] or {}).get('errores')]
+    regresiones = []
+    if args.linea_base:
+        with open(args.linea_base, encoding="utf-8") as f:
+            linea_base = json.load(f)
+        if linea_base.get('configuracion') != configuracion:
+            print(f"\n⚠️  La línea base usa otra configuración: {linea_base.get('configuracion')}")
+        regresiones = comparar(resultados, linea_base, args.tolerancia)
+        print(f"\n{len(regresiones)} regresión(es) respecto de {args.linea_base}")
+        for regresion in regresiones:
+            print(f"  - {regresion}")
+
+    if fallidas:
+        print(f"\n{len(fallidas)} punto(s) de entrada con errores")
+    if regresiones or fallidas:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,780 @@
+"""
+Cliente Supabase simulado en memoria para benchmarks sin red.
+
+Sirve desde DataFrames (ver `benchmarks.datos_sinteticos`) el subconjunto de
+PostgREST que usan los módulos:
+
+- `select` con embebidos (`usuarios(nombre_completo)`, con pista
+  `usuarios!incidentes_reportado_por_fkey(...)`, anidados y uno-a-muchos
+  como `asistentes_capacitacion(...)`), `count='exact'` y `head=True`;
+- filtros eq/neq/gt/gte/lt/lte/like/ilike/in_/is_, `not_` y `or_` con
+  `and(...)` anidados (búsquedas y cursores keyset);
+- order, limit y range, con el tope de filas por respuesta de PostgREST
+  (`max_filas`, 1000 por defecto como en Supabase);
+- insert, update, upsert (on_conflict, ignore_duplicates) y delete, que
+  asignan id y mantienen created_at/updated_at como los triggers;
+- las RPC `kpis_sst` y `renovar_epp_asignaciones`, y un Storage mínimo
+  (upload, get_public_url, remove).
+
+Cada `execute()` cuenta una consulta y los bytes del JSON de la respuesta
+(`contadores()`), y puede esperar una latencia fija para simular la red.
+`instalar(cliente)` hace que `get_supabase_client()` lo devuelva en todo el
+proceso.
+
+Uso:
+    from benchmarks import datos_sinteticos, postgrest_simulado
+    cliente = postgrest_simulado.ClienteSimulado(datos_sinteticos.generar(10_000))
+    postgrest_simulado.instalar(cliente)
+"""
+import json
+import re
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+from postgrest.exceptions import APIError
+
+from app.config.proyecciones import dividir_select
+from app.utils import supabase_client
+
+# Columnas jsonb: se guardan como texto JSON y se devuelven decodificadas
+COLUMNAS_JSON = {
+    'incidentes': {'consecuencias', 'testigos', 'evidencia'},
+    'hallazgos': {'evidencia'},
+    'checklists': {'items'},
+}
+
+# (tabla, embebida) -> (columna, a_muchos). Con a_muchos=False la columna es la
+# clave foránea de `tabla` hacia embebida.id; con True, la de `embebida` hacia tabla.id
+RELACIONES = {
+    ('riesgos', 'usuarios'): ('responsable_id', False),
+    ('incidentes', 'usuarios'): ('reportado_por', False),
+    ('acciones_correctivas', 'incidentes'): ('incidente_id', False),
+    ('acciones_correctivas', 'usuarios'): ('responsable_id', False),
+    ('inspecciones', 'checklists'): ('checklist_id', False),
+    ('inspecciones', 'usuarios'): ('supervisor_id', False),
+    ('hallazgos', 'inspecciones'): ('inspeccion_id', False),
+    ('hallazgos', 'usuarios'): ('responsable_id', False),
+    ('epp_asignaciones', 'usuarios'): ('trabajador_id', False),
+    ('epp_asignaciones', 'epp_catalogo'): ('epp_id', False),
+    ('capacitaciones', 'asistentes_capacitacion'): ('capacitacion_id', True),
+    ('capacitaciones', 'encuestas_capacitacion'): ('capacitacion_id', True),
+    ('asistentes_capacitacion', 'usuarios'): ('trabajador_id', False),
+    ('encuestas_capacitacion', 'usuarios'): ('trabajador_id', False),
+    ('documentos', 'usuarios'): ('responsable_id', False),
+    ('historial_versiones', 'documentos'): ('documento_id', False),
+}
+
+# Valores por defecto y columnas generadas de la base (los que los módulos no envían)
+POR_DEFECTO = {
+    'riesgos': {'estado': 'pendiente'},
+    'hallazgos': {'estado': 'abierto'},
+    'acciones_correctivas': {'estado': 'abierta', 'porcentaje_avance': 0},
+}
+GENERADAS = {
+    'riesgos': {'nivel_riesgo': lambda fila: fila['probabilidad'] * fila['severidad']},
+}
+
+_EMBEBIDO = re.compile(r'^(?:(\w+):)?(\w+)(?:!(\w+))?\((.*)\)$', re.S)
+_COLUMNA = re.compile(r'^(?:(\w+):)?(\w+)(?:::\w+)?$')
+
+def _error(mensaje, codigo):
+    return APIError({'message': mensaje, 'code': codigo, 'hint': None, 'details': None})
+
+def _ahora():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+def _partir(texto):
+    """Dividir en comas de primer nivel, respetando paréntesis y comillas (con escapes \\)"""
+    partes, nivel, comillas, escape, actual = [], 0, False, False, ''
+    for c in texto:
+        if escape:
+            escape = False
+            actual += c
+            continue
+        if comillas and c == '\\':
+            escape = True
+        elif c == '"':
+            comillas = not comillas
+        elif not comillas and c == '(':
+            nivel += 1
+        elif not comillas and c == ')':
+            nivel -= 1
+        if c == ',' and nivel == 0 and not comillas:
+            partes.append(actual)
+            actual = ''
+        else:
+            actual += c
+    if actual:
+        partes.append(actual)
+    return [p.strip() for p in partes]
+
+def _sin_comillas(valor):
+    if len(valor) >= 2 and valor[0] == valor[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', valor[1:-1])
+    return valor
+
+def _parsear_logico(texto):
+    """Condiciones de `or_` ('a.eq.1,and(b.gt.2,c.is.null)') como nodos"""
+    nodos = []
+    for parte in _partir(texto):
+        negado = parte.startswith('not.')
+        if negado:
+            parte = parte[4:]
+
+        grupo = re.match(r'^(and|or)\((.*)\)$', parte, re.S)
+        if grupo:
+            nodo = (grupo.group(1), _parsear_logico(grupo.group(2)))
+        else:
+            columna, resto = parte.split('.', 1)
+            if resto.startswith('not.'):
+                negado, resto = not negado, resto[4:]
+            op, valor = resto.split('.', 1)
+            if op == 'in':
+                valor = [_sin_comillas(v) for v in _partir(valor.strip('()'))]
+            else:
+                valor = _sin_comillas(valor)
+            nodo = ('cond', columna, op, valor)
+
+        nodos.append(('not', nodo) if negado else nodo)
+    return nodos
+
+def _coercionar(serie, valor):
+    """Valor de un filtro con el tipo de la columna (PostgREST los recibe como texto)"""
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    if pd.api.types.is_bool_dtype(serie.dtype):
+        return valor.lower() == 'true' if isinstance(valor, str) else bool(valor)
+    if pd.api.types.is_numeric_dtype(serie.dtype):
+        if isinstance(valor, str):
+            return float(valor) if '.' in valor else int(valor)
+        return valor
+    if valor is not None and not isinstance(valor, str):
+        return str(valor)
+    return valor
+
+def _patron_like(patron):
+    return ''.join('.*' if c in '%*' else '.' if c == '_' else re.escape(c) for c in patron)
+
+def _comparar(serie, op, valor):
+    """Máscara booleana (NULL cuenta como falso) de una condición sobre una columna"""
+    if op == 'is':
+        if valor is None or str(valor).lower() == 'null':
+            return serie.isna().to_numpy()
+        op, valor = 'eq', valor
+
+    if op in ('like', 'ilike'):
+        patron = valor.replace('*', '%')
+        interior = patron[1:-1]
+        if patron.startswith('%') and patron.endswith('%') and not re.search(r'[%_]', interior):
+            resultado = serie.str.contains(interior, case=op == 'like', regex=False)
+        else:
+            resultado = serie.str.fullmatch(_patron_like(patron), case=op == 'like')
+    elif op == 'in':
+        resultado = serie.isin([_coercionar(serie, v) for v in valor])
+    else:
+        valor = _coercionar(serie, valor)
+        resultado = {
+            'eq': serie.__eq__, 'neq': serie.__ne__, 'gt': serie.__gt__,
+            'gte': serie.__ge__, 'lt': serie.__lt__, 'lte': serie.__le__,
+        }[op](valor)
+
+    return pd.Series(resultado).fillna(False).to_numpy(dtype=bool)
+
+def _a_python(valor):
+    if valor is pd.NA or valor is None or (isinstance(valor, float) and np.isnan(valor)):
+        return None
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return valor
+
+class _Respuesta:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+class _Consulta:
+    """Constructor de consultas con la interfaz de postgrest-py (subconjunto usado por la app)"""
+
+    def __init__(self, cliente, tabla):
+        self._cliente = cliente
+        self.tabla = tabla
+        self.accion = 'select'
+        self.select_texto = '*'
+        self.count = None
+        self.head = False
+        self.filtros = []
+        self.orden = []
+        self.limite = None
+        self.desde = 0
+        self.valores = None
+        self.on_conflict = None
+        self.ignorar_duplicados = False
+        self._negar = False
+
+    def select(self, *columnas, count=None, head=False):
+        self.select_texto = ','.join(columnas) or '*'
+        self.count = count
+        self.head = head
+        return self
+
+    def insert(self, valores, count=None, returning=None, upsert=False, default_to_null=True):
+        self.accion = 'upsert' if upsert else 'insert'
+        self.valores = valores
+        return self
+
+    def upsert(self, valores, count=None, returning=None, ignore_duplicates=False, on_conflict='',
+               default_to_null=True):
+        self.accion = 'upsert'
+        self.valores = valores
+        self.on_conflict = on_conflict
+        self.ignorar_duplicados = ignore_duplicates
+        return self
+
+    def update(self, valores, count=None, returning=None):
+        self.accion = 'update'
+        self.valores = valores
+        return self
+
+    def delete(self, count=None, returning=None):
+        self.accion = 'delete'
+        return self
+
+    @property
+    def not_(self):
+        self._negar = True
+        return self
+
+    def _filtro(self, columna, op, valor):
+        nodo = ('cond', columna, op, valor)
+        self.filtros.append(('not', nodo) if self._negar else nodo)
+        self._negar = False
+        return self
+
+    def eq(self, columna, valor):
+        return self._filtro(columna, 'eq', valor)
+
+    def neq(self, columna, valor):
+        return self._filtro(columna, 'neq', valor)
+
+    def gt(self, columna, valor):
+        return self._filtro(columna, 'gt', valor)
+
+    def gte(self, columna, valor):
+        return self._filtro(columna, 'gte', valor)
+
+    def lt(self, columna, valor):
+        return self._filtro(columna, 'lt', valor)
+
+    def lte(self, columna, valor):
+        return self._filtro(columna, 'lte', valor)
+
+    def like(self, columna, patron):
+        return self._filtro(columna, 'like', patron)
+
+    def ilike(self, columna, patron):
+        return self._filtro(columna, 'ilike', patron)
+
+    def in_(self, columna, valores):
+        return self._filtro(columna, 'in', list(valores))
+
+    def is_(self, columna, valor):
+        return self._filtro(columna, 'is', valor)
+
+    def or_(self, filtros, reference_table=None):
+        self.filtros.append(('or', _parsear_logico(filtros)))
+        return self
+
+    def order(self, columna, desc=False, nullsfirst=None, foreign_table=None):
+        self.orden.append((columna, desc))
+        return self
+
+    def limit(self, tamano, foreign_table=None):
+        self.limite = tamano
+        return self
+
+    def range(self, inicio, fin, foreign_table=None):
+        self.desde = inicio
+        self.limite = fin - inicio + 1
+        return self
+
+    def execute(self):
+        return self._cliente._ejecutar(self)
+
+class _Rpc:
+    def __init__(self, cliente, funcion, parametros):
+        self._cliente = cliente
+        self.funcion = funcion
+        self.parametros = parametros
+
+    def execute(self):
+        return self._cliente._ejecutar_rpc(self)
+
+class _BucketSimulado:
+    def __init__(self, cliente, bucket):
+        self._cliente = cliente
+        self.bucket = bucket
+
+    def upload(self, path, file, file_options=None):
+        tamano = len(file)
+        with self._cliente._lock:
+            self._cliente.archivos[(self.bucket, path)] = tamano
+            self._cliente._contar('upload', self.bucket)
+            self._cliente.bytes_subidos += tamano
+        self._cliente._esperar()
+        return {'path': path}
+
+    def get_public_url(self, path, options=None):
+        return f"{self._cliente.url}/storage/v1/object/public/{self.bucket}/{path}"
+
+    def remove(self, paths):
+        with self._cliente._lock:
+            for path in paths:
+                self._cliente.archivos.pop((self.bucket, path), None)
+            self._cliente._contar('remove', self.bucket)
+        self._cliente._esperar()
+        return [{'name': path} for path in paths]
+
+class _StorageSimulado:
+    def __init__(self, cliente):
+        self._cliente = cliente
+
+    def from_(self, bucket):
+        return _BucketSimulado(self._cliente, bucket)
+
+class ClienteSimulado:
+    """
+    Cliente con la interfaz de supabase-py servido desde DataFrames en memoria
+
+    Args:
+        tablas: dict tabla -> DataFrame (se modifican en las escrituras)
+        latencia: Segundos de espera por llamada, para simular la red
+        max_filas: Tope de filas por respuesta (None = sin tope)
+        medir_bytes: Serializar cada respuesta a JSON para contar bytes
+    """
+
+    def __init__(self, tablas, latencia=0.0, max_filas=1000, medir_bytes=True,
+                 url="https://sintetico.supabase.co"):
+        self.tablas = {tabla: df.reset_index(drop=True) for tabla, df in tablas.items()}
+        self.latencia = latencia
+        self.max_filas = max_filas
+        self.medir_bytes = medir_bytes
+        self.url = url
+        self.storage = _StorageSimulado(self)
+        self.archivos = {}
+        self._lock = threading.RLock()
+        self._versiones = Counter()
+        self._indices = {}
+        self._ordenes = {}
+        self._secuencias = {tabla: int(df['id'].max()) if len(df) else 0 for tabla, df in self.tablas.items()}
+        self._json = {tabla: set(columnas) for tabla, columnas in COLUMNAS_JSON.items()}
+        self.reiniciar_contadores()
+
+    # Interfaz de supabase-py
+
+    def table(self, tabla):
+        return _Consulta(self, tabla)
+
+    def from_(self, tabla):
+        return _Consulta(self, tabla)
+
+    def rpc(self, funcion, params=None):
+        return _Rpc(self, funcion, params or {})
+
+    # Contadores
+
+    def reiniciar_contadores(self):
+        self.consultas = 0
+        self.bytes_respuesta = 0
+        self.bytes_subidos = 0
+        self.detalle = Counter()
+
+    def contadores(self):
+        """Consultas (PostgREST + RPC), bytes de respuesta, bytes subidos y detalle por 'acción tabla'"""
+        return {
+            'consultas': self.consultas,
+            'bytes_respuesta': self.bytes_respuesta,
+            'bytes_subidos': self.bytes_subidos,
+            'detalle': dict(self.detalle),
+        }
+
+    def _contar(self, accion, tabla, data=None):
+        self.detalle[f"{accion} {tabla}"] += 1
+        if accion in ('upload', 'remove'):
+            return
+        self.consultas += 1
+        if self.medir_bytes and data is not None:
+            self.bytes_respuesta += len(json.dumps(data, ensure_ascii=False, default=str).encode())
+
+    def _esperar(self):
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    # Lectura
+
+    def _tabla(self, tabla):
+        if tabla not in self.tablas:
+            raise _error(f'relation "public.{tabla}" does not exist', '42P01')
+        return self.tablas[tabla]
+
+    def _serie(self, df, tabla, columna):
+        if columna not in df.columns:
+            raise _error(f"column {tabla}.{columna} does not exist", '42703')
+        return df[columna]
+
+    def _mascara(self, df, tabla, nodo):
+        tipo = nodo[0]
+        if tipo == 'cond':
+            return _comparar(self._serie(df, tabla, nodo[1]), nodo[2], nodo[3])
+        if tipo == 'not':
+            return ~self._mascara(df, tabla, nodo[1])
+
+        mascaras = [self._mascara(df, tabla, hijo) for hijo in nodo[1]]
+        if tipo == 'and':
+            return np.logical_and.reduce(mascaras)
+        return np.logical_or.reduce(mascaras)
+
+    def _posiciones(self, df, tabla, filtros):
+        """Posiciones de las filas que cumplen `filtros`"""
+        if not filtros:
+            return np.arange(len(df))
+        return np.flatnonzero(self._mascara(df, tabla, ('and', filtros)))
+
+    def _cambio(self, tabla):
+        """Registrar una escritura (invalida índices y órdenes en caché)"""
+        self._versiones[tabla] += 1
+
+    def _indice(self, tabla):
+        """pd.Index de los id de la tabla (se recalcula tras cada escritura)"""
+        df = self._tabla(tabla)
+        indice = self._indices.get(tabla)
+        if indice is None or indice[0] != self._versiones[tabla]:
+            indice = (self._versiones[tabla], pd.Index(df['id']))
+            self._indices[tabla] = indice
+        return indice[1]
+
+    def _permutacion(self, tabla, orden):
+        """
+        Posiciones de la tabla completa en el orden pedido; se calcula una vez
+        por tabla y orden (como un índice) y se reutiliza hasta la próxima escritura
+        """
+        df = self._tabla(tabla)
+        clave = (tabla, tuple(orden))
+        cache = self._ordenes.get(clave)
+        if cache is None or cache[0] != self._versiones[tabla]:
+            for columna, _ in orden:
+                self._serie(df, tabla, columna)
+            ordenado = df.sort_values(
+                [c for c, _ in orden],
+                ascending=[not desc for _, desc in orden],
+                na_position='first' if orden[0][1] else 'last',
+                kind='stable'
+            )
+            cache = (self._versiones[tabla], ordenado.index.to_numpy())
+            self._ordenes[clave] = cache
+        return cache[1]
+
+    def _columna_relacion(self, tabla, embebida, pista):
+        if pista:
+            if pista.endswith('_fkey'):
+                pista = pista[:-len('_fkey')].removeprefix(f"{tabla}_")
+            return pista, False
+        if (tabla, embebida) not in RELACIONES:
+            raise _error(f"Could not find a relationship between '{tabla}' and '{embebida}'", 'PGRST200')
+        return RELACIONES[(tabla, embebida)]
+
+    def _columna_salida(self, tabla, df, columna):
+        valores = [_a_python(v) for v in df[columna].astype(object)]
+        if columna in self._json.get(tabla, ()):
+            valores = [json.loads(v) if isinstance(v, str) else v for v in valores]
+        return valores
+
+    def _embebido(self, tabla, df, embebida, pista, select):
+        columna, a_muchos = self._columna_relacion(tabla, embebida, pista)
+        destino = self._tabla(embebida)
+
+        if not a_muchos:
+            claves = self._serie(df, tabla, columna).astype('Float64').to_numpy(dtype=float, na_value=np.nan)
+            posiciones = self._indice(embebida).get_indexer(claves)
+            encontrados = posiciones[posiciones >= 0]
+            filas = self._proyectar(embebida, destino.iloc[encontrados], select)
+            por_posicion = dict(zip(encontrados.tolist(), filas))
+            return [por_posicion.get(p) if p >= 0 else None for p in posiciones.tolist()]
+
+        relacionadas = destino[destino[columna].isin(df['id'])]
+        filas = self._proyectar(embebida, relacionadas, select)
+        grupos = {}
+        for clave, fila in zip(relacionadas[columna].tolist(), filas):
+            grupos.setdefault(clave, []).append(fila)
+        return [grupos.get(i, []) for i in df['id'].tolist()]
+
+    def _proyectar(self, tabla, df, select):
+        """Filas de `df` como dicts con las columnas y embebidos de `select`"""
+        nombres, valores = [], []
+        for elemento in dividir_select(select):
+            if elemento == '*':
+                for columna in df.columns:
+                    nombres.append(columna)
+                    valores.append(self._columna_salida(tabla, df, columna))
+                continue
+
+            embebido = _EMBEBIDO.match(elemento)
+            if embebido:
+                alias, embebida, pista, interior = embebido.groups()
+                nombres.append(alias or embebida)
+                valores.append(self._embebido(tabla, df, embebida, pista, interior))
+                continue
+
+            columna = _COLUMNA.match(elemento)
+            if not columna:
+                raise _error(f"failed to parse select parameter ({elemento})", 'PGRST100')
+            alias, nombre = columna.groups()
+            self._serie(df, tabla, nombre)
+            nombres.append(alias or nombre)
+            valores.append(self._columna_salida(tabla, df, nombre))
+
+        return [dict(zip(nombres, fila)) for fila in zip(*valores)] if valores else [{} for _ in range(len(df))]
+
+    def _seleccionar(self, consulta):
+        df = self._tabla(consulta.tabla)
+        posiciones = self._posiciones(df, consulta.tabla, consulta.filtros)
+        total = len(posiciones) if consulta.count else None
+        if consulta.head:
+            return [], total
+
+        if consulta.orden:
+            permutacion = self._permutacion(consulta.tabla, consulta.orden)
+            if len(posiciones) < len(df):
+                elegidas = np.zeros(len(df), dtype=bool)
+                elegidas[posiciones] = True
+                permutacion = permutacion[elegidas[permutacion]]
+            posiciones = permutacion
+
+        limite = consulta.limite
+        if self.max_filas and (limite is None or limite > self.max_filas):
+            limite = self.max_filas
+        if consulta.desde or limite is not None:
+            posiciones = posiciones[consulta.desde:None if limite is None else consulta.desde + limite]
+
+        return self._proyectar(consulta.tabla, df.iloc[posiciones], consulta.select_texto), total
+
+    # Escritura
+
+    def _codificar(self, tabla, fila):
+        """Fila lista para guardar: jsonb como texto JSON, fechas en ISO"""
+        salida = {}
+        for columna, valor in fila.items():
+            if isinstance(valor, (dict, list)):
+                self._json.setdefault(tabla, set()).add(columna)
+                valor = json.dumps(valor, ensure_ascii=False, default=str)
+            elif isinstance(valor, (date, datetime)):
+                valor = valor.isoformat()
+            salida[columna] = valor
+        return salida
+
+    def _agregar_filas(self, tabla, filas):
+        """Insertar filas (con id y marcas de tiempo) y devolver el DataFrame agregado"""
+        df = self.tablas.get(tabla)
+        columnas_existentes = list(df.columns) if df is not None else ['id']
+        ahora = _ahora()
+
+        nuevas = []
+        for fila in filas:
+            fila = {**POR_DEFECTO.get(tabla, {}), **self._codificar(tabla, fila)}
+            if fila.get('id') is None:
+                self._secuencias[tabla] = fila['id'] = self._secuencias.get(tabla, 0) + 1
+            for columna in ('created_at', 'updated_at'):
+                if columna in columnas_existentes and fila.get(columna) is None:
+                    fila[columna] = ahora
+            for columna, calcular in GENERADAS.get(tabla, {}).items():
+                fila[columna] = calcular(fila)
+            nuevas.append(fila)
+
+        nuevo = pd.DataFrame(nuevas)
+        if df is None:
+            self.tablas[tabla] = nuevo.convert_dtypes(dtype_backend="pyarrow")
+            self._cambio(tabla)
+            return self.tablas[tabla]
+
+        for columna in nuevo.columns:
+            if columna in df.columns:
+                try:
+                    nuevo[columna] = nuevo[columna].astype(df[columna].dtype)
+                except (TypeError, ValueError):
+                    # p.ej. NULL en una columna int64: se pasa a entero nullable
+                    if pd.api.types.is_integer_dtype(df[columna].dtype):
+                        df[columna] = df[columna].astype("Int64")
+                        nuevo[columna] = nuevo[columna].astype("Int64")
+
+        self.tablas[tabla] = pd.concat([df, nuevo], ignore_index=True)
+        self._cambio(tabla)
+        return self.tablas[tabla].iloc[len(df):]
+
+    def _insertar(self, consulta):
+        filas = consulta.valores if isinstance(consulta.valores, list) else [consulta.valores]
+        if consulta.accion == 'insert' or consulta.tabla not in self.tablas:
+            return self._proyectar(consulta.tabla, self._agregar_filas(consulta.tabla, filas), '*')
+
+        # upsert: las filas que chocan en `on_conflict` se actualizan (o se ignoran)
+        df = self.tablas[consulta.tabla]
+        conflicto = [c.strip() for c in (consulta.on_conflict or 'id').split(',')]
+        claves = [tuple(_coercionar(df[c], fila.get(c)) for c in conflicto) for fila in filas]
+        if len(conflicto) == 1:
+            posiciones = pd.Index(df[conflicto[0]]).get_indexer([c[0] for c in claves])
+        else:
+            posiciones = pd.MultiIndex.from_frame(df[conflicto]).get_indexer(claves)
+
+        nuevas = [fila for fila, p in zip(filas, posiciones) if p < 0]
+        salida = []
+        if not consulta.ignorar_duplicados:
+            for fila, p in zip(filas, posiciones):
+                if p >= 0:
+                    salida += self._modificar(consulta.tabla, np.asarray([p]), fila)
+        if nuevas:
+            salida += self._proyectar(consulta.tabla, self._agregar_filas(consulta.tabla, nuevas), '*')
+        return salida
+
+    def _modificar(self, tabla, posiciones, valores):
+        """Actualizar las filas en `posiciones` y devolverlas"""
+        df = self.tablas[tabla]
+        valores = self._codificar(tabla, valores)
+        if 'updated_at' in df.columns and 'updated_at' not in valores:
+            valores['updated_at'] = _ahora()
+
+        etiquetas = df.index[posiciones]
+        for columna, valor in valores.items():
+            if columna not in df.columns:
+                df[columna] = pd.Series(pd.NA, index=df.index, dtype="string[pyarrow]" if isinstance(valor, str) else object)
+            if valor is None and pd.api.types.is_integer_dtype(df[columna].dtype):
+                df[columna] = df[columna].astype("Int64")
+            df.loc[etiquetas, columna] = valor
+
+        self._cambio(tabla)
+        return self._proyectar(tabla, df.loc[etiquetas], '*')
+
+    def _actualizar(self, consulta):
+        df = self._tabla(consulta.tabla)
+        posiciones = self._posiciones(df, consulta.tabla, consulta.filtros)
+        if not len(posiciones):
+            return []
+        return self._modificar(consulta.tabla, posiciones, consulta.valores)
+
+    def _eliminar(self, consulta):
+        df = self._tabla(consulta.tabla)
+        mascara = np.zeros(len(df), dtype=bool)
+        mascara[self._posiciones(df, consulta.tabla, consulta.filtros)] = True
+        eliminadas = self._proyectar(consulta.tabla, df[mascara], '*')
+        self.tablas[consulta.tabla] = df[~mascara].reset_index(drop=True)
+        self._cambio(consulta.tabla)
+        return eliminadas
+
+    def _ejecutar(self, consulta):
+        with self._lock:
+            total = None
+            if consulta.accion == 'select':
+                data, total = self._seleccionar(consulta)
+            elif consulta.accion in ('insert', 'upsert'):
+                data = self._insertar(consulta)
+            elif consulta.accion == 'update':
+                data = self._actualizar(consulta)
+            else:
+                data = self._eliminar(consulta)
+            self._contar(consulta.accion, consulta.tabla, data)
+
+        self._esperar()
+        return _Respuesta(data, total)
+
+    # RPC
+
+    def _kpis_sst(self, p):
+        riesgos = self.tablas['riesgos']
+        incidentes = self.tablas['incidentes']
+        epp = self.tablas['epp_asignaciones']
+        capacitaciones = self.tablas['capacitaciones']
+        hoy = date.today()
+
+        riesgos = riesgos[riesgos['nivel_riesgo'].to_numpy() >= (p.get('p_nivel_riesgo_min') or 1)]
+        incidentes = incidentes[_comparar(incidentes['fecha_hora'], 'gte', p['p_fecha_inicio'])
+                                & _comparar(incidentes['fecha_hora'], 'lte', p['p_fecha_fin'])]
+        if p.get('p_areas'):
+            riesgos = riesgos[_comparar(riesgos['area'], 'in', p['p_areas'])]
+            incidentes = incidentes[_comparar(incidentes['area'], 'in', p['p_areas'])]
+        if p.get('p_tipos_incidente'):
+            incidentes = incidentes[_comparar(incidentes['tipo'], 'in', p['p_tipos_incidente'])]
+
+        horas = p.get('p_horas_hombre', 50000) or 0
+        total_cap = len(capacitaciones)
+        realizadas = int(_comparar(capacitaciones['estado'], 'eq', 'realizada').sum())
+        accidentes = int(_comparar(incidentes['tipo'], 'eq', 'accidente').sum())
+        limite_epp = (hoy + timedelta(days=p.get('p_dias_epp', 30))).isoformat()
+
+        return {
+            'riesgos_pendientes': int(_comparar(riesgos['estado'], 'eq', 'pendiente').sum()),
+            'riesgos_criticos': int((riesgos['nivel_riesgo'].to_numpy() >= 15).sum()),
+            'hallazgos_abiertos': int(_comparar(self.tablas['hallazgos']['estado'], 'eq', 'abierto').sum()),
+            'epp_por_vencer': int(_comparar(epp['fecha_vencimiento'], 'lte', limite_epp).sum()),
+            'epp_vencidos': int(_comparar(epp['fecha_vencimiento'], 'lte', hoy.isoformat()).sum()),
+            'capacitaciones_total': total_cap,
+            'capacitaciones_realizadas': realizadas,
+            'cumplimiento_capacitacion': round(realizadas * 100.0 / total_cap, 1) if total_cap else 0,
+            'incidentes_total': len(incidentes),
+            'accidentes': accidentes,
+            'dias_perdidos': accidentes * 15,
+            'tasa_frecuencia': round(accidentes * 1_000_000 / horas, 2) if horas else 0,
+            'tasa_severidad': round(accidentes * 15 * 1_000_000 / horas, 2) if horas else 0,
+        }
+
+    def _renovar_epp_asignaciones(self, p):
+        asignaciones = self.tablas['epp_asignaciones']
+        catalogo = self.tablas['epp_catalogo'].set_index('id')
+        fecha = p.get('p_fecha') or date.today().isoformat()
+
+        vigentes = asignaciones[_comparar(asignaciones['id'], 'in', p['p_asignacion_ids'])
+                                & _comparar(asignaciones['estado'], 'eq', 'activo')]
+        vigentes = vigentes[vigentes['epp_id'].isin(catalogo.index[catalogo['vida_util_meses'].notna()])]
+        if vigentes.empty:
+            return []
+
+        self._modificar('epp_asignaciones', asignaciones.index.get_indexer(vigentes.index),
+                        {'estado': 'renovado', 'fecha_devolucion': fecha})
+        nuevas = []
+        for _, fila in vigentes.iterrows():
+            vida = int(catalogo.loc[fila['epp_id'], 'vida_util_meses'])
+            nuevas.append({
+                'trabajador_id': int(fila['trabajador_id']), 'epp_id': int(fila['epp_id']),
+                'fecha_entrega': fecha,
+                'fecha_vencimiento': (date.fromisoformat(fecha) + timedelta(days=vida * 30)).isoformat(),
+                'estado': 'activo', 'condicion': 'Nuevo', 'asignado_por': p.get('p_usuario_id'),
+                'renovado_de': int(fila['id']),
+            })
+        agregadas = self._agregar_filas('epp_asignaciones', nuevas)
+
+        return [{
+            'asignacion_id': int(nueva['renovado_de']),
+            'nueva_asignacion_id': int(nueva['id']),
+            'trabajador_id': int(nueva['trabajador_id']),
+            'epp_nombre': catalogo.loc[nueva['epp_id'], 'nombre'],
+            'nueva_fecha_vencimiento': nueva['fecha_vencimiento'],
+        } for _, nueva in agregadas.iterrows()]
+
+    def _ejecutar_rpc(self, rpc):
+        funciones = {
+            'kpis_sst': self._kpis_sst,
+            'renovar_epp_asignaciones': self._renovar_epp_asignaciones,
+        }
+        if rpc.funcion not in funciones:
+            raise _error(f"Could not find the function public.{rpc.funcion}", 'PGRST202')
+
+        with self._lock:
+            data = funciones[rpc.funcion](rpc.parametros)
+            self._contar('rpc', rpc.funcion, data)
+
+        self._esperar()
+        return _Respuesta(data)
+
+def instalar(cliente):
+    """Hacer que `get_supabase_client()` devuelva `cliente` en este proceso"""
+    supabase_client._cliente = cliente
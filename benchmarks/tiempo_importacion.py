@@ -0,0 +1,63 @@
+"""
+Benchmark de arranque: costo de importación por módulo.
+
+Cada medición se hace en un intérprete nuevo (sin caché de sys.modules), para
+reflejar el arranque en frío que ve el usuario en la pantalla de login y al
+abrir cada módulo por primera vez.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.tiempo_importacion [--repeticiones 5] [--json salida.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+MODULOS = [
+    'app.auth',
+    'app.modules.dashboard',
+    'app.modules.riesgos',
+    'app.modules.inspecciones',
+    'app.modules.capacitaciones',
+    'app.modules.incidentes',
+    'app.modules.epp',
+    'app.modules.documental',
+    'app.modules.reportes',
+]
+
+_CODIGO = (
+    "import time, streamlit;"
+    "t = time.perf_counter();"
+    "import {modulo};"
+    "print(time.perf_counter() - t)"
+)
+
+def medir_importacion(modulo, repeticiones):
+    """Mediana en segundos de importar `modulo` (streamlit ya importado)"""
+    tiempos = []
+    for _ in range(repeticiones):
+        salida = subprocess.run(
+            [sys.executable, "-c", _CODIGO.format(modulo=modulo)],
+            capture_output=True, text=True, check=True
+        )
+        tiempos.append(float(salida.stdout.strip().splitlines()[-1]))
+    return statistics.median(tiempos)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--json", help="Guardar resultados en este archivo")
+    args = parser.parse_args()
+
+    resultados = {}
+    for modulo in MODULOS:
+        resultados[modulo] = medir_importacion(modulo, args.repeticiones)
+        print(f"{modulo:<32} {resultados[modulo] * 1000:8.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(resultados, f, indent=2)
+
+if __name__ == "__main__":
+    main()
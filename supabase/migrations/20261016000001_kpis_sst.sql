@@ -0,0 +1,77 @@
+-- KPIs SST agregados en el servidor (Dashboard y Resumen Ejecutivo)
+-- Devuelve todos los indicadores en una sola llamada RPC en lugar de
+-- descargar riesgos, hallazgos, epp_asignaciones y capacitaciones completas.
+
+create or replace function public.kpis_sst(
+    p_fecha_inicio date,
+    p_fecha_fin date,
+    p_areas text[] default null,
+    p_tipos_incidente text[] default null,
+    p_nivel_riesgo_min integer default 1,
+    p_dias_epp integer default 30,
+    p_horas_hombre numeric default 50000
+)
+returns jsonb
+language sql
+stable
+as $$
+    with
+    riesgos_f as (
+        select estado, nivel_riesgo
+        from public.riesgos
+        where nivel_riesgo >= p_nivel_riesgo_min
+          and (coalesce(cardinality(p_areas), 0) = 0 or area = any(p_areas))
+    ),
+    incidentes_f as (
+        select tipo
+        from public.incidentes
+        where fecha_hora >= p_fecha_inicio
+          and fecha_hora <= p_fecha_fin
+          and (coalesce(cardinality(p_areas), 0) = 0 or area = any(p_areas))
+          and (coalesce(cardinality(p_tipos_incidente), 0) = 0 or tipo = any(p_tipos_incidente))
+    ),
+    conteos as (
+        select
+            (select count(*) from riesgos_f where estado = 'pendiente') as riesgos_pendientes,
+            (select count(*) from riesgos_f where nivel_riesgo >= 15) as riesgos_criticos,
+            (select count(*) from public.hallazgos where estado = 'abierto') as hallazgos_abiertos,
+            (select count(*) from public.epp_asignaciones
+              where fecha_vencimiento <= current_date + p_dias_epp) as epp_por_vencer,
+            (select count(*) from public.epp_asignaciones
+              where fecha_vencimiento <= current_date) as epp_vencidos,
+            (select count(*) from public.capacitaciones) as capacitaciones_total,
+            (select count(*) from public.capacitaciones where estado = 'realizada') as capacitaciones_realizadas,
+            (select count(*) from incidentes_f) as incidentes_total,
+            (select count(*) from incidentes_f where tipo = 'accidente') as accidentes
+    )
+    select jsonb_build_object(
+        'riesgos_pendientes', riesgos_pendientes,
+        'riesgos_criticos', riesgos_criticos,
+        'hallazgos_abiertos', hallazgos_abiertos,
+        'epp_por_vencer', epp_por_vencer,
+        'epp_vencidos', epp_vencidos,
+        'capacitaciones_total', capacitaciones_total,
+        'capacitaciones_realizadas', capacitaciones_realizadas,
+        'cumplimiento_capacitacion', case when capacitaciones_total > 0
+            then round(capacitaciones_realizadas * 100.0 / capacitaciones_total, 1) else 0 end,
+        'incidentes_total', incidentes_total,
+        'accidentes', accidentes,
+        -- Días perdidos simulados (15 por accidente), igual que en los módulos
+        'dias_perdidos', accidentes * 15,
+        'tasa_frecuencia', case when p_horas_hombre > 0
+            then round(accidentes * 1000000.0 / p_horas_hombre, 2) else 0 end,
+        'tasa_severidad', case when p_horas_hombre > 0
+            then round(accidentes * 15 * 1000000.0 / p_horas_hombre, 2) else 0 end
+    )
+    from conteos;
+$$;
+
+grant execute on function public.kpis_sst(date, date, text[], text[], integer, integer, numeric)
+    to authenticated, service_role;
+
+-- Índices que cubren los filtros de los conteos
+create index if not exists idx_riesgos_area_estado on public.riesgos (area, estado);
+create index if not exists idx_hallazgos_estado on public.hallazgos (estado);
+create index if not exists idx_epp_asignaciones_vencimiento on public.epp_asignaciones (fecha_vencimiento);
+create index if not exists idx_capacitaciones_estado on public.capacitaciones (estado);
+create index if not exists idx_incidentes_fecha_hora on public.incidentes (fecha_hora);
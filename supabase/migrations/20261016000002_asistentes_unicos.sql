@@ -0,0 +1,27 @@
+-- Un trabajador se inscribe una sola vez por capacitación.
+-- Necesario para el upsert en bloque de agregar_asistentes
+-- (on_conflict = capacitacion_id, trabajador_id).
+
+-- Eliminar inscripciones duplicadas previas. Se conserva la que tiene datos:
+-- primero la que registra asistencia, luego la calificada (la mayor nota),
+-- luego la que tiene feedback y, a igualdad, la más antigua
+delete from public.asistentes_capacitacion
+where id in (
+    select id
+    from (
+        select id,
+               row_number() over (
+                   partition by capacitacion_id, trabajador_id
+                   order by asistio desc nulls last,
+                            calificacion desc nulls last,
+                            fecha_asistencia desc nulls last,
+                            (feedback is not null and feedback <> '') desc,
+                            id
+               ) as orden
+        from public.asistentes_capacitacion
+    ) duplicados
+    where orden > 1
+);
+
+create unique index if not exists asistentes_capacitacion_cap_trab_key
+    on public.asistentes_capacitacion (capacitacion_id, trabajador_id);
@@ -0,0 +1,58 @@
+-- Renovación de EPP en una sola llamada RPC y en una sola transacción.
+-- Cierra las asignaciones activas indicadas (estado 'renovado') y crea la
+-- nueva asignación de cada una con la vida útil del catálogo. Sirve tanto
+-- para una asignación como para "renovar todas las por vencer".
+-- Las asignaciones que ya no están activas (p.ej. doble clic) se omiten.
+
+create or replace function public.renovar_epp_asignaciones(
+    p_asignacion_ids bigint[],
+    p_usuario_id bigint,
+    p_fecha date default current_date
+)
+returns table (
+    asignacion_id bigint,
+    nueva_asignacion_id bigint,
+    trabajador_id bigint,
+    epp_nombre text,
+    nueva_fecha_vencimiento date
+)
+language sql
+volatile
+as $$
+    with vigentes as (
+        select a.id, a.trabajador_id, a.epp_id, c.nombre, c.vida_util_meses
+        from public.epp_asignaciones a
+        join public.epp_catalogo c on c.id = a.epp_id
+        where a.id = any(p_asignacion_ids)
+          and a.estado = 'activo'
+          and c.vida_util_meses is not null
+        for update of a
+    ),
+    cerradas as (
+        update public.epp_asignaciones a
+        set estado = 'renovado',
+            fecha_devolucion = p_fecha
+        from vigentes v
+        where a.id = v.id
+        returning a.id
+    ),
+    nuevas as (
+        insert into public.epp_asignaciones (
+            trabajador_id, epp_id, fecha_entrega, fecha_vencimiento,
+            estado, condicion, asignado_por, renovado_de
+        )
+        select v.trabajador_id, v.epp_id, p_fecha, p_fecha + v.vida_util_meses * 30,
+               'activo', 'Nuevo', p_usuario_id, v.id
+        from vigentes v
+        join cerradas c on c.id = v.id
+        returning id, renovado_de, trabajador_id, fecha_vencimiento
+    )
+    select n.renovado_de, n.id, n.trabajador_id, v.nombre, n.fecha_vencimiento
+    from nuevas n
+    join vigentes v on v.id = n.renovado_de;
+$$;
+
+grant execute on function public.renovar_epp_asignaciones(bigint[], bigint, date)
+    to authenticated, service_role;
+
+create index if not exists idx_epp_asignaciones_estado on public.epp_asignaciones (estado);
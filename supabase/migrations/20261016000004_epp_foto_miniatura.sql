@@ -0,0 +1,7 @@
+-- Miniatura WebP de la foto de referencia del catálogo de EPP.
+-- La genera storage_helper al subir la foto; el listado del catálogo la usa
+-- en lugar del original. Las filas anteriores quedan en null y siguen
+-- mostrando foto_url.
+
+alter table public.epp_catalogo
+    add column if not exists foto_miniatura_url text;
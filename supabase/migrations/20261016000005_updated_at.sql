@@ -0,0 +1,42 @@
+-- Marca de agua para las instantáneas locales de dashboard y reportes
+-- (app/utils/snapshots.py): cada fila guarda cuándo cambió por última vez y
+-- la sincronización pide solo las filas con updated_at posterior a la última.
+-- Las filas existentes toman now() al agregar la columna.
+
+create or replace function public.tocar_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+do $$
+declare
+    tabla text;
+begin
+    foreach tabla in array array[
+        'riesgos', 'incidentes', 'inspecciones', 'hallazgos',
+        'epp_asignaciones', 'capacitaciones', 'documentos'
+    ]
+    loop
+        execute format(
+            'alter table public.%I add column if not exists updated_at timestamptz not null default now()',
+            tabla
+        );
+        execute format('drop trigger if exists %I on public.%I', tabla || '_updated_at', tabla);
+        execute format(
+            'create trigger %I before update on public.%I '
+            'for each row execute function public.tocar_updated_at()',
+            tabla || '_updated_at', tabla
+        );
+        -- Paginación keyset de la sincronización: (updated_at, id)
+        execute format(
+            'create index if not exists %I on public.%I (updated_at, id)',
+            'idx_' || tabla || '_updated_at', tabla
+        );
+    end loop;
+end;
+$$;
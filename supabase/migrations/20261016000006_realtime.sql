@@ -0,0 +1,21 @@
+-- Publicar los cambios de las tablas SST por Supabase Realtime
+-- (app/utils/cambios_realtime.py invalida las cachés al recibirlos).
+
+do $$
+declare
+    tabla text;
+begin
+    foreach tabla in array array[
+        'riesgos', 'incidentes', 'inspecciones', 'hallazgos',
+        'epp_asignaciones', 'capacitaciones', 'documentos'
+    ]
+    loop
+        if not exists (
+            select 1 from pg_publication_tables
+            where pubname = 'supabase_realtime' and schemaname = 'public' and tablename = tabla
+        ) then
+            execute format('alter publication supabase_realtime add table public.%I', tabla);
+        end if;
+    end loop;
+end;
+$$;
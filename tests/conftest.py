@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+from app.config import settings
+from app.utils import snapshots
+from benchmarks.postgrest_simulado import ClienteSimulado
+
+
+@pytest.fixture
+def servidor(tmp_path, monkeypatch):
+    """PostgREST simulado con una tabla 'capacitaciones' e instantáneas en un SNAPSHOT_DIR temporal"""
+    capacitaciones = pd.DataFrame({
+        'id': [1, 2, 3, 4],
+        'codigo': ['CAP-1', 'CAP-2', 'CAP-3', 'CAP-4'],
+        'tema': ['Altura', 'Incendios', 'Primeros auxilios', 'Ergonomía'],
+        'area_destino': ['Planta', 'Planta', 'Almacén', 'Oficinas'],
+        'fecha_programada': ['2026-01-10', '2026-02-05', '2026-02-20', '2026-03-15'],
+        'estado': ['Programada', 'Realizada', 'Realizada', 'Programada'],
+        'duracion_horas': [2, 4, 3, 1],
+        'updated_at': ['2026-01-01T08:00:00+00:00'] * 4,
+    })
+    cliente = ClienteSimulado({'capacitaciones': capacitaciones}, medir_bytes=False)
+
+    monkeypatch.setattr(settings, 'SNAPSHOT_DIR', str(tmp_path / "snapshots"))
+    monkeypatch.setattr(settings, 'SNAPSHOTS_ACTIVOS', True)
+    monkeypatch.setattr(snapshots, 'get_supabase_client', lambda: cliente)
+    monkeypatch.setattr(snapshots, '_ultima_sync', {})
+    monkeypatch.setattr(snapshots, '_dataframes', {})
+    return cliente
@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+from app.utils import analitica, snapshots
+
+
+@pytest.fixture
+def con_delta(servidor):
+    """Instantánea con base + un delta que modifica y reasigna filas"""
+    snapshots.sincronizar('capacitaciones', forzar=True)
+
+    servidor.table('capacitaciones').update({'estado': 'Realizada'}).eq('id', 1).execute()
+    servidor.table('capacitaciones').update({'area_destino': 'Almacén'}).eq('id', 2).execute()
+    servidor.table('capacitaciones').insert({
+        'codigo': 'CAP-5', 'tema': 'Orden y limpieza', 'area_destino': 'Planta',
+        'fecha_programada': '2026-04-01', 'estado': 'Programada', 'duracion_horas': 1
+    }).execute()
+    snapshots.sincronizar('capacitaciones', forzar=True)
+    assert snapshots._leer_estado('capacitaciones')['deltas'] == 1
+
+    return pd.DataFrame(servidor.tablas['capacitaciones']).astype(object)
+
+
+def test_contar_por_coincide_con_pandas(con_delta):
+    esperado = (con_delta.groupby(['area_destino', 'estado']).size()
+                .rename('cantidad').reset_index())
+
+    resultado = analitica.contar_por('capacitaciones', ['area_destino', 'estado'])
+
+    clave = ['area_destino', 'estado']
+    pd.testing.assert_frame_equal(
+        resultado.sort_values(clave, ignore_index=True),
+        esperado.sort_values(clave, ignore_index=True),
+        check_dtype=False
+    )
+
+
+def test_contar_por_con_filtros_coincide_con_pandas(con_delta):
+    filtros = [('estado', 'eq', 'Realizada'), ('fecha_programada', 'gte', '2026-02-01')]
+    filtrado = con_delta[(con_delta['estado'] == 'Realizada') & (con_delta['fecha_programada'] >= '2026-02-01')]
+
+    resultado = analitica.contar_por('capacitaciones', ['area_destino'], filtros)
+
+    assert dict(zip(resultado['area_destino'], resultado['cantidad'])) == \
+        filtrado['area_destino'].value_counts().to_dict()
+
+
+def test_pivotar_coincide_con_pandas(con_delta):
+    esperado = pd.crosstab(con_delta['area_destino'], con_delta['estado'])
+
+    resultado = analitica.pivotar('capacitaciones', 'area_destino', 'estado')
+
+    pd.testing.assert_frame_equal(resultado, esperado, check_dtype=False, check_names=False)
+
+
+def test_seleccionar_coincide_con_pandas(con_delta):
+    columnas = ['codigo', 'area_destino', 'estado']
+    esperado = (con_delta[con_delta['area_destino'].isin(['Planta', 'Almacén'])]
+                .sort_values('codigo', ascending=False)[columnas].head(3).reset_index(drop=True))
+
+    resultado = analitica.seleccionar(
+        'capacitaciones', columnas, [('area_destino', 'in', ['Planta', 'Almacén'])],
+        orden='codigo', descendente=True, limite=3
+    )
+
+    pd.testing.assert_frame_equal(resultado, esperado, check_dtype=False)
+
+
+def test_filtro_sobre_columna_ausente_no_devuelve_filas(con_delta):
+    assert analitica.contar('capacitaciones', [('responsable_id', 'eq', 1)]) == 0
+    assert analitica.contar_por('capacitaciones', ['estado'], [('responsable_id', 'eq', 1)]).empty
@@ -0,0 +1,44 @@
+import pytest
+from app.config import settings
+from app.utils import cola_subidas, storage_helper
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'SUBIDA_SPOOL_DIR', str(tmp_path))
+    (tmp_path / "abc").write_bytes(b"contenido")
+    monkeypatch.setattr(storage_helper, '_subir_con_miniatura', lambda *args: ("https://x/objeto.pdf", None))
+    descartadas = []
+    monkeypatch.setattr(storage_helper, 'descartar_subida', lambda url, bucket: descartadas.append(url))
+    return descartadas
+
+
+def _subida():
+    return (1, "abc", "sst-evidencias", "incidentes/1/", "informe.pdf", "application/pdf",
+            "incidentes", "1", "evidencia", None)
+
+
+def test_libera_la_referencia_si_no_se_puede_guardar_la_url(spool, monkeypatch):
+    def fallar(*args):
+        raise RuntimeError("PostgREST caído")
+    monkeypatch.setattr(cola_subidas, '_reemplazar_marcador', fallar)
+
+    with pytest.raises(RuntimeError):
+        cola_subidas._procesar(_subida())
+
+    assert spool == ["https://x/objeto.pdf"]
+
+
+def test_libera_la_referencia_si_el_registro_ya_no_existe(spool, monkeypatch):
+    monkeypatch.setattr(cola_subidas, '_reemplazar_marcador', lambda *args: False)
+
+    cola_subidas._procesar(_subida())
+
+    assert spool == ["https://x/objeto.pdf"]
+
+
+def test_conserva_la_referencia_si_la_url_quedo_guardada(spool, monkeypatch):
+    monkeypatch.setattr(cola_subidas, '_reemplazar_marcador', lambda *args: True)
+
+    assert cola_subidas._procesar(_subida()) == "https://x/objeto.pdf"
+    assert spool == []
@@ -0,0 +1,41 @@
+import time
+import pytest
+from app.config import settings
+from app.utils import n8n_client
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'N8N_OUTBOX_DB', str(tmp_path / "outbox.db"))
+    monkeypatch.setattr(n8n_client, '_esquema_creado', False)
+    monkeypatch.setattr(n8n_client, '_ultima_limpieza', 0)
+    monkeypatch.setattr(n8n_client, 'iniciar_worker', lambda: None)
+    return n8n_client
+
+
+def test_encolar_evento_devuelve_el_id(outbox):
+    primero = outbox.encolar_evento("riesgo-nuevo", {"codigo": "R-1"})
+    segundo = outbox.encolar_evento("riesgo-nuevo", {"codigo": "R-2"})
+
+    assert isinstance(primero, int)
+    assert segundo == primero + 1
+
+
+def test_limpieza_usa_la_fecha_de_envio(outbox):
+    id_ = outbox.encolar_evento("riesgo-nuevo", {"codigo": "R-1"})
+    antiguo = time.time() - settings.N8N_RETENCION_ENVIADOS_SEG - 60
+
+    # Creado hace mucho pero entregado recién (tras reintentos): se conserva
+    with outbox._conexion() as conexion:
+        conexion.execute(
+            "update eventos set estado = 'enviado', creado = ?, enviado = ? where id = ?",
+            (antiguo, time.time(), id_)
+        )
+    outbox._limpiar_enviados()
+    assert outbox.estado_outbox() == {'enviado': 1}
+
+    with outbox._conexion() as conexion:
+        conexion.execute("update eventos set enviado = ? where id = ?", (antiguo, id_))
+    outbox._ultima_limpieza = 0
+    outbox._limpiar_enviados()
+    assert outbox.estado_outbox() == {}
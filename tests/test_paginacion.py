@@ -0,0 +1,15 @@
+from app.utils.paginacion import citar_valor
+
+
+def test_citar_valor_envuelve_en_comillas():
+    assert citar_valor('%casco%') == '"%casco%"'
+
+
+def test_citar_valor_escapa_comillas_y_barras():
+    assert citar_valor('a"b\\c') == '"a\\"b\\\\c"'
+
+
+def test_citar_valor_no_deja_separadores_fuera_de_las_comillas():
+    valor = citar_valor('x%,estado.eq.aprobado,and(id.gt.0)')
+    assert valor.startswith('"') and valor.endswith('"')
+    assert '"' not in valor[1:-1].replace('\\"', '')
@@ -0,0 +1,22 @@
+from app.utils import verificar_proyecciones
+
+
+def test_vistas_solo_leen_columnas_proyectadas():
+    errores = verificar_proyecciones.verificar()
+    assert not errores, "\n".join(errores)
+
+
+def test_detecta_columna_no_proyectada(tmp_path):
+    modulo = tmp_path / "ejemplo.py"
+    modulo.write_text(
+        "def listar():\n"
+        "    resultado = consulta_tabla('riesgos', 'riesgos.listado')\n"
+        "    for estado in resultado:\n"
+        "        print(estado['columna_inexistente'])\n",
+        encoding='utf-8'
+    )
+    errores = verificar_proyecciones.verificar_archivo(modulo)
+
+    assert errores == [
+        "ejemplo.py:4 listar: columna 'columna_inexistente' no proyectada en riesgos.listado"
+    ]
@@ -0,0 +1,44 @@
+import os
+from app.utils import snapshots
+
+
+def _deltas():
+    carpeta = snapshots._carpeta('capacitaciones')
+    return sorted(n for n in os.listdir(carpeta) if n.startswith("delta-"))
+
+
+def test_sincronizar_sin_cambios_no_escribe_delta(servidor):
+    assert snapshots.sincronizar('capacitaciones', forzar=True) == 4
+
+    # El solape vuelve a traer las mismas filas, pero ya están en la instantánea
+    assert snapshots.sincronizar('capacitaciones', forzar=True) == 0
+    assert snapshots.sincronizar('capacitaciones', forzar=True) == 0
+
+    assert _deltas() == []
+    assert snapshots._leer_estado('capacitaciones')['deltas'] == 0
+
+
+def test_sincronizar_guarda_solo_las_filas_cambiadas(servidor):
+    snapshots.sincronizar('capacitaciones', forzar=True)
+
+    servidor.table('capacitaciones').update({'estado': 'Realizada'}).eq('id', 4).execute()
+
+    assert snapshots.sincronizar('capacitaciones', forzar=True) == 1
+    assert _deltas() == ["delta-1.parquet"]
+
+    df = snapshots.leer_snapshot('capacitaciones', 'reportes.capacitaciones')
+    assert df.set_index('id').loc[4, 'estado'] == 'Realizada'
+
+
+def test_fila_tardia_dentro_del_solape_no_se_pierde(servidor):
+    snapshots.sincronizar('capacitaciones', forzar=True)
+
+    # Transacción que confirma tarde: updated_at anterior a la marca de agua
+    servidor.table('capacitaciones').insert({
+        'codigo': 'CAP-5', 'tema': 'Orden y limpieza', 'area_destino': 'Planta',
+        'fecha_programada': '2026-04-01', 'estado': 'Programada', 'duracion_horas': 1,
+        'updated_at': '2026-01-01T07:59:30+00:00'
+    }).execute()
+
+    assert snapshots.sincronizar('capacitaciones', forzar=True) == 1
+    assert 'CAP-5' in set(snapshots.leer_snapshot('capacitaciones', 'reportes.capacitaciones')['codigo'])